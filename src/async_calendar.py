@@ -0,0 +1,241 @@
+import asyncio
+import importlib.util
+import re
+import uuid
+import weakref
+from email.parser import BytesFeedParser, BytesHeaderParser
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from base import BaseClass
+from metrics import metrics
+
+DEFAULT_ROOT_URL = "https://www.googleapis.com/"
+BATCH_PATH = "batch/calendar/v3"
+# httpcore scans every connection of a pool for every queued request, so
+# large pools are split into shards of at most this many connections
+SHARD_CONNECTIONS = 16
+
+# clients by event loop, then credentials and root url; httpx pools belong to the loop they were made on
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[int, str], AsyncCalendarClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_client(credentials, root_url: str = None, max_connections: int = 100) -> "AsyncCalendarClient":
+    """The running loop's client for `credentials`, created on first use."""
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    key = (id(credentials), root_url or DEFAULT_ROOT_URL)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = AsyncCalendarClient(credentials, root_url, max_connections)
+    return client
+
+
+async def close_clients() -> None:
+    """Close the running loop's clients and their connections, e.g. once a command is done."""
+    for client in _clients.pop(asyncio.get_running_loop(), {}).values():
+        await client.close()
+
+
+def split_message(message: bytes) -> Tuple[bytes, bytes]:
+    # an HTTP message's head ends at the first blank line, CRLF or not
+    match = re.search(rb"\r?\n\r?\n", message)
+    if match is None:
+        return message, b""
+    return message[: match.start()], message[match.end() :]
+
+
+class AsyncCalendarClient(BaseClass):
+    """Sends Calendar v3 requests on the event loop over a pooled httpx client.
+
+    Requests are still built with googleapiclient (`service.events().insert(...)`,
+    `service.freebusy().query(...)`, ...) and are only sent from here, so
+    responses and errors come back exactly as `request.execute()` would give
+    them, HttpError included. Connections are kept alive and use HTTP/2 when
+    the h2 package is installed, so thousands of requests can be in flight
+    without a thread each. The access token is refreshed once for everyone
+    waiting on it, not per request, and a request answered with a 401 is
+    sent again once with a fresh token, like googleapiclient does.
+    """
+
+    def __init__(
+        self,
+        credentials,
+        root_url: str = None,
+        max_connections: int = 100,
+        dry: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        import ssl
+
+        import certifi
+        import httpx
+
+        super().__init__(dry, verbose)
+        self.credentials = credentials
+        self.root_url = root_url or DEFAULT_ROOT_URL
+        self.http2 = importlib.util.find_spec("h2") is not None
+        shards = max(1, -(-max_connections // SHARD_CONNECTIONS))
+        connections = max(1, -(-max_connections // shards))
+        # loading the CA bundle is the bulk of a client's memory, so the shards share one
+        context = ssl.create_default_context(cafile=certifi.where())
+        self.shards = [
+            httpx.AsyncClient(
+                verify=context,
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            )
+            for _ in range(shards)
+        ]
+        self.sent = 0
+        self.token_lock = asyncio.Lock()
+        self.refreshes = 0
+
+    def __str__(self):
+        return "AsyncCalendarClient(root_url={}, http2={}, shards={}, refreshes={})".format(
+            self.root_url, self.http2, len(self.shards), self.refreshes
+        )
+
+    @property
+    def http(self):
+        # round robin over the shards
+        self.sent += 1
+        return self.shards[self.sent % len(self.shards)]
+
+    @property
+    def batch_uri(self) -> str:
+        return self.root_url.rstrip("/") + "/" + BATCH_PATH
+
+    def needs_refresh(self, rejected_token: str = None) -> bool:
+        # a token the API rejected is stale even if it hasn't expired yet
+        return not self.credentials.valid or (
+            rejected_token is not None and self.credentials.token == rejected_token
+        )
+
+    async def authorize(self, headers: Dict[str, str], rejected_token: str = None) -> str:
+        """Add the authorization header; returns the token it carries."""
+        if self.needs_refresh(rejected_token):
+            async with self.token_lock:
+                # whoever waited on the lock finds the token the first caller fetched
+                if self.needs_refresh(rejected_token):
+                    await self.refresh()
+        self.credentials.apply(headers)
+        return self.credentials.token
+
+    async def refresh(self) -> None:
+        from google.auth.transport.requests import Request
+
+        self.log("Refreshing access token")
+        # google-auth only refreshes synchronously, so it runs on the default pool
+        await asyncio.get_running_loop().run_in_executor(None, self.credentials.refresh, Request())
+        self.refreshes += 1
+        metrics.count("calendar.token_refreshes")
+
+    def is_unauthorized(self, response, attempt: int) -> bool:
+        if response.status_code != 401 or attempt:
+            return False
+        self.log("Got a 401, refreshing the access token and trying again")
+        metrics.count("calendar.unauthorized")
+        return True
+
+    async def execute(self, request) -> Any:
+        """Send a googleapiclient HttpRequest and parse its response like `request.execute()`."""
+        token = None
+        for attempt in range(2):
+            headers = dict(request.headers)
+            token = await self.authorize(headers, token)
+            response = await self.http.request(request.method, request.uri, content=request.body, headers=headers)
+            self.count(request.body, response)
+            if not self.is_unauthorized(response, attempt):
+                break
+        return request.postproc(self.to_httplib2(response.status_code, response.headers), response.content)
+
+    async def execute_batch(self, requests: List[Any]) -> List[Tuple[Any, Exception]]:
+        """Send up to 50 HttpRequests as one multipart batch; returns (response, error) per request."""
+        boundary = "batch_" + uuid.uuid4().hex
+        token = None
+        for attempt in range(2):
+            headers = {"content-type": 'multipart/mixed; boundary="{}"'.format(boundary)}
+            # every part carries the token too, so the body is built again after a refresh
+            token = await self.authorize(headers, token)
+            parts = [self.serialize(index, request, boundary, headers) for index, request in enumerate(requests)]
+            body = ("".join(parts) + "--{}--\r\n".format(boundary)).encode("utf-8")
+
+            response = await self.http.post(self.batch_uri, content=body, headers=headers)
+            self.count(body, response)
+            if not self.is_unauthorized(response, attempt):
+                break
+        if response.status_code >= 300:
+            from googleapiclient.errors import HttpError
+
+            raise HttpError(
+                self.to_httplib2(response.status_code, response.headers), response.content, uri=self.batch_uri
+            )
+
+        results: List[Tuple[Any, Exception]] = [
+            (None, RuntimeError("no response in batch")) for _ in requests
+        ]
+        for index, status, part_headers, content in self.parse_batch(response):
+            if not 0 <= index < len(requests):
+                continue
+            try:
+                results[index] = (requests[index].postproc(self.to_httplib2(status, part_headers), content), None)
+            except Exception as e:
+                results[index] = (None, e)
+        return results
+
+    def serialize(self, index: int, request, boundary: str, headers: Dict[str, str]) -> str:
+        uri = urlsplit(request.uri)
+        path = uri.path + ("?" + uri.query if uri.query else "")
+        lines = ["{} {} HTTP/1.1".format(request.method, path)]
+        # a gzipped part couldn't be read back out of the multipart response
+        part_headers = {key: value for key, value in request.headers.items() if key.lower() != "accept-encoding"}
+        if "authorization" in headers:
+            part_headers["authorization"] = headers["authorization"]
+        lines.extend("{}: {}".format(key, value) for key, value in part_headers.items())
+        body = request.body or ""
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        return (
+            "--{}\r\n"
+            "Content-Type: application/http\r\n"
+            "Content-Transfer-Encoding: binary\r\n"
+            "Content-ID: <item{}>\r\n\r\n"
+            "{}\r\n\r\n{}\r\n".format(boundary, index, "\r\n".join(lines), body)
+        )
+
+    def parse_batch(self, response) -> List[Tuple[int, int, Dict[str, str], bytes]]:
+        parser = BytesFeedParser()
+        parser.feed(b"content-type: " + response.headers["content-type"].encode("latin-1") + b"\r\n\r\n")
+        parser.feed(response.content)
+        parts = []
+        for part in parser.close().get_payload():
+            # "<response-item3>" answers "<item3>"
+            content_id = (part["Content-ID"] or "").strip("<>")
+            index = int(content_id.rsplit("item", 1)[-1]) if "item" in content_id else -1
+            # the part's raw bytes: without decode=True, anything non-ASCII comes back as U+FFFD
+            head, content = split_message(part.get_payload(decode=True))
+            status_line, _, header_lines = head.partition(b"\n")
+            message = BytesHeaderParser().parsebytes(header_lines)
+            parts.append((index, int(status_line.split(b" ", 2)[1]), dict(message.items()), content))
+        return parts
+
+    def count(self, body, response) -> None:
+        # the same counters CountingHttp keeps for the httplib2 transport
+        metrics.count("calendar.http_requests")
+        metrics.count("calendar.bytes_sent", len(body or b""))
+        metrics.count("calendar.bytes_received", len(response.content))
+
+    def to_httplib2(self, status: int, headers) -> Any:
+        # googleapiclient's models and HttpError read the httplib2 response type
+        import httplib2
+
+        response = httplib2.Response({key.lower(): value for key, value in headers.items()})
+        response.status = status
+        return response
+
+    async def close(self) -> None:
+        for shard in self.shards:
+            await shard.aclose()
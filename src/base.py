@@ -9,6 +9,7 @@ class BaseClass:
     def __str__(self):
         return "BaseClass(dry={}, verbose={})".format(self.dry, self.verbose)
 
-    def log(self, message: str):
+    def log(self, message: str, *args):
+        # `args` are %-formatted by logging, only when the message is emitted
         if self.verbose:
-            self.logger.debug(message)
\ No newline at end of file
+            self.logger.debug(message, *args)
@@ -0,0 +1,89 @@
+"""Micro-benchmark: plan two years of spaced repetition over a 3,000 problem catalog.
+
+    python3 src/benchmarks/bench_reviews.py [--problems 3000] [--days 730] [--budget-ms 250]
+
+Half of the catalog starts with review progress, the rest is new. Times a
+full plan, and a re-plan after one problem is graded halfway through.
+Exits non-zero when either median is over the budget.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.bench_scheduler import build_catalog  # noqa: E402
+from spaced_repetition import ReviewPlanner, ReviewProgress, review_card  # noqa: E402
+from utils.utils import get_problem_slug  # noqa: E402
+
+
+class MemoryProgress(ReviewProgress):
+    """Progress that lives in memory, so the benchmark never touches the data directory."""
+
+    def __init__(self) -> None:
+        self.dry = True
+        self.verbose = False
+        self.cards = {}
+
+    def save(self) -> None:
+        pass
+
+
+def build_progress(catalog: dict, start: date) -> MemoryProgress:
+    progress = MemoryProgress()
+    problems = [problem for topic_problems in catalog.values() for problem in topic_problems]
+    for index, problem in enumerate(problems[: len(problems) // 2]):
+        repetitions, interval, ease = review_card(index % 4, index % 30 + 1, 2.5, 3 + index % 3)
+        progress.cards[get_problem_slug(problem)] = {
+            "repetitions": repetitions,
+            "interval": interval,
+            "ease": ease,
+            "due": (start + timedelta(days=index % 60 - 20)).isoformat(),
+        }
+    return progress
+
+
+def time_ms(function) -> float:
+    started = time.perf_counter()
+    function()
+    return (time.perf_counter() - started) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--problems", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--new-limit", type=int, default=4)
+    parser.add_argument("--review-limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    start = date(2024, 1, 1)
+    catalog = build_catalog(args.problems)
+    progress = build_progress(catalog, start)
+    planner = ReviewPlanner(start, args.days, args.new_limit, args.review_limit)
+    slug = get_problem_slug(catalog["Topic 0"][0])
+
+    plans, replans = [], []
+    for attempt in range(args.repeat):
+        plans.append(time_ms(lambda: planner.plan(catalog, progress)))
+        day = start + timedelta(days=args.days // 2)
+        progress.record(slug, attempt % 6, day)
+        replans.append(time_ms(lambda: planner.update(slug, progress, day)))
+
+    sessions = sum(map(len, planner.sessions))
+    plan, replan = statistics.median(plans), statistics.median(replans)
+    print(
+        "planned {} sessions over {} days from {} problems: median {:.2f}ms, re-plan median {:.2f}ms (budget {:.0f}ms)".format(
+            sessions, args.days, args.problems, plan, replan, args.budget_ms
+        )
+    )
+    return 0 if max(plan, replan) <= args.budget_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
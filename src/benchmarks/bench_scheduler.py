@@ -0,0 +1,70 @@
+"""Micro-benchmark: plan a year of daily practice over a 3,000 problem catalog.
+
+    python3 src/benchmarks/bench_scheduler.py [--problems 3000] [--days 365] [--budget-ms 50]
+
+Exits non-zero when the median planning time is over the budget.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scheduler import Scheduler  # noqa: E402
+
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+DURATIONS = {"Easy": timedelta(minutes=30), "Medium": timedelta(minutes=45), "Hard": timedelta(minutes=45)}
+
+
+def build_catalog(problems: int, topics: int = 30) -> dict:
+    catalog = {}
+    for index in range(problems):
+        catalog.setdefault("Topic {}".format(index % topics), []).append(
+            {
+                "problem": "Problem {}".format(index),
+                "link": "https://leetcode.com/problems/problem-{}/".format(index),
+                "difficulty": DIFFICULTIES[index % 3],
+            }
+        )
+    return catalog
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--problems", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--daily-limit", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.problems)
+    total = min(args.days * args.daily_limit, args.problems)
+    scheduler = Scheduler(
+        datetime(2024, 1, 1, 9),
+        daily_limit=args.daily_limit,
+        total_limit=total,
+        get_duration=DURATIONS.__getitem__,
+        days=args.days,
+    )
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        placements = scheduler.plan(catalog)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    median = statistics.median(timings)
+    print(
+        "planned {} events over {} days from {} problems: median {:.2f}ms, min {:.2f}ms (budget {:.0f}ms)".format(
+            len(placements), args.days, args.problems, median, min(timings), args.budget_ms
+        )
+    )
+    return 0 if median <= args.budget_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Startup benchmark: cold-start time of a dry CLI command.
+
+    python3 src/benchmarks/bench_startup.py [--command "calendar list --dry"] [--budget-ms 200]
+
+Every run is a fresh interpreter, so this measures imports and config
+resolution as a user sees them. An empty interpreter is timed alongside, so
+what main.py itself adds can be told from a slow machine. Exits non-zero when
+the median is over budget; --importtime prints the slowest imports of one
+extra run.
+"""
+import argparse
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main.py")
+
+
+def run(arguments, extra=()) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *extra, MAIN, *arguments],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def print_slowest_imports(arguments, count: int = 15) -> None:
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in run(arguments, ("-X", "importtime")).stderr.splitlines():
+        parts = line.split("|")
+        if line.startswith("import time:") and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    for cumulative, name in sorted(rows, reverse=True)[:count]:
+        print("{:>8.1f}ms {}".format(cumulative / 1000, name))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--command", default="calendar list --dry")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=200)
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    arguments = shlex.split(args.command)
+    timings, baseline = [], []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = run(arguments)
+        timings.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            print(result.stderr, file=sys.stderr)
+            return result.returncode
+        # interleaved, so both see the same load on the machine
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"])
+        baseline.append((time.perf_counter() - started) * 1000)
+
+    median = statistics.median(timings)
+    print(
+        "main.py {}: median {:.1f}ms, min {:.1f}ms (budget {:.0f}ms)".format(
+            args.command, median, min(timings), args.budget_ms
+        )
+    )
+    print(
+        "empty interpreter: median {:.1f}ms, main.py adds {:.1f}ms".format(
+            statistics.median(baseline), median - statistics.median(baseline)
+        )
+    )
+    if args.importtime:
+        print_slowest_imports(arguments)
+    return 0 if median <= args.budget_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
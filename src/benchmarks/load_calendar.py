@@ -0,0 +1,108 @@
+"""Load test: schedule and wipe a large calendar against the fake Calendar API.
+
+    python3 src/benchmarks/load_calendar.py [--events 10000] [--latency 0.02] [--error-rate 0.01] [--quota 500]
+
+Starts fake_calendar.py in-process, points GoogleCalendar at it, creates
+--events generated events, lists them, then deletes them with the pipelined
+delete. Exits non-zero when any event is left behind or a phase runs over
+--budget-s seconds.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.bench_scheduler import build_catalog  # noqa: E402
+from fake_calendar import FakeCalendarServer  # noqa: E402
+
+
+def configure(args, server: FakeCalendarServer) -> None:
+    # config is resolved on first use, so the environment can still be set here
+    os.environ.update(
+        {
+            "CALENDAR_API_ROOT": server.url,
+            "CALENDAR_ID": "load-test",
+            "CALENDAR_BATCH_SIZE": str(args.batch_size),
+            "CALENDAR_CONCURRENCY": str(args.concurrency),
+            # the fake server enforces the quota, the client shouldn't pre-empt it
+            "CALENDAR_RATE_LIMIT": str(args.client_rate),
+            "CALENDAR_RETRY_BASE_DELAY": "0.05",
+            "CALENDAR_RETRY_MAX_DELAY": "2",
+            "CALENDAR_MAX_RETRIES": "8",
+            "CALENDAR_AVOID_BUSY": "false",
+            "DAILY_QUESTION_LIMIT": str(args.daily_limit),
+            "TOTAL_QUESTION_LIMIT": str(args.events),
+        }
+    )
+
+
+async def run(args, server: FakeCalendarServer) -> int:
+    from datetime import datetime
+
+    from google_calendar import GoogleCalendar
+
+    google_calendar = GoogleCalendar(verbose=args.verbose)
+    events = google_calendar.build_events(
+        build_catalog(args.events), start=datetime(2024, 1, 1, 9)
+    )
+    failures = 0
+
+    started = time.perf_counter()
+    if args.batch_size > 1:
+        summary = await google_calendar.batcher.insert_events("load-test", events)
+    else:
+        summary = await google_calendar.run_bounded(
+            "create", [(event.summary, event) for event in events], google_calendar.create_event
+        )
+    elapsed = time.perf_counter() - started
+    print("{} ({:.0f} events/s)".format(summary, len(events) / elapsed))
+    failures += elapsed > args.budget_s or bool(summary.failed)
+
+    started = time.perf_counter()
+    listed = sum(1 for _ in google_calendar.iter_events("id"))
+    elapsed = time.perf_counter() - started
+    print("list: {} events in {:.2f}s".format(listed, elapsed))
+    failures += elapsed > args.budget_s or listed != len(summary.succeeded)
+
+    started = time.perf_counter()
+    summary = await google_calendar.delete_events_pipelined(generated_only=True)
+    elapsed = time.perf_counter() - started
+    remaining = server.store.count("load-test")
+    print("{} ({} left)".format(summary, remaining))
+    failures += elapsed > args.budget_s or remaining > 0
+
+    print("client: {}".format(google_calendar.request_executor.get_metrics()))
+    print("server: {}".format(server.get_stats()))
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--daily-limit", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--client-rate", type=float, default=0, help="Client side calls per second, 0 for none")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota", type=float, default=0.0)
+    parser.add_argument("--budget-s", type=float, default=120)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with FakeCalendarServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        quota_rate=args.quota,
+    ) as server:
+        configure(args, server)
+        return asyncio.run(run(args, server))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""End-to-end benchmark suite: scrape, load, plan, export, schedule and delete.
+
+    python3 src/benchmarks/suite.py [--only plan] [--latency 0.02] [--threshold 0.2] [--save-baseline]
+
+Every case runs --repeat times (calendar cases --calendar-repeat times) and
+its median is written to --output as JSON. When --baseline exists, the run
+exits non-zero if any case's median is more than --threshold (a fraction)
+slower than the baseline's. --save-baseline stores this run as the new
+baseline.
+
+The scrape case parses a synthetic NeetCode practice page, or the page
+given with --html (raw HTML or a fixture recorded with `scrape --fixtures
+record`). Calendar cases run against an in-process fake_calendar.py
+server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.bench_scheduler import build_catalog  # noqa: E402
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCHMARKS_DIR, "..", "data", "benchmarks", "latest.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "..", "data", "benchmarks", "baseline.json")
+PLAN_SIZES = (100, 1000, 10000)
+
+# (name, run once, repeat, untimed setup before every run)
+Case = Tuple[str, Callable[[], object], int, Callable[[], None]]
+
+
+def build_practice_page(problems: int, topics: int = 18) -> str:
+    """A practice page shaped like NeetCode's, for the HTML row parser."""
+    tables = []
+    for topic, topic_problems in build_catalog(problems, topics).items():
+        rows = "".join(
+            '<tr><td><input type="checkbox"></td><td><span class="star"></span></td>'
+            '<td><a href="{link}" target="_blank">{problem}</a></td>'
+            '<td><b class="difficulty">{difficulty}</b></td><td></td></tr>'.format(**problem)
+            for problem in topic_problems
+        )
+        tables.append(
+            '<app-pattern-table><div class="accordion"><p>{}</p><span>(0 / {})</span></div>'
+            "<app-table><div><table><thead><tr><th>Status</th><th>Star</th><th>Problem</th>"
+            "<th>Difficulty</th><th>Video</th></tr></thead><tbody>{}</tbody></table></div>"
+            "</app-table></app-pattern-table>".format(topic, len(topic_problems), rows)
+        )
+    return "<html><body><app-root><app-pattern-table-list>{}</app-pattern-table-list></app-root></body></html>".format(
+        "".join(tables)
+    )
+
+
+def read_practice_page(path: str) -> str:
+    with open(path, "r") as page:
+        content = page.read()
+    if path.endswith(".json"):
+        # a response recorded by HttpFetcher
+        return json.loads(content)["body"]
+    return content
+
+
+def configure(args, workdir: str) -> None:
+    # config is resolved on first use, so everything below is still in time
+    problems_file = os.path.join(workdir, "problems.json")
+    with open(problems_file, "w") as json_file:
+        json.dump(build_catalog(args.problems), json_file)
+    os.environ.update(
+        {
+            # every file a case can read or write, so nothing lands in src/data
+            "PROBLEMS_FILE": problems_file,
+            "PROBLEMS_DB": os.path.join(workdir, "problems.db"),
+            "PROBLEMS_STREAM_FILE": os.path.join(workdir, "problems.ndjson"),
+            "PROBLEMS_MANIFEST_FILE": os.path.join(workdir, "problems.manifest.json"),
+            "PROGRESS_FILE": os.path.join(workdir, "progress.json"),
+            "SYNC_STATE_FILE": os.path.join(workdir, "sync_state.json"),
+            "JOURNAL_DIR": os.path.join(workdir, "journal"),
+            "DISCOVERY_CACHE_DIR": os.path.join(workdir, "discovery"),
+            "ICS_FILE": os.path.join(workdir, "schedule.ics"),
+            "CALENDAR_ID": "benchmarks",
+            "CALENDAR_AVOID_BUSY": "false",
+            "CALENDAR_RATE_LIMIT": "0",
+            "CALENDAR_RETRY_BASE_DELAY": "0.05",
+            "DAILY_QUESTION_LIMIT": "4",
+            "TOTAL_QUESTION_LIMIT": str(args.events),
+            "LOG_LEVEL": "ERROR",
+        }
+    )
+
+
+def get_scrape_cases(args) -> List[Case]:
+    from http_scraper import parse_practice_page
+
+    html = read_practice_page(args.html) if args.html else build_practice_page(args.problems)
+    return [("scrape.parse_practice_page", lambda: parse_practice_page(html, "https://neetcode.io/"), args.repeat, None)]
+
+
+def get_load_cases(args) -> List[Case]:
+    from config import config
+    from google_calendar import GoogleCalendar
+    from scheduler import iter_topical_problems
+
+    google_calendar = GoogleCalendar()
+
+    def load(catalog: bool) -> Callable[[], int]:
+        def run() -> int:
+            config.problems_catalog = catalog
+            # a catalog view is lazy, so read it through like the planner would
+            with google_calendar.open_problems() as problems:
+                return sum(1 for _ in iter_topical_problems(problems))
+
+        return run
+
+    return [
+        ("load_problems.json", load(False), args.repeat, None),
+        ("load_problems.catalog", load(True), args.repeat, None),
+    ]
+
+
+def get_plan_cases(args) -> List[Case]:
+    from google_calendar import GoogleCalendar
+
+    cases = []
+    for size in PLAN_SIZES:
+        google_calendar = GoogleCalendar()
+        google_calendar.total_question_limit = size
+        # enough problems a day to fit the plan into a year
+        google_calendar.daily_question_limit = max(2, size // 365 + 1)
+        catalog = build_catalog(size)
+        cases.append(
+            (
+                "build_events.{}".format(size),
+                lambda google_calendar=google_calendar, catalog=catalog: google_calendar.build_events(
+                    catalog, start=datetime(2024, 1, 1, 9)
+                ),
+                args.repeat,
+                None,
+            )
+        )
+
+    from benchmarks.bench_reviews import build_progress
+    from spaced_repetition import ReviewPlanner
+
+    # two years of spaced repetition over the whole catalog
+    catalog = build_catalog(args.problems)
+    progress = build_progress(catalog, date(2024, 1, 1))
+    planner = ReviewPlanner(date(2024, 1, 1), 730, new_limit=4, review_limit=20)
+    cases.append(("plan_reviews.730d", lambda: planner.plan(catalog, progress), args.repeat, None))
+    return cases
+
+
+def get_export_cases(args, workdir: str) -> List[Case]:
+    from google_calendar import GoogleCalendar
+    from ics import write_events
+
+    google_calendar = GoogleCalendar()
+    google_calendar.total_question_limit = args.events
+    google_calendar.daily_question_limit = max(2, args.events // 365 + 1)
+    events = google_calendar.build_events(build_catalog(args.events), start=datetime(2024, 1, 1, 9))
+    path = os.path.join(workdir, "schedule.ics")
+    return [("export.ics", lambda: write_events(path, events, "America/New_York"), args.repeat, None)]
+
+
+def get_calendar_cases(args, server) -> List[Case]:
+    from config import config
+    from google_calendar import GoogleCalendar
+
+    config.calendar_api_root = server.url
+    google_calendar = GoogleCalendar()
+    event_ids: List[str] = []
+
+    def fill() -> None:
+        if not server.store.count():
+            asyncio.run(google_calendar.create_problem_schedule())
+        event_ids[:] = google_calendar.get_event_ids_from_calendar()
+
+    return [
+        (
+            "calendar.create_problem_schedule",
+            lambda: asyncio.run(google_calendar.create_problem_schedule()),
+            args.calendar_repeat,
+            server.store.reset,
+        ),
+        (
+            "calendar.delete_all_events",
+            lambda: asyncio.run(google_calendar.delete_all_events(event_ids)),
+            args.calendar_repeat,
+            fill,
+        ),
+    ]
+
+
+def measure(
+    name: str, run: Callable[[], object], repeat: int, setup: Callable[[], None] = None
+) -> Dict[str, float]:
+    timings = []
+    for _ in range(max(1, repeat)):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    result = {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "repeat": len(timings),
+    }
+    print("{:<36} median {:>10.2f}ms  min {:>10.2f}ms".format(name, result["median_ms"], result["min_ms"]))
+    return result
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = result["median_ms"] / max(previous["median_ms"], 1e-6) - 1
+        marker = "REGRESSION" if change > threshold else ""
+        print("{:<36} {:>+8.1%} vs baseline {:>10.2f}ms {}".format(name, change, previous["median_ms"], marker))
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def write_json(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as json_file:
+        json.dump(data, json_file, indent=4)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=["scrape", "load", "plan", "export", "calendar"])
+    parser.add_argument("--problems", type=int, default=3000, help="Problems in the scraped page and problems.json")
+    parser.add_argument("--events", type=int, default=1000, help="Events exported, scheduled and deleted")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--calendar-repeat", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the fake calendar adds per request")
+    parser.add_argument("--html", help="Saved practice page to parse instead of the synthetic one")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown, 0.2 is 20%%")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+    groups = args.only or ["scrape", "load", "plan", "export", "calendar"]
+
+    with tempfile.TemporaryDirectory(prefix="leetcode-bench-") as workdir:
+        configure(args, workdir)
+        results: Dict[str, dict] = {}
+        if "scrape" in groups:
+            for case in get_scrape_cases(args):
+                results[case[0]] = measure(*case)
+        if "load" in groups:
+            for case in get_load_cases(args):
+                results[case[0]] = measure(*case)
+        if "plan" in groups:
+            for case in get_plan_cases(args):
+                results[case[0]] = measure(*case)
+        if "export" in groups:
+            for case in get_export_cases(args, workdir):
+                results[case[0]] = measure(*case)
+        if "calendar" in groups:
+            from fake_calendar import FakeCalendarServer
+
+            with FakeCalendarServer(latency=args.latency) as server:
+                for case in get_calendar_cases(args, server):
+                    results[case[0]] = measure(*case)
+
+    report = {
+        "created": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {
+            "problems": args.problems,
+            "events": args.events,
+            "latency": args.latency,
+        },
+        "results": results,
+    }
+    write_json(args.output, report)
+    print("Wrote {}".format(os.path.normpath(args.output)))
+
+    if args.save_baseline:
+        write_json(args.baseline, report)
+        print("Saved baseline {}".format(os.path.normpath(args.baseline)))
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline at {}, run with --save-baseline to store one".format(os.path.normpath(args.baseline)))
+        return 0
+    with open(args.baseline, "r") as json_file:
+        baseline = json.load(json_file)
+    if baseline.get("settings") != report["settings"]:
+        print("Warning: baseline was recorded with {}".format(baseline.get("settings")))
+    regressions = compare(results, baseline.get("results", {}), args.threshold)
+    if regressions:
+        print("{} regressed by more than {:.0%}".format(", ".join(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
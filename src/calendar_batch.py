@@ -0,0 +1,194 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from base import BaseClass
+from custom_types import BulkSummary, OperationResult, get_event_key, to_body
+from metrics import metrics
+from request_executor import get_error_status, is_retryable_error, is_throttled_error
+
+# the Calendar API rejects batches with more than 50 calls
+MAX_BATCH_SIZE = 50
+
+
+class CalendarBatcher(BaseClass):
+    """Groups Calendar API mutations into BatchHttpRequests.
+
+    Every batch is executed on the calendar's worker pool, sub-responses are
+    mapped back to the item that produced them and only the failed, retryable
+    sub-requests are sent again in the next round.
+    """
+
+    def __init__(
+        self,
+        calendar,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_retries: int = 3,
+        dry: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(dry, verbose)
+        self.calendar = calendar
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_retries = max_retries
+        self.batches_sent = 0
+
+    def __str__(self):
+        return "CalendarBatcher(batch_size={}, max_retries={})".format(
+            self.batch_size, self.max_retries
+        )
+
+    async def insert_events(
+        self,
+        calendar_id: str,
+        events: List,
+        on_result: Callable[[OperationResult], None] = None,
+    ) -> BulkSummary:
+        events_api = self.calendar.events_api
+        return await self.run(
+            "create",
+            [
+                (
+                    get_event_key(event),
+                    # the body is only built when its request is sent
+                    lambda event=event: events_api.insert(
+                        calendarId=calendar_id, body=to_body(event)
+                    ),
+                )
+                for event in events
+            ],
+            # an event with a client id already created by an interrupted run
+            ignore_statuses={409},
+            on_result=on_result,
+        )
+
+    async def update_events(
+        self, calendar_id: str, updates: List[Tuple[str, Any]]
+    ) -> BulkSummary:
+        events_api = self.calendar.events_api
+        return await self.run(
+            "update",
+            [
+                (
+                    event_id,
+                    lambda event_id=event_id, event=event: events_api.update(
+                        calendarId=calendar_id, eventId=event_id, body=to_body(event)
+                    ),
+                )
+                for event_id, event in updates
+            ],
+        )
+
+    async def delete_events(
+        self,
+        calendar_id: str,
+        event_ids: List[str],
+        on_result: Callable[[OperationResult], None] = None,
+    ) -> BulkSummary:
+        events_api = self.calendar.events_api
+        return await self.run(
+            "delete",
+            [
+                (
+                    event_id,
+                    lambda event_id=event_id: events_api.delete(
+                        calendarId=calendar_id, eventId=event_id
+                    ),
+                )
+                for event_id in event_ids
+            ],
+            # an event that is already gone is as good as deleted
+            ignore_statuses={404, 410},
+            on_result=on_result,
+        )
+
+    async def run(
+        self,
+        operation: str,
+        items: List[Tuple[str, Callable[[], Any]]],
+        ignore_statuses: set = frozenset(),
+        on_result: Callable[[OperationResult], None] = None,
+    ) -> BulkSummary:
+        """Send every item's request in batches; `on_result` sees each final outcome as it's known."""
+        started = time.perf_counter()
+        results: Dict[int, OperationResult] = {}
+        pending = list(range(len(items)))
+        executor = self.calendar.request_executor
+
+        async def send(chunk: List[int]) -> Tuple[List[int], Dict[int, Tuple[Any, Exception]]]:
+            responses: Dict[int, Tuple[Any, Exception]] = {}
+
+            def callback(request_id, response, exception):
+                responses[int(request_id)] = (response, exception)
+
+            requests = [items[index][1]() for index in chunk]
+            try:
+                # every call in a batch counts against the quota on its own
+                if self.calendar.async_transport:
+                    sent = await self.calendar.execute_batch_async(requests, cost=len(chunk))
+                    responses.update(zip(chunk, sent))
+                else:
+                    batch = self.calendar.service.new_batch_http_request(callback=callback)
+                    for index, request in zip(chunk, requests):
+                        batch.add(request, request_id=str(index))
+                    await self.calendar.execute_async(batch, cost=len(chunk))
+            except Exception as e:
+                # the whole batch failed, so every sub-request failed with it
+                self.log("Error: batch of %s %s requests failed: %s", len(chunk), operation, e)
+                return chunk, {index: (None, e) for index in chunk}
+            finally:
+                self.batches_sent += 1
+                metrics.count("calendar.batches")
+            return chunk, responses
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                delay = executor.get_backoff(attempt - 1)
+                executor.count("retries", len(pending))
+                executor.count("backoff_seconds", delay)
+                self.log("Retrying %s failed %s requests in %.2fs", len(pending), operation, delay)
+                await asyncio.sleep(delay)
+
+            chunks = [
+                pending[i : i + self.batch_size]
+                for i in range(0, len(pending), self.batch_size)
+            ]
+            self.log("Sending %s %s requests in %s batches", len(pending), operation, len(chunks))
+            retry = []
+            throttled = False
+            # settle every batch as soon as it lands, so `on_result` isn't held up by the slowest one
+            for sent in asyncio.as_completed([send(chunk) for chunk in chunks]):
+                chunk, responses = await sent
+                for index in chunk:
+                    key = items[index][0]
+                    response, error = responses.get(
+                        index, (None, RuntimeError("no response in batch"))
+                    )
+                    if error is not None and is_throttled_error(error):
+                        throttled = True
+                    if error is None or get_error_status(error) in ignore_statuses:
+                        results[index] = OperationResult(key, value=response)
+                    elif is_retryable_error(error) and attempt < self.max_retries:
+                        retry.append(index)
+                        continue
+                    else:
+                        self.log("Error %s %s: %s", operation, key, error)
+                        results[index] = OperationResult(key, error=error)
+                    if on_result:
+                        on_result(results[index])
+
+            if throttled:
+                # back off the whole pool, not just these sub-requests
+                executor.record_throttle()
+            pending = sorted(retry)
+            if not pending:
+                break
+
+        summary = BulkSummary(
+            operation,
+            [results[index] for index in range(len(items))],
+            time.perf_counter() - started,
+        )
+        self.log("%s (%s batches sent)", summary, self.batches_sent)
+        self.log("Request metrics: %s", executor.get_metrics())
+        return summary
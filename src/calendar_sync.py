@@ -0,0 +1,248 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from base import BaseClass
+from config import Config, config
+from constants import DATE_FORMAT
+from custom_types import BulkSummary, Event, ScheduledEvent
+from freebusy import BusyIndex, parse_rfc3339
+from google_calendar import GENERATOR_NAME, GENERATOR_PROPERTY, GoogleCalendar
+from manifest import ProblemsManifest
+from metrics import metrics
+from spaced_repetition import ReviewProgress
+from utils.utils import get_file_path
+
+
+def get_event_hash(event: ScheduledEvent) -> str:
+    # hash everything we control except the tags the hash itself is stored in
+    body = event.to_body(private=False)
+    return hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def get_private_properties(event) -> Dict[str, str]:
+    if isinstance(event, ScheduledEvent):
+        return event.private
+    return event.get("extendedProperties", {}).get("private", {})
+
+
+def get_plan_key(private: Dict[str, str]) -> str:
+    # every review of a problem is an event of its own
+    review = private.get("review")
+    return "{}#{}".format(private.get("problemSlug"), review) if review else private.get("problemSlug")
+
+
+def get_catalog_revision(settings: Config) -> int:
+    from catalog import ProblemCatalog
+
+    catalog = ProblemCatalog(get_file_path(settings.problems_db))
+    try:
+        return catalog.revision
+    finally:
+        catalog.close()
+
+
+def get_config_hash(settings: Config = None) -> str:
+    # everything besides the problems that changes what the plan looks like
+    settings = settings or config
+    values = [
+        settings.calendar_id,
+        settings.daily_question_limit,
+        settings.total_question_limit,
+        settings.question_time_limit,
+        settings.timezone,
+    ]
+    if settings.problems_catalog:
+        # a status changed with `catalog status` adds or drops problems from the plan
+        values.append(get_catalog_revision(settings))
+    if settings.spaced_repetition:
+        values.extend(
+            [
+                settings.review_daily_limit,
+                settings.review_days,
+                settings.review_projected_grade,
+                # a graded review moves that problem's events
+                ReviewProgress(settings=settings).digest,
+            ]
+        )
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()[:16]
+
+
+class SyncPlan:
+    def __init__(self) -> None:
+        self.creates: List[ScheduledEvent] = []
+        self.updates: List[Tuple[str, ScheduledEvent]] = []
+        self.deletes: List[str] = []
+        self.unchanged: int = 0
+        self.skipped: bool = False
+
+    @property
+    def mutations(self) -> int:
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def __str__(self) -> str:
+        if self.skipped:
+            return "SyncPlan(skipped, nothing changed since the last sync)"
+        return "SyncPlan(creates={}, updates={}, deletes={}, unchanged={})".format(
+            len(self.creates), len(self.updates), len(self.deletes), self.unchanged
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class CalendarSync(BaseClass):
+    """Brings the calendar in line with the desired schedule.
+
+    Generated events carry the problem slug, a hash of the event body and the
+    plan anchor (start of day 0) in extendedProperties.private. A run reuses
+    the anchor of the existing plan so that unchanged inputs produce an
+    identical schedule, then only sends the creates, updates and deletes
+    needed to get from the existing events to it.
+    """
+
+    def __init__(self, calendar: GoogleCalendar, dry: bool = False, verbose: bool = False) -> None:
+        super().__init__(dry, verbose)
+        self.calendar = calendar
+        self.manifest = ProblemsManifest(dry, verbose)
+        # what the last apply() sent, one summary per operation
+        self.summaries: List[BulkSummary] = []
+
+    def __str__(self):
+        return "CalendarSync(dry={}, verbose={})".format(self.dry, self.verbose)
+
+    @metrics.timed("sync.list")
+    def get_existing_events(self) -> List[Event]:
+        events = [
+            event
+            for event in self.calendar.iter_events(
+                "id,status,start,end,extendedProperties/private",
+                privateExtendedProperty="%s=%s" % (GENERATOR_PROPERTY, GENERATOR_NAME),
+            )
+            if event.get("status") != "cancelled"
+        ]
+        self.log("Found %s generated events", len(events))
+        return events
+
+    def get_anchor(self, existing: List[Event], rebase: bool = False) -> datetime:
+        anchors = [
+            get_private_properties(event).get("planAnchor")
+            for event in existing
+        ]
+        anchors = sorted(anchor for anchor in anchors if anchor)
+        if anchors and not rebase:
+            return datetime.strptime(anchors[0], DATE_FORMAT)
+        return datetime.now().replace(second=0, microsecond=0)
+
+    def get_busy_index(self, anchor: datetime, existing: List[Event]) -> Optional[BusyIndex]:
+        if not self.calendar.config.calendar_avoid_busy or self.dry:
+            return None
+        busy = self.calendar.get_busy_index(
+            anchor, anchor + timedelta(days=self.calendar.get_plan_days() + 1)
+        )
+        # our own events are being re-planned, they shouldn't block their own slots
+        busy.subtract(
+            (parse_rfc3339(event["start"]["dateTime"]), parse_rfc3339(event["end"]["dateTime"]))
+            for event in existing
+            if "dateTime" in event.get("start", {}) and "dateTime" in event.get("end", {})
+        )
+        return busy
+
+    def tag_events(self, events: List[ScheduledEvent], anchor: datetime) -> List[ScheduledEvent]:
+        plan_anchor = self.calendar.formart_date(anchor)
+        for event in events:
+            event.plan_hash = get_event_hash(event)
+            event.plan_anchor = plan_anchor
+        return events
+
+    @metrics.timed("sync.diff")
+    def diff(self, desired: List[ScheduledEvent], existing: List[Event]) -> SyncPlan:
+        plan = SyncPlan()
+        existing_by_slug: Dict[str, Event] = {}
+        for event in existing:
+            key = get_plan_key(get_private_properties(event))
+            if key in existing_by_slug:
+                # a duplicate left behind by an earlier blind insert
+                plan.deletes.append(event["id"])
+            else:
+                existing_by_slug[key] = event
+
+        for event in desired:
+            private = get_private_properties(event)
+            current = existing_by_slug.pop(get_plan_key(private), None)
+            if current is None:
+                plan.creates.append(event)
+            elif get_private_properties(current) != private:
+                plan.updates.append((current["id"], event))
+            else:
+                plan.unchanged += 1
+
+        plan.deletes.extend(event["id"] for event in existing_by_slug.values())
+        return plan
+
+    @metrics.timed("sync.apply")
+    async def apply(self, plan: SyncPlan) -> List[BulkSummary]:
+        summaries = []
+        batcher = self.calendar.batcher
+        calendar_id = self.calendar.config.calendar_id
+        if plan.deletes:
+            summaries.append(await batcher.delete_events(calendar_id, plan.deletes))
+        if plan.updates:
+            summaries.append(await batcher.update_events(calendar_id, plan.updates))
+        if plan.creates:
+            summaries.append(await batcher.insert_events(calendar_id, plan.creates))
+        for summary in summaries:
+            self.log("%s", summary)
+        self.summaries = summaries
+        return summaries
+
+    def is_up_to_date(self) -> bool:
+        """True when the problems and config are the ones the last sync pushed."""
+        if not self.manifest.is_current():
+            return False
+        last_sync = self.calendar.sync_state.get("schedule")
+        return (
+            last_sync.get("digest") == self.manifest.digest
+            and last_sync.get("config") == get_config_hash(self.calendar.config)
+        )
+
+    @metrics.timed("sync")
+    async def run(
+        self, rebase: bool = False, force: bool = False, topical_problems=None
+    ) -> SyncPlan:
+        """Sync the schedule; `topical_problems` skips loading them again, e.g. in a fan-out."""
+        if not (rebase or force or self.dry) and self.is_up_to_date():
+            self.log("Problems and config unchanged since the last sync, skipping")
+            plan = SyncPlan()
+            plan.skipped = True
+            return plan
+
+        if self.dry:
+            self.log("Dry run, planning against an empty calendar")
+            existing = []
+        else:
+            existing = await self.calendar.run_blocking(self.get_existing_events)
+        anchor = self.get_anchor(existing, rebase)
+        self.log("Planning from anchor %s", anchor)
+        busy = await self.calendar.run_blocking(self.get_busy_index, anchor, existing)
+        with self.calendar.open_problems(topical_problems) as problems:
+            desired = self.tag_events(self.calendar.build_events(problems, anchor, busy), anchor)
+        plan = self.diff(desired, existing)
+        self.log("%s", plan)
+
+        if self.dry:
+            self.log("Dry run, not syncing events")
+            return plan
+
+        if plan.mutations == 0:
+            self.log("Calendar is up to date")
+        elif any(summary.failed for summary in await self.apply(plan)):
+            # leave the last sync unrecorded so the next run retries
+            return plan
+
+        if self.manifest.is_current():
+            self.calendar.sync_state.set(
+                "schedule", digest=self.manifest.digest, config=get_config_hash(self.calendar.config)
+            )
+        return plan
@@ -0,0 +1,229 @@
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from base import BaseClass
+from config import config
+from constants import PROBLEM_STATUSES
+from problem_stream import load_topics
+from utils.utils import atomic_write_json, get_file_path, get_problem_slug
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS problems (
+    slug TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    link TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'todo'
+);
+CREATE TABLE IF NOT EXISTS problem_topics (
+    topic TEXT NOT NULL,
+    slug TEXT NOT NULL REFERENCES problems (slug) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (topic, slug)
+);
+CREATE INDEX IF NOT EXISTS problem_topics_position ON problem_topics (position);
+CREATE INDEX IF NOT EXISTS problem_topics_slug ON problem_topics (slug);
+CREATE INDEX IF NOT EXISTS problems_difficulty ON problems (difficulty);
+CREATE INDEX IF NOT EXISTS problems_status ON problems (status);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class ProblemCatalog(BaseClass):
+    """SQLite store of problems keyed by their canonical LeetCode slug.
+
+    Problems are linked to topics in scrape order and indexed by topic,
+    difficulty and completion status. Reads go through cursors, so callers
+    can iterate a catalog of thousands of problems without loading it.
+    """
+
+    def __init__(self, path: str = None, dry: bool = False, verbose: bool = False) -> None:
+        super().__init__(dry, verbose)
+        self.path = path or get_file_path(config.problems_db)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __str__(self):
+        return "ProblemCatalog(path={})".format(self.path)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    @property
+    def revision(self) -> int:
+        """Bumped by every import and status change, so a sync can tell the catalog changed."""
+        return int(self.get_meta("revision") or 0)
+
+    def bump_revision(self) -> None:
+        self.set_meta("revision", str(self.revision + 1))
+
+    def get_source_stamp(self, path: str) -> str:
+        stat = os.stat(path)
+        return "{}:{}".format(stat.st_size, stat.st_mtime)
+
+    def is_stale(self, json_path: str) -> bool:
+        """True when `json_path` changed since it was last imported."""
+        if not os.path.exists(json_path):
+            return False
+        return self.get_meta("source") != self.get_source_stamp(json_path)
+
+    def import_topics(self, topics: Mapping[str, List[dict]]) -> int:
+        """Replace the catalog's topics, keeping the status of known problems."""
+        with self.connection:
+            self.connection.execute("DELETE FROM problem_topics")
+            position = 0
+            for topic, problems in topics.items():
+                for problem in problems:
+                    slug = get_problem_slug(problem)
+                    self.connection.execute(
+                        """
+                        INSERT INTO problems (slug, title, link, difficulty) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (slug) DO UPDATE SET
+                            title = excluded.title,
+                            link = excluded.link,
+                            difficulty = excluded.difficulty
+                        """,
+                        (slug, problem["problem"], problem["link"], problem["difficulty"]),
+                    )
+                    self.connection.execute(
+                        "INSERT OR IGNORE INTO problem_topics (topic, slug, position) VALUES (?, ?, ?)",
+                        (topic, slug, position),
+                    )
+                    position += 1
+            # problems no longer in any topic have been dropped upstream
+            self.connection.execute(
+                "DELETE FROM problems WHERE slug NOT IN (SELECT slug FROM problem_topics)"
+            )
+            self.bump_revision()
+        self.log("Imported %s problems into the catalog", position)
+        return position
+
+    def import_json(self, path: str) -> int:
+        # read topic by topic from the scraper's stream when it's still current
+        count = self.import_topics(load_topics(path))
+        with self.connection:
+            self.set_meta("source", self.get_source_stamp(path))
+        return count
+
+    def export_json(self, path: str) -> int:
+        topics: Dict[str, List[dict]] = {}
+        count = 0
+        for topic, problem in self.iter_problems():
+            topics.setdefault(topic, []).append(
+                {key: problem[key] for key in ("problem", "link", "difficulty")}
+            )
+            count += 1
+        atomic_write_json(path, topics, indent=4)
+        self.log("Exported %s problems to %s", count, path)
+        return count
+
+    def iter_problems(
+        self,
+        topic: str = None,
+        difficulty: str = None,
+        status: str = None,
+    ) -> Iterator[Tuple[str, dict]]:
+        """Yield (topic, problem) pairs in scrape order, lazily from a cursor."""
+        query = """
+            SELECT t.topic, p.slug, p.title, p.link, p.difficulty, p.status
+            FROM problem_topics t JOIN problems p ON p.slug = t.slug
+        """
+        conditions, params = [], []
+        for column, value in (("t.topic", topic), ("p.difficulty", difficulty), ("p.status", status)):
+            if value is not None:
+                conditions.append("{} = ?".format(column))
+                params.append(value)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY t.position"
+
+        for row in self.connection.execute(query, params):
+            yield row[0], {
+                "problem": row[2],
+                "link": row[3],
+                "difficulty": row[4],
+                "slug": row[1],
+                "status": row[5],
+            }
+
+    def get_topics(self) -> List[str]:
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT topic FROM problem_topics GROUP BY topic ORDER BY MIN(position)"
+            )
+        ]
+
+    def count(self, status: str = None) -> int:
+        if status is None:
+            return self.connection.execute("SELECT COUNT(*) FROM problems").fetchone()[0]
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM problems WHERE status = ?", (status,)
+        ).fetchone()[0]
+
+    def set_status(self, slug: str, status: str) -> bool:
+        if status not in PROBLEM_STATUSES:
+            raise ValueError("Unknown status {}, expected one of {}".format(status, PROBLEM_STATUSES))
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE problems SET status = ? WHERE slug = ?", (status, slug)
+            )
+            if cursor.rowcount:
+                self.bump_revision()
+        return cursor.rowcount > 0
+
+
+class TopicalProblems:
+    """Read-only {topic: problems} view over the catalog.
+
+    Stands in for the dict loaded from problems.json, but every items() call
+    streams the problems from the database instead of holding them in memory.
+    The view owns the catalog's connection, so close it once it's been read.
+    """
+
+    def __init__(self, catalog: ProblemCatalog, status: str = None) -> None:
+        self.catalog = catalog
+        self.status = status
+
+    def __enter__(self) -> "TopicalProblems":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.catalog.close()
+
+    def __len__(self) -> int:
+        return len(self.catalog.get_topics())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.catalog.get_topics())
+
+    def __getitem__(self, topic: str) -> Iterator[dict]:
+        return (problem for _, problem in self.catalog.iter_problems(topic, status=self.status))
+
+    def keys(self) -> List[str]:
+        return self.catalog.get_topics()
+
+    def items(self) -> Iterator[Tuple[str, Iterator[dict]]]:
+        for topic in self.catalog.get_topics():
+            yield topic, self[topic]
+
+    def iter_problems(self) -> Iterator[Tuple[str, dict]]:
+        return self.catalog.iter_problems(status=self.status)
@@ -1,44 +1,161 @@
-import click
 import os
-from dotenv import load_dotenv
-from pprint import pformat
-from typing import List
+from typing import Dict, List, Mapping, Optional
 
 from utils.utils import get_file_path
 
-load_dotenv()
+
+def get_env_file() -> str:
+    """Path of the .env file settings are read from, "" when there's none."""
+    # the nearest .env from here up, like dotenv's find_dotenv, which is slow to import
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return ""
+        directory = parent
+
+
+def load_env() -> Dict[str, str]:
+    # read .env without exporting it into os.environ; real environment variables win
+    env: Dict[str, str] = {}
+    env_file = get_env_file()
+    if env_file:
+        from dotenv import dotenv_values
+
+        env = {key: value for key, value in dotenv_values(env_file).items() if value is not None}
+    env.update(os.environ)
+    return env
+
 
 class Config:
 
-    def __init__(self) -> None:
-        self.base_url = os.getenv("BASE_URL", "https://neetcode.io/practice")
-        self.log_level = os.getenv("LOG_LEVEL", "DEBUG")
-        self.calendar_credentials_file = get_file_path(os.getenv("CALENDAR_CREDENTIALS_FILE", "credentials.json"))
-        self.calendar_scopes = self.get_scope_list(os.getenv("CALENDAR_SCOPES", 'https://www.googleapis.com/auth/calendar'))
-        self.calendar_id = os.getenv("CALENDAR_ID", "primary")
-        self.problems_file = os.getenv("PROBLEMS_FILE", "problems.json")
-        self.daily_question_limit = int(os.getenv("DAILY_QUESTION_LIMIT", 2))
-        self.total_question_limit = int(os.getenv("TOTAL_QUESTION_LIMIT", 10))
-        self.question_time_limit = float(os.getenv("QUESTION_TIME_LIMIT", 1))
-        self.timezone = os.getenv("TIMEZONE", "America/Los_Angeles")
+    def __init__(self, env: Optional[Mapping[str, str]] = None) -> None:
+        self.env = load_env() if env is None else env
+        self.base_url = self.getenv("BASE_URL", "https://neetcode.io/practice")
+        self.scraper_bulk_extract = self.getenv("SCRAPER_BULK_EXTRACT", "true").lower() == "true"
+        self.scraper_workers = int(self.getenv("SCRAPER_WORKERS", 1))
+        self.scraper_wait_timeout = float(self.getenv("SCRAPER_WAIT_TIMEOUT", 10))
+        self.scraper_backend = self.getenv("SCRAPER_BACKEND", "selenium")
+        self.scraper_data_url = self.getenv("SCRAPER_DATA_URL", "")
+        self.scraper_problems_base_url = self.getenv("SCRAPER_PROBLEMS_BASE_URL", "https://leetcode.com/problems/")
+        self.scraper_fixtures_mode = self.getenv("SCRAPER_FIXTURES_MODE", "off")
+        self.scraper_fixtures_dir = self.getenv("SCRAPER_FIXTURES_DIR", "fixtures")
+        self.log_level = self.getenv("LOG_LEVEL", "DEBUG")
+        self.metrics_file = self.getenv("METRICS_FILE", "")
+        self.profile_dir = self.getenv("PROFILE_DIR", "profile")
+        self.calendar_credentials_file = get_file_path(self.getenv("CALENDAR_CREDENTIALS_FILE", "credentials.json"))
+        self.calendar_scopes = self.get_scope_list(self.getenv("CALENDAR_SCOPES", 'https://www.googleapis.com/auth/calendar'))
+        self.calendar_id = self.getenv("CALENDAR_ID", "primary")
+        self.discovery_cache_dir = self.getenv("DISCOVERY_CACHE_DIR", "discovery")
+        self.discovery_cache_days = float(self.getenv("DISCOVERY_CACHE_DAYS", 7))
+        self.calendar_api_root = self.getenv("CALENDAR_API_ROOT", "")
+        self.calendar_backend = self.getenv("CALENDAR_BACKEND", "api")
+        self.ics_file = self.getenv("ICS_FILE", "schedule.ics")
+        self.problems_file = self.getenv("PROBLEMS_FILE", "problems.json")
+        self.problems_stream_file = self.getenv("PROBLEMS_STREAM_FILE", "problems.ndjson")
+        self.problems_manifest_file = self.getenv("PROBLEMS_MANIFEST_FILE", "problems.manifest.json")
+        self.problems_db = self.getenv("PROBLEMS_DB", "problems.db")
+        self.problems_catalog = self.getenv("PROBLEMS_CATALOG", "false").lower() == "true"
+        self.daily_question_limit = int(self.getenv("DAILY_QUESTION_LIMIT", 2))
+        self.total_question_limit = int(self.getenv("TOTAL_QUESTION_LIMIT", 10))
+        self.question_time_limit = float(self.getenv("QUESTION_TIME_LIMIT", 1))
+        self.timezone = self.getenv("TIMEZONE", "America/Los_Angeles")
+        self.spaced_repetition = self.getenv("SPACED_REPETITION", "false").lower() == "true"
+        self.progress_file = self.getenv("PROGRESS_FILE", "progress.json")
+        self.review_daily_limit = int(self.getenv("REVIEW_DAILY_LIMIT", 4))
+        self.review_days = int(self.getenv("REVIEW_DAYS", 365))
+        # reviews ahead are planned as if they'll all be graded this (SM-2, 0 to 5)
+        self.review_projected_grade = int(self.getenv("REVIEW_PROJECTED_GRADE", 4))
+        self.calendar_concurrency = int(self.getenv("CALENDAR_CONCURRENCY", 8))
+        self.calendar_transport = self.getenv("CALENDAR_TRANSPORT", "httplib2")
+        # 0 sizes the httpx pool to CALENDAR_CONCURRENCY, so requests never queue for a connection
+        self.calendar_max_connections = int(self.getenv("CALENDAR_MAX_CONNECTIONS", 0))
+        self.fanout_workers = int(self.getenv("FANOUT_WORKERS", 16))
+        self.calendar_batch_size = int(self.getenv("CALENDAR_BATCH_SIZE", 50))
+        self.calendar_max_retries = int(self.getenv("CALENDAR_MAX_RETRIES", 5))
+        self.calendar_min_concurrency = int(self.getenv("CALENDAR_MIN_CONCURRENCY", 1))
+        self.calendar_rate_limit = float(self.getenv("CALENDAR_RATE_LIMIT", 10))
+        self.calendar_rate_burst = float(self.getenv("CALENDAR_RATE_BURST", 50))
+        self.calendar_retry_base_delay = float(self.getenv("CALENDAR_RETRY_BASE_DELAY", 0.5))
+        self.calendar_retry_max_delay = float(self.getenv("CALENDAR_RETRY_MAX_DELAY", 32))
+        self.sync_state_file = self.getenv("SYNC_STATE_FILE", "sync_state.json")
+        self.journal_dir = self.getenv("JOURNAL_DIR", "journal")
+        self.calendar_avoid_busy = self.getenv("CALENDAR_AVOID_BUSY", "false").lower() == "true"
+        self.freebusy_calendar_ids = [id.strip() for id in self.getenv("FREEBUSY_CALENDAR_IDS", "").split(",") if id.strip()]
+        self.freebusy_window_days = int(self.getenv("FREEBUSY_WINDOW_DAYS", 60))
+        self.schedule_day_window_hours = float(self.getenv("SCHEDULE_DAY_WINDOW_HOURS", 12))
+        self.watch_interval = float(self.getenv("WATCH_INTERVAL", 5))
+        self.watch_calendar_interval = float(self.getenv("WATCH_CALENDAR_INTERVAL", 60))
+        self.watch_host = self.getenv("WATCH_HOST", "127.0.0.1")
+        # 0 turns the health and metrics endpoint off
+        self.watch_port = int(self.getenv("WATCH_PORT", 8787))
     
+    def getenv(self, key: str, default=None):
+        return self.env.get(key, default)
+
+    def with_overrides(self, overrides: Mapping[str, object]) -> "Config":
+        """A copy with some settings replaced, e.g. {"calendar_id": "me@example.com"}.
+
+        Keys are variable names in either case, values are read like the environment.
+        """
+        env = dict(self.env)
+        for key, value in overrides.items():
+            if isinstance(value, (list, tuple)):
+                value = ",".join(str(item) for item in value)
+            env[key.upper()] = str(value)
+        return Config(env)
+
     def get_scope_list(self, scopes: str) -> List[str]:
-        return scopes.split(",")
-    
-config = Config()
+        return [scope.strip() for scope in scopes.split(",")]
 
-########### Command-line script ###########
-@click.command()
-@click.argument("key", required=False)
-def list_vars(key=None):
-    """List configuration values for the Skill-Assessments project"""
-    if key:
-        print("{}={}".format(key, pformat(getattr(config, key))))
-    else:
-        for var, value in sorted(config.__dict__.items()):
-            if not var.startswith("__"):
-                print("{}={}".format(var, pformat(value)))
 
+class LazyConfig:
+    """Stands in for the Config, resolving it on first attribute access.
+
+    Importing this module reads nothing; the environment and .env file are
+    only read once a value is actually needed, and never exported.
+    """
 
+    def __init__(self) -> None:
+        object.__setattr__(self, "_config", None)
+
+    def resolve(self) -> Config:
+        if self._config is None:
+            object.__setattr__(self, "_config", Config())
+        return self._config
+
+    def reload(self) -> Config:
+        """Read the environment and .env file again, e.g. after the file changed."""
+        object.__setattr__(self, "_config", Config())
+        return self._config
+
+    def __getattr__(self, name: str):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self.resolve(), name, value)
+
+
+config = LazyConfig()
+
+########### Command-line script ###########
 if __name__ == "__main__":
+    from pprint import pformat
+
+    import click
+
+    @click.command()
+    @click.argument("key", required=False)
+    def list_vars(key=None):
+        """List configuration values for the Skill-Assessments project"""
+        if key:
+            print("{}={}".format(key, pformat(getattr(config, key))))
+        else:
+            for var, value in sorted(config.resolve().__dict__.items()):
+                if not var.startswith("__") and var != "env":
+                    print("{}={}".format(var, pformat(value)))
+
     list_vars()
\ No newline at end of file
@@ -1 +1,14 @@
-DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
\ No newline at end of file
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+# the private extended property that marks the events this tool created
+GENERATOR_PROPERTY = "generator"
+GENERATOR_NAME = "leetcode-calendar"
+
+# scraper fixture modes: live only, live and save responses, saved responses only
+FIXTURE_MODES = ("off", "record", "replay")
+
+# where `calendar schedule` sends events: the Calendar API or an .ics file to import
+CALENDAR_BACKENDS = ("api", "ics")
+
+# completion status of a problem in the catalog
+PROBLEM_STATUSES = ("todo", "done", "skipped")
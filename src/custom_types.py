@@ -1,6 +1,11 @@
 
+import sys
+from datetime import datetime
 from typing import Generic, TypeVar
 
+from constants import DATE_FORMAT, GENERATOR_NAME, GENERATOR_PROPERTY
+from utils.utils import get_problem_slug
+
 TEvent = TypeVar("TEvent", bound=dict[str, str])
 # Event = Generic[TEvent]
 # {
@@ -40,4 +45,173 @@ class Event(Generic[TEvent]):
         )
     
     def __repr__(self) -> str:
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
+
+class Problem:
+    """A catalog problem as planned, without the rest of its catalog entry.
+
+    Difficulties are interned, so the thousands of problems in a plan share
+    three strings.
+    """
+
+    __slots__ = ("title", "link", "difficulty", "slug")
+
+    def __init__(self, title: str, link: str, difficulty: str, slug: str) -> None:
+        self.title = title
+        self.link = link
+        self.difficulty = sys.intern(difficulty)
+        self.slug = slug
+
+    @classmethod
+    def from_dict(cls, problem: dict) -> "Problem":
+        return cls(problem["problem"], problem["link"], problem["difficulty"], get_problem_slug(problem))
+
+    def __str__(self) -> str:
+        return "Problem(title={}, difficulty={}, slug={})".format(self.title, self.difficulty, self.slug)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ScheduledEvent:
+    """An event of the plan, kept as native values until it's sent.
+
+    Times stay datetimes and the topic and time zone are interned; the
+    Calendar request body is only built by `to_body`, when the event is
+    inserted, updated, journaled or hashed.
+    """
+
+    __slots__ = (
+        "topic",
+        "problem",
+        "start",
+        "end",
+        "timezone",
+        "color_id",
+        "review",
+        "id",
+        "plan_hash",
+        "plan_anchor",
+    )
+
+    def __init__(
+        self,
+        topic: str,
+        problem: Problem,
+        start: datetime,
+        end: datetime,
+        timezone: str,
+        color_id: int,
+        review: int = 0,
+    ) -> None:
+        self.topic = sys.intern(topic)
+        self.problem = problem
+        self.start = start
+        self.end = end
+        self.timezone = sys.intern(timezone)
+        self.color_id = color_id
+        # 0 for the first time the problem is done, n for its nth review
+        self.review = review
+        # set once the event is given a client id, and by CalendarSync
+        self.id: str = None
+        self.plan_hash: str = None
+        self.plan_anchor: str = None
+
+    @property
+    def summary(self) -> str:
+        return "{}{} - {} ({})".format(
+            "Review: " if self.review else "", self.topic, self.problem.title, self.problem.difficulty
+        )
+
+    @property
+    def description(self) -> str:
+        return self.problem.link
+
+    @property
+    def private(self) -> dict[str, str]:
+        private = {GENERATOR_PROPERTY: GENERATOR_NAME, "problemSlug": self.problem.slug}
+        if self.review:
+            # private properties only hold strings
+            private["review"] = str(self.review)
+        if self.plan_hash:
+            private["planHash"] = self.plan_hash
+        if self.plan_anchor:
+            private["planAnchor"] = self.plan_anchor
+        return private
+
+    def to_body(self, private: bool = True) -> dict:
+        """The events().insert body; `private` adds the extendedProperties."""
+        body = {
+            "summary": self.summary,
+            "description": self.description,
+            "start": {"dateTime": self.start.strftime(DATE_FORMAT), "timeZone": self.timezone},
+            "end": {"dateTime": self.end.strftime(DATE_FORMAT), "timeZone": self.timezone},
+            "colorId": self.color_id,
+        }
+        if self.id:
+            body["id"] = self.id
+        if private:
+            body["extendedProperties"] = {"private": self.private}
+        return body
+
+    def __str__(self) -> str:
+        return "ScheduledEvent(summary={}, start={}, end={}, id={})".format(
+            self.summary, self.start, self.end, self.id
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def to_body(event) -> dict:
+    # planned events are serialized when they're sent, events read back from a journal already are
+    return event.to_body() if isinstance(event, ScheduledEvent) else event
+
+
+def get_event_key(event) -> str:
+    # what a bulk insert reports the event's outcome under
+    if isinstance(event, ScheduledEvent):
+        return event.id or event.summary
+    return event.get("id") or event["summary"]
+
+
+class OperationResult:
+    def __init__(self, key: str, value=None, error: Exception = None) -> None:
+        self.key = key
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __str__(self) -> str:
+        return "OperationResult(key={}, ok={}, error={})".format(
+            self.key, self.ok, self.error
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BulkSummary:
+    def __init__(self, operation: str, results: list[OperationResult], elapsed: float) -> None:
+        self.operation = operation
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self) -> list[OperationResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> list[OperationResult]:
+        return [result for result in self.results if not result.ok]
+
+    def __str__(self) -> str:
+        return "{}: {} succeeded, {} failed in {:.2f}s".format(
+            self.operation, len(self.succeeded), len(self.failed), self.elapsed
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set
+
+from base import BaseClass
+from calendar_sync import CalendarSync, SyncPlan, get_config_hash, get_private_properties
+from config import config, get_env_file
+from custom_types import Event, ScheduledEvent
+from freebusy import BusyIndex
+from google_calendar import GENERATOR_NAME, GENERATOR_PROPERTY, GoogleCalendar
+from metrics import metrics
+from scheduler import iter_topical_problems
+from spaced_repetition import ReviewProgress
+from utils.utils import get_file_path
+
+# the sync token the daemon follows the calendar with
+WATCH_SYNC_KEY = "watch"
+EVENT_FIELDS = "id,status,start,end,extendedProperties/private"
+
+
+def get_mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except (FileNotFoundError, TypeError):
+        return None
+
+
+class StatusServer(ThreadingHTTPServer):
+    """GET /healthz (JSON, 503 once the last sync failed) and /metrics (Prometheus text)."""
+
+    daemon_threads = True
+
+    def __init__(self, watcher: "CalendarWatcher", host: str, port: int) -> None:
+        self.watcher = watcher
+        super().__init__((host, port), self.create_handler())
+
+    def create_handler(self):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                watcher = self.server.watcher
+                if self.path == "/healthz":
+                    health = watcher.get_health()
+                    self.respond(200 if health["ok"] else 503, "application/json", json.dumps(health))
+                elif self.path == "/metrics":
+                    self.respond(200, "text/plain; version=0.0.4", metrics.to_prometheus())
+                else:
+                    self.respond(404, "text/plain", "not found\n")
+
+            def respond(self, status: int, content_type: str, body: str) -> None:
+                content = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return Handler
+
+
+class CalendarWatcher(BaseClass):
+    """Keeps one calendar in sync from a long-running process.
+
+    Credentials, the API client and the problems stay loaded between syncs.
+    Every WATCH_INTERVAL seconds the problems file, the catalog, the review
+    progress file and .env are checked for a new mtime, and every
+    WATCH_CALENDAR_INTERVAL seconds the calendar is polled with a sync
+    token, which keeps an in-memory copy of the generated events current.
+
+    Only what changed is redone. New problems or settings re-plan the whole
+    schedule. A graded review re-plans that problem from the day it was
+    graded (see ReviewPlanner.update). Edits made on the calendar only diff
+    the current plan against the events again. Either way only the events
+    that differ are sent.
+    """
+
+    def __init__(self, dry: bool = False, verbose: bool = False) -> None:
+        super().__init__(dry, verbose)
+        self.executor: ThreadPoolExecutor = None
+        self.calendar: GoogleCalendar = None
+        self.sync: CalendarSync = None
+        self.topical_problems: Dict[str, List[dict]] = None
+        # generated events on the calendar, by id
+        self.events: Dict[str, Event] = {}
+        self.desired: List[ScheduledEvent] = None
+        self.anchor: datetime = None
+        self.busy: Optional[BusyIndex] = None
+        self.progress: Dict[str, dict] = {}
+        self.mtimes: Dict[str, Optional[float]] = {}
+        # what the next reconcile has to redo: "problems", "config", "busy" or review slugs
+        self.pending: Set[str] = set()
+        self.calendar_polled = 0.0
+        self.stopping: asyncio.Event = None
+        self.started = time.time()
+        self.last_sync: float = None
+        self.last_plan: SyncPlan = None
+        self.last_error: str = None
+        self.failed_at: float = None
+        self.server: StatusServer = None
+
+    def __str__(self):
+        return "CalendarWatcher(calendar_id={}, events={}, pending={})".format(
+            config.calendar_id, len(self.events), sorted(self.pending)
+        )
+
+    def get_watched_files(self) -> Dict[str, str]:
+        files = {
+            "problems": get_file_path(config.problems_file),
+            "catalog": get_file_path(config.problems_db),
+            "config": get_env_file(),
+        }
+        if config.spaced_repetition:
+            files["progress"] = get_file_path(config.progress_file)
+        return files
+
+    def get_health(self) -> dict:
+        return {
+            "ok": self.last_error is None,
+            "calendar_id": config.calendar_id,
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "last_sync": datetime.utcfromtimestamp(self.last_sync).isoformat() if self.last_sync else None,
+            "last_plan": str(self.last_plan) if self.last_plan else None,
+            "last_error": self.last_error,
+            "events": len(self.events),
+            "pending": sorted(self.pending),
+        }
+
+    def setup(self) -> None:
+        """(Re)create the calendar client for the current settings."""
+        self.calendar = GoogleCalendar(self.dry, self.verbose, config.resolve(), self.executor)
+        self.sync = CalendarSync(self.calendar, self.dry, self.verbose)
+        self.events = {}
+        self.desired = None
+        self.calendar_polled = 0.0
+        # the first poll lists every event and seeds the sync token
+        self.calendar.sync_state.clear(WATCH_SYNC_KEY)
+        self.mtimes = {name: get_mtime(path) for name, path in self.get_watched_files().items()}
+        self.pending = {"problems"}
+
+    def load_problems(self) -> None:
+        # materialized, so every re-plan reads it from memory
+        topics: Dict[str, List[dict]] = {}
+        with self.calendar.open_problems() as problems:
+            for topic, problem in iter_topical_problems(problems):
+                topics.setdefault(topic, []).append(problem)
+        self.topical_problems = topics
+        # loading re-imports a changed problems file into the catalog, which isn't a change of its own
+        self.mtimes["catalog"] = get_mtime(get_file_path(config.problems_db))
+
+    def check_files(self) -> None:
+        for name, path in self.get_watched_files().items():
+            mtime = get_mtime(path)
+            if mtime == self.mtimes.get(name):
+                continue
+            self.mtimes[name] = mtime
+            self.log("%s changed: %s", name, path)
+            metrics.count("watch.file_changes")
+            if name == "config":
+                self.pending.add("config")
+            elif name == "progress":
+                self.pending.update(self.get_graded_slugs())
+            else:
+                self.pending.add("problems")
+
+    def get_graded_slugs(self) -> Set[str]:
+        cards = ReviewProgress(self.dry, self.verbose, self.calendar.config).cards
+        if any(slug not in cards for slug in self.progress):
+            # a card that was removed can't be re-planned on its own
+            return {"problems"}
+        return {"review:" + slug for slug, card in cards.items() if self.progress.get(slug) != card}
+
+    @metrics.timed("watch.poll_calendar")
+    def poll_calendar(self) -> int:
+        """Apply what changed on the calendar since the last poll; returns how many events changed."""
+        changes = 0
+        generated = 0
+        for event in self.calendar.iter_events(EVENT_FIELDS, sync_key=WATCH_SYNC_KEY):
+            changes += 1
+            # a cancelled event only comes back with its id and status
+            ours = event["id"] in self.events or (
+                get_private_properties(event).get(GENERATOR_PROPERTY) == GENERATOR_NAME
+            )
+            if not ours:
+                # somebody else's event, which only matters for busy time
+                if config.calendar_avoid_busy and self.desired is not None:
+                    self.pending.add("busy")
+                continue
+            generated += 1
+            if event.get("status") == "cancelled":
+                self.events.pop(event["id"], None)
+            else:
+                self.events[event["id"]] = event
+        self.calendar_polled = time.monotonic()
+        metrics.count("watch.calendar_changes", changes)
+        if changes:
+            self.log("%s events changed on the calendar, %s of them generated", changes, generated)
+        return generated
+
+    def plan(self, existing: List[Event]) -> None:
+        anchor = self.sync.get_anchor(existing)
+        graded = {key[len("review:"):] for key in self.pending if key.startswith("review:")}
+        planner = self.calendar.review_planner
+        full = self.desired is None or anchor != self.anchor or bool(self.pending & {"problems", "busy"})
+
+        if not full and graded and planner is not None:
+            progress = ReviewProgress(self.dry, self.verbose, self.calendar.config)
+            for slug in graded:
+                reviewed = progress.cards.get(slug, {}).get("reviewed")
+                planner.update(slug, progress, date.fromisoformat(reviewed) if reviewed else None)
+            self.progress = progress.cards
+            placements = self.calendar.get_review_placements(anchor, self.busy)
+            self.desired = self.sync.tag_events(self.calendar.create_events(placements), anchor)
+            self.log("Re-planned %s graded problems", len(graded))
+            return
+        if not full and not graded:
+            # only the calendar changed, the plan still stands
+            return
+
+        with metrics.span("watch.plan"):
+            self.anchor = anchor
+            self.busy = None if self.dry else self.sync.get_busy_index(anchor, existing)
+            if config.spaced_repetition:
+                self.progress = ReviewProgress(self.dry, self.verbose, self.calendar.config).cards
+            self.desired = self.sync.tag_events(
+                self.calendar.build_events(self.topical_problems, anchor, self.busy), anchor
+            )
+        self.log("Planned %s events from %s", len(self.desired), anchor)
+
+    async def reconcile(self) -> SyncPlan:
+        """Bring the calendar in line with whatever is pending."""
+        if "config" in self.pending:
+            self.log("Reloading config")
+            config.reload()
+            self.setup()
+        if "problems" in self.pending or self.topical_problems is None:
+            await self.calendar.run_blocking(self.load_problems)
+
+        # always diff against the calendar as it is now, our own last changes included
+        if not self.dry:
+            await self.calendar.run_blocking(self.poll_calendar)
+        existing = list(self.events.values())
+        await self.calendar.run_blocking(self.plan, existing)
+        self.pending.clear()
+
+        plan = self.sync.diff(self.desired, existing)
+        self.log("%s", plan)
+        if plan.mutations and not self.dry:
+            summaries = await self.sync.apply(plan)
+            if any(summary.failed for summary in summaries):
+                raise RuntimeError("; ".join(str(summary) for summary in summaries))
+            # pick our own changes up before the next diff
+            self.calendar_polled = 0.0
+        self.sync.manifest.data = self.sync.manifest.load()
+        if self.sync.manifest.is_current():
+            # lets a cron `calendar schedule` know there is nothing left to do
+            self.calendar.sync_state.set(
+                "schedule", digest=self.sync.manifest.digest, config=get_config_hash(self.calendar.config)
+            )
+        metrics.count("watch.syncs")
+        metrics.count("watch.events_sent", plan.mutations)
+        self.last_plan = plan
+        self.last_sync = time.time()
+        return plan
+
+    def start_server(self) -> None:
+        if config.watch_port <= 0:
+            return
+        self.server = StatusServer(self, config.watch_host, config.watch_port)
+        threading.Thread(target=self.server.serve_forever, name="watch-http", daemon=True).start()
+        self.log("Serving /healthz and /metrics on http://%s:%s", config.watch_host, self.server.server_port)
+
+    def stop(self) -> None:
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def run(self, once: bool = False) -> None:
+        """Sync, then keep watching until SIGINT or SIGTERM (or after one sync with `once`)."""
+        metrics.enable()
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, config.calendar_concurrency), thread_name_prefix="watch"
+        )
+        self.setup()
+        self.start_server()
+        try:
+            while not self.stopping.is_set():
+                self.check_files()
+                if self.failed_at and time.monotonic() - self.failed_at >= config.watch_calendar_interval:
+                    self.failed_at = None
+                    self.pending.add("problems")
+                if time.monotonic() - self.calendar_polled >= config.watch_calendar_interval and not self.dry:
+                    try:
+                        if await self.calendar.run_blocking(self.poll_calendar):
+                            self.pending.add("calendar")
+                    except Exception as e:
+                        self.log("Error polling the calendar: %s", e)
+                        self.last_error = "poll: {}".format(e)
+                if self.pending:
+                    try:
+                        await self.reconcile()
+                        self.last_error = None
+                    except Exception as e:
+                        # keep watching and start over after WATCH_CALENDAR_INTERVAL, or on the next change
+                        self.logger.error("Sync failed: %s", e)
+                        metrics.count("watch.sync_errors")
+                        self.last_error = str(e)
+                        self.desired = None
+                        self.pending.clear()
+                        self.failed_at = time.monotonic()
+                if once:
+                    break
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), config.watch_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self.server:
+                self.server.shutdown()
+                self.server.server_close()
+            self.executor.shutdown(wait=False)
+        self.log("Stopped watching")
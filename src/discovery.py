@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from config import config
+from utils.utils import atomic_write_json, get_file_path
+
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+
+# services built in this process, keyed by (api, version, credentials key)
+_services: Dict[Tuple[str, str, Any], Any] = {}
+_services_lock = threading.Lock()
+
+
+def fetch_discovery_document(api: str, version: str) -> dict:
+    # newer googleapiclient releases ship the documents, older ones have to download them
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = get_static_doc(api, version)
+        if document:
+            return json.loads(document)
+    except ImportError:
+        pass
+
+    import httplib2
+
+    response, content = httplib2.Http().request(DISCOVERY_URL.format(api=api, version=version))
+    if response.status != 200:
+        raise RuntimeError(
+            "Error: discovery document for {} {} returned {}".format(api, version, response.status)
+        )
+    return json.loads(content)
+
+
+def read_cached_document(path: str, version: str) -> Optional[dict]:
+    try:
+        with open(path, "r") as json_file:
+            document = json.load(json_file)
+    except (FileNotFoundError, ValueError):
+        return None
+    # e.g. a file copied in by hand for another version
+    return document if document.get("version") == version else None
+
+
+def get_discovery_document(api: str = "calendar", version: str = "v3") -> dict:
+    """The API's discovery document, read from the local cache when it's there.
+
+    The cache keeps one file per API and version; one older than
+    DISCOVERY_CACHE_DAYS is fetched again, and only used when that fails.
+    """
+    path = os.path.join(
+        get_file_path(config.discovery_cache_dir), "{}.{}.json".format(api, version)
+    )
+    cached = read_cached_document(path, version)
+    if cached is not None:
+        age = time.time() - os.path.getmtime(path)
+        if age < config.discovery_cache_days * 86400:
+            return cached
+
+    try:
+        document = fetch_discovery_document(api, version)
+    except Exception:
+        if cached is None:
+            raise
+        # offline, a stale document still builds a working client
+        return cached
+    try:
+        atomic_write_json(path, document)
+    except OSError:
+        # a read-only data directory only costs us the cache
+        pass
+    return document
+
+
+def build_service(
+    credentials,
+    api: str = "calendar",
+    version: str = "v3",
+    key: Any = None,
+    root_url: str = None,
+):
+    """Build a client from the cached discovery document, once per process and `key`.
+
+    `key` identifies the credentials (e.g. their file and scopes), so callers
+    with the same account share one client instead of building it again.
+    `root_url` sends every request, batches included, to another server such
+    as the fake calendar.
+    """
+    cache_key = (api, version, key, root_url)
+    with _services_lock:
+        service = _services.get(cache_key) if key is not None else None
+        if service is None:
+            from googleapiclient.discovery import build_from_document
+
+            document = get_discovery_document(api, version)
+            if root_url:
+                # the batch endpoint is derived from rootUrl, not from baseUrl
+                document = dict(document, rootUrl=root_url, mtlsRootUrl=root_url)
+            service = build_from_document(document, credentials=credentials)
+            if key is not None:
+                _services[cache_key] = service
+    return service
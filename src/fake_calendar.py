@@ -0,0 +1,523 @@
+"""Local stand-in for the Calendar v3 endpoints this project uses.
+
+    python3 src/fake_calendar.py [--port 8765] [--latency 0.05] [--error-rate 0.01] [--quota 10]
+
+Then point the CLI at it with CALENDAR_API_ROOT=http://127.0.0.1:8765/.
+Events live in memory. Supported endpoints: events insert/get/update/delete/list
+(pagination, filters, sync tokens), freeBusy and multipart batch requests.
+Every request can be delayed, failed at random or throttled by a simulated
+per-second quota. GET /_fake/stats reports what the server saw, and
+POST /_fake/reset empties it.
+"""
+import argparse
+import base64
+import email
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from freebusy import BusyIndex, parse_rfc3339
+from request_executor import TokenBucket
+
+EVENTS_PATH = re.compile(r"^/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?$")
+FREEBUSY_PATH = "/calendar/v3/freeBusy"
+BATCH_PATH = "/batch/calendar/v3"
+# client supplied ids must be base32hex, like the real API requires
+EVENT_ID = re.compile(r"^[a-v0-9]{5,1024}$")
+MAX_BATCH_SIZE = 50
+MAX_PAGE_SIZE = 2500
+DEFAULT_PAGE_SIZE = 250
+
+# (status, headers, body)
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+class FakeCalendarError(Exception):
+    def __init__(self, status: int, reason: str, message: str = None) -> None:
+        super().__init__(message or reason)
+        self.status = status
+        self.reason = reason
+
+    def to_response(self) -> Response:
+        # the shape googleapiclient's HttpError (and our throttle detection) reads
+        error = {
+            "code": self.status,
+            "message": str(self),
+            "errors": [{"domain": "global", "reason": self.reason, "message": str(self)}],
+        }
+        return json_response(self.status, {"error": error})
+
+
+def json_response(status: int, data: Any = None) -> Response:
+    if data is None:
+        return status, {}, b""
+    return status, {"Content-Type": "application/json; charset=UTF-8"}, json.dumps(data).encode()
+
+
+def encode_token(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_token(token: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise FakeCalendarError(400, "invalid", "Invalid page token")
+
+
+def get_event_time(value: dict) -> datetime:
+    if "dateTime" in value:
+        return parse_rfc3339(value["dateTime"])
+    return datetime.strptime(value["date"], "%Y-%m-%d")
+
+
+class FakeCalendarStore:
+    """In-memory calendars with a change log for sync tokens.
+
+    Every mutation bumps a global version and stamps the event with it, so a
+    sync token is just the version a listing saw. Deleted events stay behind as
+    cancelled tombstones until `expire_sync_tokens` drops them, after which
+    older tokens get the 410 the real API sends.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calendars: Dict[str, Dict[str, dict]] = {}
+            self.version = 0
+            self.min_sync_version = 0
+
+    def get_calendar(self, calendar_id: str) -> Dict[str, dict]:
+        return self.calendars.setdefault(calendar_id, {})
+
+    def count(self, calendar_id: str = None) -> int:
+        with self.lock:
+            calendars = [self.get_calendar(calendar_id)] if calendar_id else self.calendars.values()
+            return sum(
+                1
+                for events in calendars
+                for event in events.values()
+                if event["status"] != "cancelled"
+            )
+
+    def expire_sync_tokens(self) -> None:
+        with self.lock:
+            self.min_sync_version = self.version
+            for events in self.calendars.values():
+                for event_id in [id for id, event in events.items() if event["status"] == "cancelled"]:
+                    del events[event_id]
+
+    def stamp(self, event: dict) -> dict:
+        self.version += 1
+        event["_version"] = self.version
+        event["updated"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        event["etag"] = '"{}"'.format(self.version)
+        return event
+
+    def insert(self, calendar_id: str, body: dict) -> dict:
+        if "start" not in body or "end" not in body:
+            raise FakeCalendarError(400, "required", "Missing start or end time")
+        event_id = body.get("id")
+        if event_id is not None and not EVENT_ID.match(event_id):
+            raise FakeCalendarError(400, "invalid", "Invalid resource id value")
+        with self.lock:
+            events = self.get_calendar(calendar_id)
+            if event_id is None:
+                event_id = uuid.uuid4().hex
+            elif event_id in events:
+                # the real API refuses an id even after the event was deleted
+                raise FakeCalendarError(409, "duplicate", "The requested identifier already exists")
+            event = dict(body, id=event_id, status="confirmed", kind="calendar#event")
+            event["htmlLink"] = "https://calendar.local/event?eid={}".format(event_id)
+            events[event_id] = self.stamp(event)
+            return self.to_resource(event)
+
+    def get(self, calendar_id: str, event_id: str) -> dict:
+        with self.lock:
+            return self.to_resource(self.find(calendar_id, event_id))
+
+    def update(self, calendar_id: str, event_id: str, body: dict) -> dict:
+        with self.lock:
+            event = self.find(calendar_id, event_id)
+            updated = dict(body, id=event_id, status="confirmed", kind="calendar#event")
+            updated["htmlLink"] = event["htmlLink"]
+            self.get_calendar(calendar_id)[event_id] = self.stamp(updated)
+            return self.to_resource(updated)
+
+    def delete(self, calendar_id: str, event_id: str) -> None:
+        with self.lock:
+            event = self.find(calendar_id, event_id)
+            event["status"] = "cancelled"
+            self.stamp(event)
+
+    def find(self, calendar_id: str, event_id: str) -> dict:
+        event = self.get_calendar(calendar_id).get(event_id)
+        if event is None:
+            raise FakeCalendarError(404, "notFound", "Not Found")
+        if event["status"] == "cancelled":
+            raise FakeCalendarError(410, "deleted", "Resource has been deleted")
+        return event
+
+    def to_resource(self, event: dict) -> dict:
+        return {key: value for key, value in event.items() if not key.startswith("_")}
+
+    def list(self, calendar_id: str, query: Dict[str, List[str]]) -> dict:
+        """events().list with pageToken cursors that survive concurrent deletes."""
+        option = lambda key: query.get(key, [None])[0]
+        page_size = min(int(option("maxResults") or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+        sync_token = option("syncToken")
+        page_token = decode_token(option("pageToken")) if option("pageToken") else {}
+
+        if sync_token:
+            for key in ("timeMin", "timeMax", "orderBy", "privateExtendedProperty", "q"):
+                if key in query:
+                    raise FakeCalendarError(400, "invalid", "{} can't be used with syncToken".format(key))
+            try:
+                since = int(sync_token)
+            except ValueError:
+                raise FakeCalendarError(400, "invalid", "Invalid sync token value")
+            if since < self.min_sync_version:
+                raise FakeCalendarError(410, "fullSyncRequired", "Sync token is no longer valid")
+
+        with self.lock:
+            # a listing reports the version it started at, not where it ended
+            snapshot = page_token.get("version", self.version)
+            events = self.get_calendar(calendar_id).values()
+            if sync_token:
+                matches = [event for event in events if event["_version"] > int(sync_token)]
+            else:
+                matches = self.filter_events(events, query)
+            order_by_start = option("orderBy") == "startTime"
+            if order_by_start:
+                key = lambda event: [get_event_time(event["start"]).isoformat(), event["id"]]
+            else:
+                key = lambda event: [event["_version"], event["id"]]
+            matches.sort(key=key)
+
+            after = page_token.get("after")
+            if after is not None:
+                matches = [event for event in matches if key(event) > after]
+            page = matches[:page_size]
+            response = {
+                "kind": "calendar#events",
+                "items": [self.to_resource(event) for event in page],
+            }
+            if len(matches) > page_size:
+                response["nextPageToken"] = encode_token({"after": key(page[-1]), "version": snapshot})
+            else:
+                response["nextSyncToken"] = str(snapshot)
+            return response
+
+    def filter_events(self, events, query: Dict[str, List[str]]) -> List[dict]:
+        time_min = parse_rfc3339(query["timeMin"][0]) if "timeMin" in query else None
+        time_max = parse_rfc3339(query["timeMax"][0]) if "timeMax" in query else None
+        show_deleted = query.get("showDeleted", ["false"])[0] == "true"
+        private = [value.split("=", 1) for value in query.get("privateExtendedProperty", [])]
+
+        matches = []
+        for event in events:
+            if event["status"] == "cancelled" and not show_deleted:
+                continue
+            if time_min and get_event_time(event["end"]) <= time_min:
+                continue
+            if time_max and get_event_time(event["start"]) >= time_max:
+                continue
+            properties = event.get("extendedProperties", {}).get("private", {})
+            if any(properties.get(key) != value for key, value in private):
+                continue
+            matches.append(event)
+        return matches
+
+    def freebusy(self, body: dict) -> dict:
+        time_min = parse_rfc3339(body["timeMin"])
+        time_max = parse_rfc3339(body["timeMax"])
+        calendars = {}
+        with self.lock:
+            for item in body.get("items", []):
+                busy = BusyIndex(
+                    (max(start, time_min), min(end, time_max))
+                    for start, end in (
+                        (get_event_time(event["start"]), get_event_time(event["end"]))
+                        for event in self.get_calendar(item["id"]).values()
+                        if event["status"] != "cancelled" and event.get("transparency") != "transparent"
+                    )
+                )
+                calendars[item["id"]] = {
+                    "busy": [
+                        {"start": start.strftime("%Y-%m-%dT%H:%M:%SZ"), "end": end.strftime("%Y-%m-%dT%H:%M:%SZ")}
+                        for start, end in busy.intervals
+                    ]
+                }
+        return {
+            "kind": "calendar#freeBusy",
+            "timeMin": body["timeMin"],
+            "timeMax": body["timeMax"],
+            "calendars": calendars,
+        }
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections when hundreds of clients connect at once
+    request_queue_size = 1024
+
+
+class FakeCalendarServer:
+    """Serves a FakeCalendarStore over HTTP on a background thread.
+
+    `latency` (plus up to `jitter`) is slept once per HTTP request, a batch
+    included. `error_rate` fails that share of calls with a 503, and
+    `quota_rate` calls per second (`quota_burst` banked) are allowed before
+    calls get a 403 rateLimitExceeded. Calls inside a batch count against the
+    quota and fail on their own, like they do against Google.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        quota_rate: float = 0.0,
+        quota_burst: float = None,
+        store: FakeCalendarStore = None,
+    ) -> None:
+        self.store = store or FakeCalendarStore()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota = TokenBucket(quota_rate, quota_burst or max(1.0, quota_rate))
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+        self.httpd = FakeHTTPServer((host, port), self.create_handler())
+        self.thread: Optional[threading.Thread] = None
+
+    def __str__(self):
+        return "FakeCalendarServer(url={}, latency={}, error_rate={}, quota={})".format(
+            self.url, self.latency, self.error_rate, self.quota.rate
+        )
+
+    def __enter__(self) -> "FakeCalendarServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    def start(self) -> "FakeCalendarServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-calendar", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self) -> None:
+        with self.stats_lock:
+            self.stats: Dict[str, int] = {
+                "http_requests": 0,
+                "calls": 0,
+                "batches": 0,
+                "throttled": 0,
+                "injected_errors": 0,
+                "in_flight": 0,
+                "max_in_flight": 0,
+            }
+
+    def count(self, stat: str, value: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[stat] = self.stats.get(stat, 0) + value
+            if stat == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["events"] = self.store.count()
+        return stats
+
+    def create_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def handle_method(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, headers, content = server.handle_http(
+                    self.command, self.path, dict(self.headers), body
+                )
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_method
+
+        return Handler
+
+    def handle_http(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Response:
+        self.count("http_requests")
+        self.count("in_flight")
+        try:
+            delay = self.latency + random.uniform(0, self.jitter)
+            if delay > 0:
+                time.sleep(delay)
+            route = urlparse(path).path
+            if route == "/_fake/stats":
+                return json_response(200, self.get_stats())
+            if route == "/_fake/reset":
+                self.store.reset()
+                self.reset_stats()
+                return json_response(204)
+            if route == BATCH_PATH and method == "POST":
+                return self.handle_batch(headers, body)
+            return self.handle_call(method, path, body)
+        finally:
+            self.count("in_flight", -1)
+
+    def handle_call(self, method: str, path: str, body: bytes) -> Response:
+        self.count("calls")
+        try:
+            if self.quota.rate > 0 and self.quota.reserve() > 0:
+                # refund the token: a rejected call doesn't use up quota
+                self.quota.reserve(-1)
+                self.count("throttled")
+                raise FakeCalendarError(403, "rateLimitExceeded", "Rate Limit Exceeded")
+            if self.error_rate and random.random() < self.error_rate:
+                self.count("injected_errors")
+                raise FakeCalendarError(503, "backendError", "Backend Error")
+            return self.route(method, path, json.loads(body) if body else None)
+        except FakeCalendarError as e:
+            return e.to_response()
+
+    def route(self, method: str, path: str, body: Optional[dict]) -> Response:
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        if url.path == FREEBUSY_PATH and method == "POST":
+            self.count("freebusy")
+            return json_response(200, self.store.freebusy(body or {}))
+
+        match = EVENTS_PATH.match(url.path)
+        if not match:
+            raise FakeCalendarError(404, "notFound", "Unknown path {}".format(url.path))
+        calendar_id = unquote(match.group(1))
+        event_id = unquote(match.group(2)) if match.group(2) else None
+
+        if event_id is None and method == "GET":
+            self.count("list")
+            return json_response(200, self.store.list(calendar_id, query))
+        if event_id is None and method == "POST":
+            self.count("insert")
+            return json_response(200, self.store.insert(calendar_id, body or {}))
+        if event_id is not None and method == "GET":
+            self.count("get")
+            return json_response(200, self.store.get(calendar_id, event_id))
+        if event_id is not None and method in ("PUT", "PATCH"):
+            self.count("update")
+            if method == "PATCH":
+                body = dict(self.store.get(calendar_id, event_id), **(body or {}))
+            return json_response(200, self.store.update(calendar_id, event_id, body or {}))
+        if event_id is not None and method == "DELETE":
+            self.count("delete")
+            self.store.delete(calendar_id, event_id)
+            return json_response(204)
+        raise FakeCalendarError(405, "methodNotAllowed", "Method not allowed")
+
+    def handle_batch(self, headers: Dict[str, str], body: bytes) -> Response:
+        self.count("batches")
+        content_type = {key.lower(): value for key, value in headers.items()}.get("content-type", "")
+        message = email.message_from_bytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+        )
+        if not message.is_multipart():
+            return FakeCalendarError(400, "invalid", "Batch body is not multipart/mixed").to_response()
+        parts = message.get_payload()
+        if len(parts) > MAX_BATCH_SIZE:
+            return FakeCalendarError(400, "limitExceeded", "Too many requests in batch").to_response()
+
+        boundary = "batch_{}".format(uuid.uuid4().hex)
+        chunks = []
+        for part in parts:
+            payload = part.get_payload(decode=True).decode()
+            request_line, rest = payload.split("\n", 1)
+            method, path = request_line.split(" ")[:2]
+            request = email.message_from_string(rest)
+            status, response_headers, content = self.handle_call(
+                method, path, request.get_payload().encode()
+            )
+            response_headers = "".join(
+                "{}: {}\r\n".format(key, value) for key, value in response_headers.items()
+            )
+            content_id = part["Content-ID"].strip("<>")
+            chunks.append(
+                "--{}\r\nContent-Type: application/http\r\nContent-ID: <response-{}>\r\n\r\n"
+                "HTTP/1.1 {} {}\r\n{}Content-Length: {}\r\n\r\n{}\r\n".format(
+                    boundary,
+                    content_id,
+                    status,
+                    "OK" if status < 300 else "Error",
+                    response_headers,
+                    len(content),
+                    content.decode(),
+                )
+            )
+        chunks.append("--{}--\r\n".format(boundary))
+        return (
+            200,
+            {"Content-Type": 'multipart/mixed; boundary="{}"'.format(boundary)},
+            "".join(chunks).encode(),
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every HTTP request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls failed with a 503")
+    parser.add_argument("--quota", type=float, default=0.0, help="Calls per second before throttling, 0 for none")
+    parser.add_argument("--quota-burst", type=float, default=None)
+    args = parser.parse_args()
+
+    server = FakeCalendarServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        quota_rate=args.quota,
+        quota_burst=args.quota_burst,
+    )
+    print("Serving {}, set CALENDAR_API_ROOT={}".format(server, server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from base import BaseClass
+from calendar_sync import CalendarSync
+from config import Config, config
+from google_calendar import GoogleCalendar
+from metrics import metrics
+from scheduler import iter_topical_problems
+
+
+class RosterEntry:
+    def __init__(self, name: str, settings: Config) -> None:
+        self.name = name
+        self.settings = settings
+
+    def __str__(self) -> str:
+        return "RosterEntry(name={}, calendar_id={})".format(self.name, self.settings.calendar_id)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class FanoutResult:
+    def __init__(self, name: str, calendar_id: str) -> None:
+        self.name = name
+        self.calendar_id = calendar_id
+        self.summary = ""
+        self.failed = 0
+        self.error: Exception = None
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.failed == 0
+
+    def __str__(self) -> str:
+        outcome = "Error: {}".format(self.error) if self.error else self.summary
+        return "{} ({}): {} in {:.2f}s".format(self.name, self.calendar_id, outcome, self.elapsed)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def load_roster(path: str, base: Config = None) -> List[RosterEntry]:
+    """Read a roster of calendars to schedule.
+
+    The file is JSON, either a list of calendars or
+    {"defaults": {...}, "calendars": [...]}. Every calendar has a "name" and
+    any config settings to override (e.g. "calendar_id", "timezone",
+    "daily_question_limit", "calendar_credentials_file"), in either case.
+    """
+    base = base or config.resolve()
+    with open(path, "r") as roster_file:
+        roster = json.load(roster_file)
+    if isinstance(roster, list):
+        roster = {"calendars": roster}
+    defaults = roster.get("defaults", {})
+
+    entries: List[RosterEntry] = []
+    names = set()
+    for index, calendar in enumerate(roster.get("calendars", [])):
+        overrides = dict(defaults, **calendar)
+        name = str(overrides.pop("name", "") or "")
+        if not name:
+            raise ValueError("Calendar {} in {} has no name".format(index, path))
+        if name in names:
+            raise ValueError("Calendar name {} is used twice in {}".format(name, path))
+        if not any(key.lower() == "calendar_id" for key in overrides):
+            raise ValueError("Calendar {} in {} has no calendar_id".format(name, path))
+        # a sync state file per calendar, so concurrent syncs never overwrite each other's
+        if not any(key.lower() == "sync_state_file" for key in overrides):
+            overrides["sync_state_file"] = "sync_state.{}.json".format(name)
+        names.add(name)
+        entries.append(RosterEntry(name, base.with_overrides(overrides)))
+    return entries
+
+
+class Fanout(BaseClass):
+    """Schedules every calendar on a roster from one process.
+
+    Problems are loaded once and every schedule is planned from that shared
+    copy. Calendars are pushed concurrently on one worker pool, whose threads
+    each keep one pooled connection for all calendars, and credentials are
+    loaded once per file. Every calendar has its own RequestExecutor, so one
+    calendar running into its quota doesn't slow down the others.
+    """
+
+    def __init__(
+        self,
+        roster: List[RosterEntry],
+        sync: bool = True,
+        dry: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(dry, verbose)
+        self.roster = roster
+        self.sync = sync
+        self.workers = max(1, config.fanout_workers)
+
+    def __str__(self):
+        return "Fanout(calendars={}, sync={}, workers={})".format(
+            len(self.roster), self.sync, self.workers
+        )
+
+    @metrics.timed("fanout.load_problems")
+    def load_problems(self) -> Dict[str, List[dict]]:
+        # materialized once, since every calendar reads it again
+        topics: Dict[str, List[dict]] = {}
+        with GoogleCalendar(self.dry, self.verbose).open_problems() as problems:
+            for topic, problem in iter_topical_problems(problems):
+                topics.setdefault(topic, []).append(problem)
+        self.log("Loaded %s problems for %s calendars", sum(map(len, topics.values())), len(self.roster))
+        return topics
+
+    async def run(self, rebase: bool = False, force: bool = False) -> List[FanoutResult]:
+        topical_problems = self.load_problems()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fanout")
+        try:
+            return await asyncio.gather(
+                *[
+                    self.run_calendar(entry, executor, topical_problems, rebase, force)
+                    for entry in self.roster
+                ]
+            )
+        finally:
+            executor.shutdown(wait=False)
+
+    async def run_calendar(
+        self,
+        entry: RosterEntry,
+        executor: ThreadPoolExecutor,
+        topical_problems: Dict[str, List[dict]],
+        rebase: bool,
+        force: bool,
+    ) -> FanoutResult:
+        result = FanoutResult(entry.name, entry.settings.calendar_id)
+        started = time.perf_counter()
+        try:
+            calendar = GoogleCalendar(self.dry, self.verbose, entry.settings, executor)
+            if self.sync:
+                calendar_sync = CalendarSync(calendar, self.dry, self.verbose)
+                plan = await calendar_sync.run(rebase, force, topical_problems)
+                result.summary = str(plan)
+                result.failed = sum(len(summary.failed) for summary in calendar_sync.summaries)
+            else:
+                events = await calendar.create_problem_schedule(topical_problems)
+                summary = calendar.last_summary
+                result.summary = str(summary) if summary else "{} events planned".format(len(events))
+                result.failed = len(summary.failed) if summary else 0
+        except Exception as e:
+            # one calendar failing doesn't stop the rest of the roster
+            self.log("Error scheduling %s: %s", entry.name, e)
+            result.error = e
+        result.elapsed = time.perf_counter() - started
+        self.log("%s", result)
+        return result
@@ -0,0 +1,104 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+def parse_rfc3339(value: str) -> datetime:
+    """Parse an API timestamp into the naive UTC datetimes the planner works in.
+
+    Events are written with a trailing "Z", so the naive times the scheduler
+    produces are read by the API as UTC; busy times are compared in that frame.
+    """
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class BusyIndex:
+    """Sorted, merged busy intervals searchable with bisect."""
+
+    def __init__(self, intervals: Iterable[Interval] = ()) -> None:
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.set(intervals)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __str__(self) -> str:
+        return "BusyIndex(intervals={})".format(len(self))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    @property
+    def intervals(self) -> List[Interval]:
+        return list(zip(self.starts, self.ends))
+
+    def set(self, intervals: Iterable[Interval]) -> None:
+        merged: List[Interval] = []
+        for start, end in sorted(interval for interval in intervals if interval[0] < interval[1]):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def add(self, intervals: Iterable[Interval]) -> None:
+        """Merge `intervals` in, each one bisected into place instead of sorting everything again."""
+        for start, end in intervals:
+            if start >= end:
+                continue
+            # the blocks it overlaps or touches: ending at or after its start, starting at or before its end
+            low = bisect_left(self.ends, start)
+            high = bisect_right(self.starts, end)
+            if low < high:
+                start = min(start, self.starts[low])
+                end = max(end, self.ends[high - 1])
+            self.starts[low:high] = [start]
+            self.ends[low:high] = [end]
+
+    def subtract(self, intervals: Iterable[Interval]) -> None:
+        """Free up `intervals`, e.g. events this tool is about to re-plan anyway.
+
+        Busy blocks come back merged, so this also frees any other busy time
+        that overlaps a removed interval. Only the blocks a cut overlaps,
+        found by bisect, are touched.
+        """
+        for cut_start, cut_end in intervals:
+            if cut_start >= cut_end:
+                continue
+            # the blocks it overlaps: ending after its start, starting before its end
+            low = bisect_right(self.ends, cut_start)
+            high = bisect_left(self.starts, cut_end)
+            if low >= high:
+                continue
+            starts: List[datetime] = []
+            ends: List[datetime] = []
+            if self.starts[low] < cut_start:
+                starts.append(self.starts[low])
+                ends.append(cut_start)
+            if self.ends[high - 1] > cut_end:
+                starts.append(cut_end)
+                ends.append(self.ends[high - 1])
+            self.starts[low:high] = starts
+            self.ends[low:high] = ends
+
+    def find_free(
+        self, start: datetime, duration, latest_end: datetime = None
+    ) -> Optional[datetime]:
+        """Earliest start >= `start` with `duration` free, or None past `latest_end`."""
+        index = bisect_right(self.starts, start) - 1
+        if index >= 0 and self.ends[index] > start:
+            start = self.ends[index]
+        index += 1
+        while index < len(self.starts) and self.starts[index] < start + duration:
+            start = max(start, self.ends[index])
+            index += 1
+        if latest_end is not None and start + duration > latest_end:
+            return None
+        return start
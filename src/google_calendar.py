@@ -1,163 +1,545 @@
 import asyncio
-import json
-from datetime import datetime, timedelta
-from pprint import pprint
-from typing import List, Tuple
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, List, Tuple
 
-from requests import HTTPError
 from base import BaseClass
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-
-from config import config
-from custom_types import Event
-from constants import DATE_FORMAT
+from calendar_batch import CalendarBatcher
+from freebusy import BusyIndex, parse_rfc3339
+from scheduler import Placement, Scheduler
+from journal import Journal
+from request_executor import RequestExecutor, get_error_status, is_http_error
+
+from config import Config, config
+from custom_types import BulkSummary, Event, OperationResult, Problem, ScheduledEvent, get_event_key, to_body
+from discovery import build_service
+from metrics import CountingHttp, metrics
+from sync_state import SyncState
+from constants import DATE_FORMAT, GENERATOR_NAME, GENERATOR_PROPERTY
 from utils.utils import get_file_path
 
+# the catalog (sqlite), problem stream and spaced repetition modules are only
+# imported by the methods that use them, so listing events starts quickly
+if TYPE_CHECKING:
+    from spaced_repetition import ReviewPlanner
+
+# one httplib2 connection pool per worker thread, shared by every calendar
+_transport = threading.local()
+# credentials by (file, scopes), loaded once per process
+_credentials: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+_credentials_lock = threading.Lock()
+
 
 class GoogleCalendar(BaseClass):
-    def __init__(self, dry: bool = False, verbose: bool = False) -> None:
+    """One calendar, configured by `settings` (the global config by default).
+
+    Calendars in one process can share a worker `executor`; each keeps its own
+    RequestExecutor, so rate limits, retries and throttling stay per calendar.
+    """
+
+    def __init__(
+        self,
+        dry: bool = False,
+        verbose: bool = False,
+        settings: Config = None,
+        executor: ThreadPoolExecutor = None,
+    ) -> None:
         super().__init__(dry, verbose)
-        self.service = build("calendar", "v3", credentials=self.get_credentials())
-        self.daily_question_limit = config.daily_question_limit
-        self.total_question_limit = config.total_question_limit
+        self.config = settings or config
+        # the credentials and API client are only loaded once a request needs them
+        self._credentials = None
+        self._service = None
+        self._events_api = None
+        self.daily_question_limit = self.config.daily_question_limit
+        self.total_question_limit = self.config.total_question_limit
+        self.concurrency = max(1, self.config.calendar_concurrency)
+        # every request goes through one executor that rate limits, retries
+        # and adapts how many of them are in flight at once
+        self.request_executor = RequestExecutor(
+            rate=self.config.calendar_rate_limit,
+            burst=self.config.calendar_rate_burst,
+            max_retries=self.config.calendar_max_retries,
+            base_delay=self.config.calendar_retry_base_delay,
+            max_delay=self.config.calendar_retry_max_delay,
+            min_concurrency=self.config.calendar_min_concurrency,
+            max_concurrency=self.concurrency,
+            dry=dry,
+            verbose=verbose,
+        )
+        # httplib2 is not thread-safe, so every worker thread gets its own
+        # authorized transport instead of sharing the one bound to the service
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="calendar"
+        )
+        self._local = threading.local()
+        # with the httpx transport, requests are sent from this loop by its async client
+        self.async_transport = self.config.calendar_transport == "httpx"
+        self._loop: asyncio.AbstractEventLoop = None
+        # batch_size <= 1 disables batching and sends one request per event
+        self.batcher = CalendarBatcher(
+            self,
+            batch_size=self.config.calendar_batch_size,
+            max_retries=self.config.calendar_max_retries,
+            dry=dry,
+            verbose=verbose,
+        )
+        self.last_summary: BulkSummary = None
+        # the last spaced repetition plan, kept so a graded review only re-plans what it changes
+        self.review_planner: "ReviewPlanner" = None
+        self.sync_state = SyncState(dry, verbose, self.config)
 
     def __str__(self):
-        return "Calendar(dry={}, verbose={})".format(self.dry, self.verbose)
+        return "Calendar(calendar_id={}, dry={}, verbose={})".format(
+            self.config.calendar_id, self.dry, self.verbose
+        )
 
-    def get_credentials(self):
-        try:
-            return service_account.Credentials.from_service_account_file(
-                config.calendar_credentials_file, scopes=config.calendar_scopes
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            self._credentials = self.get_credentials()
+        return self._credentials
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = build_service(
+                self.credentials,
+                key=(self.config.calendar_credentials_file, tuple(self.config.calendar_scopes)),
+                root_url=self.config.calendar_api_root or None,
             )
-        except Exception as e:
-            self.log("Error get_credentials: %s" % e)
-            raise e
+        return self._service
 
-    def get_events(self, start_time: str = None, max_results: int = 10) -> List[Event]:
-        all_events: List[Tuple[datetime, str]] = []
+    @property
+    def events_api(self):
+        # building a resource generates every one of its methods, so it's only done once
+        if self._events_api is None:
+            self._events_api = self.service.events()
+        return self._events_api
 
-        try:
-            now = datetime.utcnow().isoformat() + "Z"  # 'Z' indicates UTC time
-            # format start_time to isoformat
-            formattedStartTime = (
-                str(datetime.strptime(start_time, "%Y-%m-%d").strftime(DATE_FORMAT))
-                if start_time
-                else None
-            )
-            self.log(formattedStartTime)
-            timeMin = formattedStartTime if formattedStartTime else now
-            self.log(f"timeMin = {timeMin}")
-            self.log(f"Getting the upcoming {max_results} events from {timeMin}...")
-            options = {
-                "timeMin": timeMin,
-                "maxResults": max_results,
-                "singleEvents": True,
-                "orderBy": "startTime",
-            }
-            events_result = (
-                self.service.events()
-                .list(calendarId=config.calendar_id, **options)
-                .execute()
-            )
+    def get_credentials(self):
+        if self.config.calendar_api_root:
+            # a local stand-in such as fake_calendar.py doesn't check credentials
+            from google.auth.credentials import AnonymousCredentials
+
+            return AnonymousCredentials()
 
-            events = events_result.get("items", [])
+        from google.oauth2 import service_account
 
-            if not events:
-                self.log("No upcoming events found.")
+        key = (self.config.calendar_credentials_file, tuple(self.config.calendar_scopes))
+        with _credentials_lock:
+            if key not in _credentials:
+                try:
+                    _credentials[key] = service_account.Credentials.from_service_account_file(
+                        self.config.calendar_credentials_file, scopes=self.config.calendar_scopes
+                    )
+                except Exception as e:
+                    self.log("Error get_credentials: %s", e)
+                    raise e
+            return _credentials[key]
+
+    def iter_event_pages(
+        self,
+        fields: str = None,
+        sync_key: str = None,
+        page_size: int = 2500,
+        **options,
+    ) -> Iterator[List[Event]]:
+        """Yield pages of events from events().list as they arrive.
+
+        `fields` is the partial-response mask for a single event, e.g. "id,start".
+        With a `sync_key` the listing resumes from the stored nextSyncToken and
+        only yields what changed since the last run, cancelled events included.
+        Sync tokens can't be combined with filters such as timeMin or orderBy,
+        so a tracked listing must always be started with the same options.
+        """
+        sync_token = self.sync_state.get(sync_key).get("syncToken") if sync_key else None
+        request_options = {"calendarId": self.config.calendar_id, "maxResults": page_size}
+        if sync_token:
+            request_options["syncToken"] = sync_token
+        else:
+            request_options.update(options)
+        if fields:
+            request_options["fields"] = "nextPageToken,nextSyncToken,items({})".format(fields)
+
+        next_page_token = None
+        pages = 0
+        while True:
+            try:
+                with metrics.span("calendar.list_page"):
+                    response = self.execute(
+                        self.events_api.list(pageToken=next_page_token, **request_options)
+                    )
+            except Exception as e:
+                if not is_http_error(e):
+                    raise
+                if e.resp.status == 410 and sync_token:
+                    # the token expired, start over with a full listing
+                    self.log("Sync token for %s expired, doing a full sync", sync_key)
+                    self.sync_state.clear(sync_key)
+                    yield from self.iter_event_pages(fields, sync_key, page_size, **options)
+                    return
+                self.log("Error: GoogleCalendar received %s while retrieving events", e.resp.status)
+                raise e
+
+            events = response.get("items", [])
+            pages += 1
+            metrics.count("calendar.events_listed", len(events))
+            self.log("Got %s events on page %s", len(events), pages)
+            yield events
+
+            next_page_token = response.get("nextPageToken")
+            if not next_page_token:
+                if sync_key and response.get("nextSyncToken"):
+                    self.sync_state.set(sync_key, syncToken=response["nextSyncToken"])
+                break
+
+    def iter_events(self, fields: str = None, sync_key: str = None, **options) -> Iterator[Event]:
+        for page in self.iter_event_pages(fields, sync_key, **options):
+            yield from page
+
+    def get_events(
+        self, start_time=None, max_results: int = None, incremental: bool = False
+    ) -> List[Tuple[str, str]]:
+        all_events: List[Tuple[str, str]] = []
+
+        if self.dry:
+            self.log("Dry run, not listing events")
+            return all_events
+
+        try:
+            if incremental:
+                self.log("Getting events changed since the last incremental listing...")
+                events = self.iter_events("id,status,summary,start", sync_key="list")
             else:
-                for event in events:
-                    start = event["start"].get("dateTime", event["start"].get("date"))
-                    all_events.append((start, event["summary"]))
-        except HTTPError as e:
-            self.log(
-                "Error: GoogleCalendar received %s while retrieving events"
-                % e.resp.status
-            )
+                if isinstance(start_time, str):
+                    start_time = datetime.strptime(start_time, "%Y-%m-%d")
+                # 'Z' indicates UTC time
+                timeMin = self.formart_date(start_time or datetime.utcnow())
+                self.log(f"Getting upcoming events from {timeMin}...")
+                events = self.iter_events(
+                    "summary,start",
+                    page_size=min(max_results or 2500, 2500),
+                    timeMin=timeMin,
+                    singleEvents=True,
+                    orderBy="startTime",
+                )
+
+            for event in islice(events, max_results):
+                if event.get("status") == "cancelled":
+                    continue
+                start = event["start"].get("dateTime", event["start"].get("date"))
+                all_events.append((start, event.get("summary", "")))
+        except Exception as e:
+            if not is_http_error(e):
+                raise
+            # the events listed before the error are still returned
+            self.log("Error: GoogleCalendar received %s while retrieving events", get_error_status(e))
         finally:
-            self.log("Got %s events" % len(all_events))
-            return all_events
+            self.log("Got %s events", len(all_events))
+        return all_events
 
     def formart_date(self, date: datetime) -> str:
-        return date.isoformat() + "Z"
+        # strftime keeps the microseconds that isoformat drops when they are 0
+        return date.strftime(DATE_FORMAT)
+
+    def get_http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+
+            pool = getattr(_transport, "http", None)
+            if pool is None:
+                pool = _transport.http = httplib2.Http()
+            http = AuthorizedHttp(self.credentials, http=pool)
+            if metrics.enabled:
+                http = CountingHttp(http, "calendar")
+            self._local.http = http
+        return http
+
+    def execute(self, request, cost: int = 1) -> Any:
+        # `cost` is the number of API calls the request counts as, e.g. a batch
+        loop = self.get_client_loop()
+        if loop is not None:
+            # a worker thread hands the request to the event loop's async client
+            return asyncio.run_coroutine_threadsafe(self.send_async(request, cost), loop).result()
+        with metrics.span("calendar.request"):
+            return self.request_executor.execute(
+                lambda: request.execute(http=self.get_http()), cost
+            )
 
-    async def create_event(self, event: Event) -> Event:
-        event = (
-            self.service.events()
-            .insert(calendarId=config.calendar_id, body=event)
-            .execute()
+    def get_async_client(self):
+        from async_calendar import get_client
+
+        self._loop = asyncio.get_running_loop()
+        return get_client(
+            self.credentials,
+            self.config.calendar_api_root or None,
+            self.config.calendar_max_connections or self.concurrency,
         )
-        self.log("Event created: %s" % (event.get("htmlLink")))
-        return event
+
+    def get_client_loop(self) -> asyncio.AbstractEventLoop:
+        if not self.async_transport or self._loop is None or not self._loop.is_running():
+            return None
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._loop
+        # called on the loop itself, where waiting on the loop would deadlock
+        return None
+
+    async def send_async(self, request, cost: int = 1) -> Any:
+        client = self.get_async_client()
+        with metrics.span("calendar.request"):
+            return await self.request_executor.execute_async(lambda: client.execute(request), cost)
+
+    async def run_blocking(self, function: Callable[..., Any], *args) -> Any:
+        # blocking work such as a paginated listing, kept off the event loop; its
+        # requests come back to this loop when the httpx transport is on
+        self._loop = asyncio.get_running_loop()
+        return await self._loop.run_in_executor(self._executor, function, *args)
+
+    async def execute_async(self, request, cost: int = 1) -> Any:
+        async with self.request_executor.limiter:
+            if self.async_transport:
+                return await self.send_async(request, cost)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self.execute, request, cost)
+
+    async def execute_batch_async(self, requests: List[Any], cost: int) -> List[Tuple[Any, Exception]]:
+        """Send built requests as one batch on the async client; (response, error) per request."""
+        client = self.get_async_client()
+        async with self.request_executor.limiter:
+            with metrics.span("calendar.request"):
+                return await self.request_executor.execute_async(lambda: client.execute_batch(requests), cost)
+
+    async def run_bounded(
+        self,
+        operation: str,
+        items: List[Tuple[str, Any]],
+        handler: Callable[[Any], Awaitable[Any]],
+        on_result: Callable[[OperationResult], None] = None,
+    ) -> BulkSummary:
+        started = time.perf_counter()
+
+        async def run(key: str, item: Any) -> OperationResult:
+            # the executor's adaptive limiter bounds how many are in flight
+            try:
+                result = OperationResult(key, value=await handler(item))
+            except Exception as e:
+                self.log("Error %s %s: %s", operation, key, e)
+                result = OperationResult(key, error=e)
+            if on_result:
+                on_result(result)
+            return result
+
+        results = await asyncio.gather(*[run(key, item) for key, item in items])
+        summary = BulkSummary(operation, results, time.perf_counter() - started)
+        self.last_summary = summary
+        self.log("%s", summary)
+        self.log("Request metrics: %s", self.request_executor.get_metrics())
+        return summary
+
+    async def create_event(self, event) -> Event:
+        body = to_body(event)
+        try:
+            created = await self.execute_async(
+                self.events_api.insert(calendarId=self.config.calendar_id, body=body)
+            )
+        except Exception as e:
+            if not is_http_error(e) or not body.get("id") or get_error_status(e) != 409:
+                raise
+            # created by an interrupted run that didn't get to journal it
+            self.log("Event already exists: %s", body["id"])
+            return body
+        self.log("Event created: %s", created.get("htmlLink"))
+        return created
 
     async def delete_event(self, event_id) -> str:
-        self.service.events().delete(
-            calendarId=config.calendar_id, eventId=event_id
-        ).execute()
-        self.log("Event deleted: %s" % (event_id))
+        await self.execute_async(
+            self.events_api.delete(calendarId=self.config.calendar_id, eventId=event_id)
+        )
+        self.log("Event deleted: %s", event_id)
         return event_id
 
+    @metrics.timed("load_problems")
     def load_problems(
         self,
     ) -> List[List[str]]:
+        from catalog import ProblemCatalog, TopicalProblems
+        from problem_stream import load_topics
+
+        path_to_file = get_file_path(self.config.problems_file)
+        if self.config.problems_catalog:
+            catalog = None
+            try:
+                catalog = ProblemCatalog(get_file_path(self.config.problems_db), self.dry, self.verbose)
+                if catalog.is_stale(path_to_file):
+                    self.log("Importing %s into the problem catalog", self.config.problems_file)
+                    catalog.import_json(path_to_file)
+                self.log("Loaded %s problems from the catalog", catalog.count())
+                if self.config.spaced_repetition:
+                    # problems marked done come back as reviews, the planner leaves out skipped ones
+                    return TopicalProblems(catalog)
+                # problems marked done or skipped are left out of the schedule
+                return TopicalProblems(catalog, status="todo")
+            except Exception as e:
+                self.log("Error loading the catalog, falling back to json: %s", e)
+                if catalog is not None:
+                    catalog.close()
+
         try:
-            path_to_file = get_file_path(config.problems_file)
-            self.log("Loading problems from %s" % config.problems_file)
-            with open(path_to_file, "r") as json_file:
-                data = json.load(json_file)
-                self.log("Loaded %s topics" % len(data))
+            self.log("Loading problems from %s", self.config.problems_file)
+            # streamed topic by topic when the scraper's stream is still current
+            data = load_topics(path_to_file)
+            self.log("Loaded %s topics", len(data))
             return data
         except Exception as e:
-            self.log("Error: %s" % e)
+            self.log("Error: %s", e)
             return []
 
-    def build_events(self, topical_problems: List[List[str]]) -> List[Event]:
-        events = []
-        dates = self.set_event_dates()
-
-        seen = set()
-        for date, count in dates:
-            for topic, problems in topical_problems.items():
-                for problem in problems:
-                    # ensure only two events are scheduled on the same day and that the event is not already scheduled
-                    if count >= self.daily_question_limit or (
-                        problem["problem"].lower() in seen
-                    ):
-                        continue
-
-                    # if same day startTime should be 1 hour after endTime of previous event if any
-                    if count > 0:
-                        startTime = (
-                            datetime.strptime(
-                                events[-1]["end"]["dateTime"], DATE_FORMAT
-                            )
-                            + timedelta(
-                                hours=self.get_time_limit_for_problem(
-                                    self.get_difficulty_from_color(
-                                        events[-1]["colorId"]
-                                    )
-                                )
-                            )
-                            if len(events) > 0
-                            else datetime.strptime(date, DATE_FORMAT)
-                        )
-                    else:
-                        startTime = datetime.strptime(date, DATE_FORMAT)
-
-                    endTime = startTime + timedelta(
-                        hours=self.get_time_limit_for_problem(problem["difficulty"])
+    @contextmanager
+    def open_problems(self, topical_problems=None):
+        """`topical_problems`, or load_problems() closed again on exit when it's a catalog view."""
+        if topical_problems is not None:
+            yield topical_problems
+            return
+        topical_problems = self.load_problems()
+        try:
+            yield topical_problems
+        finally:
+            if hasattr(topical_problems, "close"):
+                topical_problems.close()
+
+    @metrics.timed("plan.freebusy")
+    def get_busy_index(
+        self, time_min: datetime, time_max: datetime, calendar_ids: List[str] = None
+    ) -> BusyIndex:
+        """Load busy time over the whole horizon with as few freebusy queries as possible.
+
+        One query covers up to FREEBUSY_WINDOW_DAYS days and 50 calendars, so a
+        year over a handful of calendars costs a few requests, not one per event.
+        """
+        calendar_ids = calendar_ids or self.config.freebusy_calendar_ids or [self.config.calendar_id]
+        window = timedelta(days=max(1, self.config.freebusy_window_days))
+        busy = []
+        queries = 0
+        window_start = time_min
+        while window_start < time_max:
+            window_end = min(window_start + window, time_max)
+            for i in range(0, len(calendar_ids), 50):
+                response = self.execute(
+                    self.service.freebusy().query(
+                        body={
+                            "timeMin": self.formart_date(window_start),
+                            "timeMax": self.formart_date(window_end),
+                            "items": [{"id": id} for id in calendar_ids[i : i + 50]],
+                        }
                     )
+                )
+                queries += 1
+                for id, calendar in response.get("calendars", {}).items():
+                    for error in calendar.get("errors", []):
+                        self.log("Error: freebusy for %s: %s", id, error.get("reason"))
+                    busy.extend(
+                        (parse_rfc3339(block["start"]), parse_rfc3339(block["end"]))
+                        for block in calendar.get("busy", [])
+                    )
+            window_start = window_end
+
+        index = BusyIndex(busy)
+        self.log("Loaded %s busy blocks from %s freebusy queries", len(index), queries)
+        return index
 
-                    event = self.create_event_object(topic, problem, startTime, endTime)
+    @metrics.timed("plan")
+    def build_events(
+        self,
+        topical_problems: List[List[str]],
+        start: datetime = None,
+        busy: BusyIndex = None,
+    ) -> List[ScheduledEvent]:
+        start = start or datetime.now()
+        if busy is None and self.config.calendar_avoid_busy and not self.dry:
+            busy = self.get_busy_index(start, start + timedelta(days=self.get_plan_days() + 1))
+        if self.config.spaced_repetition:
+            placements = self.plan_reviews(topical_problems, start, busy)
+            return self.create_events(placements)
+        scheduler = Scheduler(
+            start,
+            daily_limit=self.daily_question_limit,
+            total_limit=self.total_question_limit,
+            get_duration=self.get_problem_duration,
+            busy=busy,
+            day_window=timedelta(hours=self.config.schedule_day_window_hours),
+            verbose=self.verbose,
+        )
+        return self.create_events(scheduler.plan(topical_problems))
 
-                    seen.add(problem["problem"].lower())
-                    count += 1
+    def create_events(self, placements: List[Placement]) -> List[ScheduledEvent]:
+        placements.sort(key=lambda placement: placement[2])
+        # every review of a problem shares the problem's entry
+        problems: Dict[int, Problem] = {}
+        events = []
+        for topic, problem, startTime, endTime, review in placements:
+            planned = problems.get(id(problem))
+            if planned is None:
+                planned = problems[id(problem)] = Problem.from_dict(problem)
+            events.append(
+                ScheduledEvent(
+                    topic, planned, startTime, endTime, self.config.timezone, self.get_color_for_problem(problem), review
+                )
+            )
+        self.log("Sorted %s events", len(events))
+        return events
+
+    def get_plan_days(self) -> int:
+        # how many days ahead a plan reaches
+        if self.config.spaced_repetition:
+            return self.config.review_days
+        return self.total_question_limit
+
+    @metrics.timed("plan.reviews")
+    def plan_reviews(
+        self, topical_problems, start: datetime, busy: BusyIndex = None
+    ) -> List[Placement]:
+        """New problems and SM-2 reviews of the ones done before, see ReviewPlanner."""
+        from spaced_repetition import ReviewPlanner, ReviewProgress
+
+        progress = ReviewProgress(self.dry, self.verbose, self.config)
+        self.review_planner = ReviewPlanner(
+            start.date(),
+            days=self.config.review_days,
+            new_limit=self.daily_question_limit,
+            review_limit=self.config.review_daily_limit,
+            total_limit=self.total_question_limit,
+            grade=self.config.review_projected_grade,
+            verbose=self.verbose,
+        )
+        self.review_planner.plan(topical_problems, progress)
+        return self.get_review_placements(start, busy)
+
+    def get_review_placements(self, start: datetime, busy: BusyIndex = None) -> List[Placement]:
+        return self.review_planner.get_placements(
+            start,
+            self.get_problem_duration,
+            busy=busy,
+            day_window=timedelta(hours=self.config.schedule_day_window_hours),
+        )
 
-                    events.append(event)
+    def record_review(self, slug: str, grade: int, day: date = None) -> dict:
+        """Grade a review in the progress file, and re-plan the last plan from that day on."""
+        from spaced_repetition import ReviewProgress
 
-        events.sort(key=lambda event: event["start"]["dateTime"])
-        self.log("Sorted %s events" % len(events))
-        return events[: self.total_question_limit]
+        progress = ReviewProgress(self.dry, self.verbose, self.config)
+        card = progress.record(slug, grade, day)
+        if self.review_planner is not None:
+            self.review_planner.update(slug, progress, day)
+        return card
 
     def get_color_for_problem(self, problem) -> int:
         difficulty_color_map = {
@@ -186,87 +568,141 @@ class GoogleCalendar(BaseClass):
 
         return difficulty_time_limit_map.get(difficulty, 0.5)
 
-    def set_event_dates(self) -> List[Tuple[datetime, int]]:
+    def get_problem_duration(self, difficulty: str) -> timedelta:
+        return timedelta(hours=self.get_time_limit_for_problem(difficulty))
+
+    def set_event_dates(self, start: datetime = None) -> List[Tuple[datetime, int]]:
+        start = start or datetime.now()
         return list(
             map(
                 lambda i: (
-                    self.formart_date(datetime.now() + timedelta(days=i)),
+                    self.formart_date(start + timedelta(days=i)),
                     0,
                 ),
                 range(self.total_question_limit),
             )
         )
 
-    def create_event_object(self, topic, problem, startTime, endTime) -> Event:
-        return {
-            "summary": f"{topic} - {problem['problem']} ({problem['difficulty']})",
-            "description": problem["link"],
-            "start": {
-                "dateTime": self.formart_date(startTime),
-                "timeZone": config.timezone,
-            },
-            "end": {
-                "dateTime": self.formart_date(endTime),
-                "timeZone": config.timezone,
-            },
-            "colorId": self.get_color_for_problem(problem),
-        }
+    def get_event_id(self, run_id: str, event: ScheduledEvent) -> str:
+        # hex digits are valid base32hex, the alphabet the API allows in event ids
+        key = "{}:{}:{}".format(run_id, event.problem.slug, self.formart_date(event.start))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
 
-    async def create_problem_schedule(self) -> List[Event]:
-        topical_problems = self.load_problems()
-        events = self.build_events(topical_problems)
-        self.log("Creating %s events" % len(events))
+    @metrics.timed("schedule")
+    async def create_problem_schedule(self, topical_problems=None) -> List[ScheduledEvent]:
+        with self.open_problems(topical_problems) as problems:
+            events = self.build_events(problems)
+        self.log("Creating %s events", len(events))
         if self.dry:
             self.log("Dry run, not creating events")
-            return
+            return events
+
+        journal = Journal("create", self.dry, self.verbose, self.config)
+        run_id = journal.begin()
+        for event in events:
+            # ids derived from the run make a resumed insert fail with 409 instead of duplicating
+            event.id = self.get_event_id(run_id, event)
+        journal.plan((event.id, event.to_body()) for event in events)
         try:
-            tasks = [self.create_event(event) for event in events]
-            # tasks executed concurrently using asyncio.gather
-            results = await asyncio.gather(*tasks)
-            self.log("Created %s events" % len(results))
-        except HTTPError as e:
-            self.log(
-                "Error: GoogleCalendar received %s while creating events"
-                % e.resp.status
-            )
+            summary = await self.insert_events(events, journal.record)
+            if not summary.failed:
+                journal.finish()
         finally:
-            return events
+            journal.close()
+        self.log("Created %s events", len(summary.succeeded))
+        return events
+
+    async def insert_events(
+        self, events: List, on_result: Callable[[OperationResult], None] = None
+    ) -> BulkSummary:
+        """Insert planned ScheduledEvents, or event bodies read back from a journal."""
+        if self.config.calendar_batch_size > 1:
+            summary = await self.batcher.insert_events(self.config.calendar_id, events, on_result)
+            self.last_summary = summary
+            return summary
+        # at most `concurrency` inserts are in flight at once on the worker pool
+        return await self.run_bounded(
+            "create",
+            [(get_event_key(event), event) for event in events],
+            self.create_event,
+            on_result,
+        )
 
-    def get_event_ids_from_calendar(self) -> List[str]:
-        next_page_token = None
-        event_ids = []
+    async def remove_events(
+        self, event_ids: List[str], on_result: Callable[[OperationResult], None] = None
+    ) -> BulkSummary:
+        if self.config.calendar_batch_size > 1:
+            summary = await self.batcher.delete_events(self.config.calendar_id, event_ids, on_result)
+            self.last_summary = summary
+            return summary
+        return await self.run_bounded(
+            "delete", [(id, id) for id in event_ids], self.delete_event, on_result
+        )
+
+    async def resume(self, operation: str) -> BulkSummary:
+        """Finish the creates or deletes an interrupted run left, from its journal.
+
+        Returns None when the last run finished or there is no journal.
+        """
+        journal = Journal(operation, self.dry, self.verbose, self.config)
+        state = journal.load()
+        if state is None or state.finished or not state.outstanding:
+            self.log("Nothing to resume in %s", journal.path)
+            return None
+
+        outstanding = state.outstanding
+        self.log(
+            "Resuming %s run %s: %s of %s left", operation, state.run_id, len(outstanding), len(state.planned)
+        )
+        if self.dry:
+            self.log("Dry run, not resuming")
+            return BulkSummary(operation + " (dry)", [OperationResult(key) for key, _ in outstanding], 0)
+
+        journal.resume(state)
         try:
-            while True:
-                options = {
-                    "calendarId": config.calendar_id,
-                    "maxResults": 500,  # Adjust as needed
-                    "pageToken": next_page_token,
-                }
+            if operation == "create":
+                summary = await self.insert_events([event for _, event in outstanding], journal.record)
+            else:
+                summary = await self.remove_events([key for key, _ in outstanding], journal.record)
+            if not summary.failed:
+                journal.finish()
+        finally:
+            journal.close()
+        return summary
 
-                response = self.service.events().list(**options).execute()
-                events = response.get("items", [])
+    def export_problem_schedule(self, path: str = None, topical_problems=None) -> List[ScheduledEvent]:
+        """Write the schedule to an .ics file to import, instead of inserting every event."""
+        from ics import write_events
 
-                self.log("Got %s events from token %s" % (len(events), next_page_token))
+        with self.open_problems(topical_problems) as problems:
+            events = self.build_events(problems)
+        path = path or get_file_path(self.config.ics_file)
+        if self.dry:
+            self.log("Dry run, not writing %s events to %s", len(events), path)
+            return events
 
-                next_page_token = response.get("nextPageToken", None)
+        write_events(path, events, self.config.timezone)
+        self.log("Wrote %s events to %s", len(events), path)
+        return events
 
-                if not next_page_token:
-                    # No more pages, exit the loop
-                    break
+    @metrics.timed("list_event_ids")
+    def get_event_ids_from_calendar(self, incremental: bool = False) -> List[str]:
+        if not incremental:
+            # a full listing also seeds the sync token for later incremental runs
+            self.sync_state.clear("ids")
 
-                if events:
-                    for event in events:
-                        event_ids.append(event["id"])
-                self.log("Got %s event ids" % len(event_ids))
+        event_ids = set(self.sync_state.get("ids").get("ids", []))
+        for event in self.iter_events("id,status", sync_key="ids"):
+            if event.get("status") == "cancelled":
+                event_ids.discard(event["id"])
+            else:
+                event_ids.add(event["id"])
 
-            return event_ids
-        except HTTPError as e:
-            self.log(
-                "Error: GoogleCalendar received %s while retrieving events"
-                % e.resp.status
-            )
-            raise e
+        self.sync_state.set("ids", ids=sorted(event_ids))
+        self.log("Got %s event ids", len(event_ids))
+        return sorted(event_ids)
 
+    @metrics.timed("delete")
     async def delete_all_events(self, event_ids) -> int:
         count = 0
 
@@ -274,16 +710,127 @@ class GoogleCalendar(BaseClass):
             self.log("Dry run, not deleting events :)")
             return count
 
+        journal = Journal("delete", self.dry, self.verbose, self.config)
+        journal.begin()
+        journal.plan((id, None) for id in event_ids)
         try:
-            tasks = [self.delete_event(id) for id in event_ids]
-
-            results = await asyncio.gather(*tasks) if len(tasks) > 0 else []
-            count = len(results)
-        except HTTPError as e:
-            self.log(
-                "Error: GoogleCalendar received %s while retrieving events"
-                % e.resp.status
-            )
+            summary = await self.remove_events(event_ids, journal.record)
+            if not summary.failed:
+                journal.finish()
         finally:
-            self.log("Deleted %s events" % count)
-            return count
+            journal.close()
+        count = len(summary.succeeded)
+        self.log("Deleted %s events", count)
+        return count
+
+    @metrics.timed("delete")
+    async def delete_events_pipelined(
+        self,
+        generated_only: bool = False,
+        time_min: datetime = None,
+        time_max: datetime = None,
+    ) -> BulkSummary:
+        """Delete events while the listing is still paginating.
+
+        A producer pages through events().list on the worker pool and feeds the
+        ids into a bounded queue that `concurrency` delete workers drain, in
+        batches when batching is enabled. Filters are applied server side so
+        only the matching events are ever listed. Listed ids and outcomes are
+        journaled, so `resume("delete")` can finish what an interrupted run
+        listed before listing the rest again.
+        """
+        options = {}
+        if generated_only:
+            options["privateExtendedProperty"] = "%s=%s" % (GENERATOR_PROPERTY, GENERATOR_NAME)
+        if time_min:
+            options["timeMin"] = self.formart_date(time_min)
+        if time_max:
+            options["timeMax"] = self.formart_date(time_max)
+
+        chunk_size = max(1, self.config.calendar_batch_size)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * chunk_size * 2)
+        results: List[OperationResult] = []
+        # counted as results come in, so progress logging doesn't rescan them
+        listed = deleted = 0
+        started = time.perf_counter()
+        journal = None if self.dry else Journal("delete", self.dry, self.verbose, self.config)
+
+        def add_results(new_results: List[OperationResult]) -> None:
+            nonlocal deleted
+            results.extend(new_results)
+            for result in new_results:
+                deleted += result.ok
+                if journal:
+                    journal.record(result)
+
+        async def produce():
+            nonlocal listed
+            pages = self.iter_event_pages("id", **options)
+            try:
+                while True:
+                    page = await self.run_blocking(next, pages, None)
+                    if page is None:
+                        break
+                    if journal:
+                        journal.plan((event["id"], None) for event in page)
+                    for event in page:
+                        await queue.put(event["id"])
+                    listed += len(page)
+                    self.log("Listed %s events, deleted %s so far", listed, deleted)
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def consume():
+            while True:
+                event_id = await queue.get()
+                if event_id is None:
+                    return
+                chunk = [event_id]
+                while len(chunk) < chunk_size and not queue.empty():
+                    next_id = queue.get_nowait()
+                    if next_id is None:
+                        # hand the stop signal back for the loop below
+                        queue.put_nowait(None)
+                        break
+                    chunk.append(next_id)
+
+                if self.dry:
+                    add_results([OperationResult(id) for id in chunk])
+                elif chunk_size > 1:
+                    summary = await self.batcher.delete_events(self.config.calendar_id, chunk)
+                    add_results(summary.results)
+                else:
+                    try:
+                        add_results([OperationResult(event_id, value=await self.delete_event(event_id))])
+                    except Exception as e:
+                        self.log("Error delete %s: %s", event_id, e)
+                        add_results([OperationResult(event_id, error=e)])
+
+        if self.dry:
+            self.log("Dry run, listing events without deleting them :)")
+
+        if journal:
+            journal.begin(options)
+        try:
+            # deleting while paginating can shift later pages, so list again until
+            # a pass comes back empty (normally a single request) or stops progressing
+            for _ in range(3):
+                listed_before, deleted_before = listed, deleted
+                await asyncio.gather(produce(), *[consume() for _ in range(self.concurrency)])
+                if self.dry or listed == listed_before or deleted == deleted_before:
+                    break
+            if journal and all(result.ok for result in results):
+                journal.finish()
+        finally:
+            if journal:
+                journal.close()
+
+        summary = BulkSummary(
+            "delete" if not self.dry else "delete (dry)",
+            results,
+            time.perf_counter() - started,
+        )
+        self.last_summary = summary
+        self.log("%s", summary)
+        return summary
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+from html.parser import HTMLParser
+from typing import Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+
+from base import BaseClass
+from config import config
+from constants import FIXTURE_MODES
+from metrics import metrics
+from scraper import Scraper
+from utils.utils import get_file_path
+
+
+class FixtureMissing(Exception):
+    pass
+
+
+class HttpFetcher(BaseClass):
+    """GETs urls over a pooled session, optionally recording or replaying them.
+
+    In "record" mode every response is also written to the fixtures directory,
+    in "replay" mode responses are only ever read from there, so a scrape can
+    run offline against a saved snapshot.
+    """
+
+    def __init__(
+        self,
+        mode: str = "off",
+        fixtures_dir: str = None,
+        dry: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(dry, verbose)
+        if mode not in FIXTURE_MODES:
+            raise ValueError("Unknown fixtures mode {}, expected one of {}".format(mode, FIXTURE_MODES))
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir or get_file_path(config.scraper_fixtures_dir)
+        self.timeout = config.scraper_wait_timeout
+        self._session: Optional[requests.Session] = None
+
+    def __str__(self):
+        return "HttpFetcher(mode={}, fixtures_dir={})".format(self.mode, self.fixtures_dir)
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers["User-Agent"] = "leetcode-calendar"
+        return self._session
+
+    def get_fixture_path(self, url: str) -> str:
+        name = hashlib.sha1(url.encode()).hexdigest()[:16]
+        return os.path.join(self.fixtures_dir, "{}.json".format(name))
+
+    @metrics.timed("scrape.fetch")
+    def get(self, url: str, headers: Dict[str, str] = None) -> Tuple[int, Dict[str, str], str]:
+        """Return (status, headers, body) for `url`."""
+        path = self.get_fixture_path(url)
+        if self.mode == "replay":
+            if not os.path.exists(path):
+                raise FixtureMissing("No recorded response for {} at {}".format(url, path))
+            with open(path, "r") as fixture:
+                recorded = json.load(fixture)
+            self.log("Replayed %s from %s", url, path)
+            return recorded["status"], recorded["headers"], recorded["body"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        self.log("GET %s -> %s (%s bytes)", url, response.status_code, len(response.content))
+        result = (response.status_code, dict(response.headers), response.text)
+        metrics.count("scrape.http_requests")
+        metrics.count("scrape.bytes_received", len(response.content))
+
+        if self.mode == "record" and response.status_code == 200:
+            os.makedirs(self.fixtures_dir, exist_ok=True)
+            with open(path, "w") as fixture:
+                json.dump(
+                    {"url": url, "status": result[0], "headers": result[1], "body": result[2]},
+                    fixture,
+                )
+            self.log("Recorded %s to %s", url, path)
+        return result
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class PracticePageParser(HTMLParser):
+    """Pulls topics and problem rows out of a rendered NeetCode practice page.
+
+    Mirrors the selectors the browser scraper uses: the first <p> of every
+    app-pattern-table is the topic, and in every table row the 3rd cell holds
+    the problem link and the 4th its difficulty.
+    """
+
+    def __init__(self, base_url: str) -> None:
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.topics: Dict[str, List[dict]] = {}
+        self.in_pattern = False
+        self.topic: Optional[str] = None
+        self.text: Optional[List[str]] = None
+        self.in_tbody = False
+        self.cell = 0
+        self.row: Optional[dict] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "app-pattern-table":
+            self.in_pattern = True
+            self.topic = None
+        elif tag == "p" and self.in_pattern and self.topic is None and self.row is None:
+            self.text = []
+        elif tag == "tbody":
+            self.in_tbody = True
+        elif tag == "tr" and self.in_tbody:
+            self.row = {"problem": "", "link": "", "difficulty": ""}
+            self.cell = 0
+        elif tag == "td" and self.row is not None:
+            self.cell += 1
+            if self.cell == 4:
+                self.text = []
+        elif tag == "a" and self.row is not None and self.cell == 3:
+            self.row["link"] = urljoin(self.base_url, dict(attrs).get("href") or "")
+            self.text = []
+
+    def handle_endtag(self, tag):
+        if tag == "p" and self.text is not None and self.topic is None and self.row is None:
+            self.topic = " ".join("".join(self.text).split())
+            self.topics.setdefault(self.topic, [])
+            self.text = None
+        elif tag == "a" and self.row is not None and self.cell == 3 and self.text is not None:
+            self.row["problem"] = " ".join("".join(self.text).split())
+            self.text = None
+        elif tag == "td" and self.row is not None and self.cell == 4 and self.text is not None:
+            self.row["difficulty"] = " ".join("".join(self.text).split())
+            self.text = None
+        elif tag == "tr" and self.row is not None:
+            if self.topic is not None and all(self.row.values()):
+                self.topics[self.topic].append(self.row)
+            self.row = None
+        elif tag == "tbody":
+            self.in_tbody = False
+        elif tag == "app-pattern-table":
+            self.in_pattern = False
+
+    def handle_data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+
+def parse_practice_page(html: str, base_url: str) -> Dict[str, List[dict]]:
+    parser = PracticePageParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return {topic: problems for topic, problems in parser.topics.items() if problems}
+
+
+def parse_problem_list(data, problems_base_url: str) -> Dict[str, List[dict]]:
+    """Group the SPA's flat problem list ({pattern, problem, link, difficulty}) by topic."""
+    if isinstance(data, dict):
+        data = data.get("problems", [])
+    topics: Dict[str, List[dict]] = {}
+    for item in data:
+        problem = {
+            "problem": item.get("problem") or item.get("title") or "",
+            "link": urljoin(problems_base_url, item.get("link") or ""),
+            "difficulty": item.get("difficulty") or "",
+        }
+        topic = item.get("pattern") or item.get("topic")
+        if topic and problem["problem"] and item.get("link") and problem["difficulty"]:
+            topics.setdefault(topic, []).append(problem)
+    return topics
+
+
+class HttpScraper(Scraper):
+    """Scrapes the practice list over plain HTTP, without starting a browser.
+
+    Reads the JSON problem list the SPA loads when SCRAPER_DATA_URL is set and
+    the static practice page otherwise. Falls back to the selenium scraper if
+    neither yields any problems, unless responses are being replayed.
+    """
+
+    def __init__(self, dry: bool = False, verbose: bool = False, fixtures_mode: str = None) -> None:
+        super().__init__(dry, verbose)
+        self.data_url = config.scraper_data_url
+        self.fetcher = HttpFetcher(
+            fixtures_mode or config.scraper_fixtures_mode, dry=dry, verbose=verbose
+        )
+
+    def __str__(self):
+        return "HttpScraper(base_url={}, data_url={}, fixtures={}, dry={}, verbose={})".format(
+            self.base_url, self.data_url, self.fetcher.mode, self.dry, self.verbose
+        )
+
+    def stop(self):
+        self.fetcher.close()
+        super().stop()
+
+    async def scrape_topics(self) -> None:
+        replaying = self.fetcher.mode == "replay"
+        if self.dry and not replaying:
+            self.log("Dry run, not fetching %s", self.data_url or self.base_url)
+            return
+
+        try:
+            for position, (topic, problems) in enumerate(self.fetch_topics().items()):
+                self.emit(position, topic, problems)
+        except FixtureMissing:
+            raise
+        except Exception as e:
+            self.log("Error fetching over HTTP: %s", e)
+
+        if self.scraped or replaying:
+            return
+        self.log("No problems found over HTTP, falling back to the browser")
+        await super().scrape_topics()
+
+    def fetch(self, url: str) -> Optional[str]:
+        """GET `url` conditionally, returning None when it hasn't changed."""
+        status, headers, body = self.fetcher.get(url, self.manifest.get_conditional_headers(url))
+        if status == 304:
+            self.log("%s not modified since the last scrape", url)
+            return None
+        if status != 200:
+            raise requests.HTTPError("GET {} returned {}".format(url, status))
+        self.manifest.set_validators(url, headers)
+        return body
+
+    def fetch_topics(self) -> Mapping[str, List[dict]]:
+        body = self.fetch(self.data_url or self.base_url)
+        if body is None:
+            # unchanged upstream, so the problems we already have are current
+            return self.load_previous_topics()
+        if self.data_url:
+            topics = parse_problem_list(json.loads(body), config.scraper_problems_base_url)
+        else:
+            topics = parse_practice_page(body, self.base_url)
+
+        self.log(
+            "Found %s topics with %s problems",
+            len(topics),
+            sum(len(problems) for problems in topics.values()),
+        )
+        return topics
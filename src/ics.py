@@ -0,0 +1,227 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import IO, Iterable, Iterator, List
+
+from constants import GENERATOR_NAME
+from custom_types import ScheduledEvent
+from metrics import metrics
+
+PRODID = "-//leetcode-calendar//schedule//EN"
+ICS_DATE_FORMAT = "%Y%m%dT%H%M%S"
+# RFC 5545 folds content lines longer than 75 octets
+LINE_LIMIT = 75
+# how far ahead the time zone rules are written when the last event isn't known up front
+DEFAULT_TIMEZONE_SPAN = timedelta(days=5 * 366)
+
+
+def escape_text(value: str) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str) -> str:
+    encoded = line.encode("utf-8")
+    if len(encoded) <= LINE_LIMIT:
+        return line + "\r\n"
+    parts = []
+    limit = LINE_LIMIT
+    while encoded:
+        cut = min(limit, len(encoded))
+        # never split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        # continuation lines start with a space, which counts towards the limit
+        limit = LINE_LIMIT - 1
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def format_offset(offset: timedelta) -> str:
+    seconds = int(offset.total_seconds())
+    sign = "-" if seconds < 0 else "+"
+    hours, remainder = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return "{}{:02d}{:02d}".format(sign, hours, minutes) + ("{:02d}".format(seconds) if seconds else "")
+
+
+def iter_transitions(zone, start: datetime, end: datetime) -> Iterator[datetime]:
+    """UTC instants between start and end (aware, UTC) where `zone` changes its offset."""
+    step = timedelta(days=1)
+    current = start
+    offset = current.astimezone(zone).utcoffset()
+    while current < end:
+        following = current + step
+        if following.astimezone(zone).utcoffset() != offset:
+            # bisect down to the second the offset changes
+            low, high = current, following
+            while high - low > timedelta(seconds=1):
+                middle = low + (high - low) / 2
+                if middle.astimezone(zone).utcoffset() == offset:
+                    low = middle
+                else:
+                    high = middle
+            high = high.replace(microsecond=0)
+            yield high
+            offset = high.astimezone(zone).utcoffset()
+        current = following
+
+
+def get_timezone_lines(zone, name: str, start: datetime, end: datetime) -> List[str]:
+    """A VTIMEZONE with every observance from start to end.
+
+    zoneinfo doesn't expose the zone's rules, so each offset change in the
+    range is written out as its own STANDARD or DAYLIGHT block.
+    """
+    lines = ["BEGIN:VTIMEZONE", "TZID:" + name]
+    previous = start.astimezone(zone).utcoffset()
+    for instant in chain([start], iter_transitions(zone, start, end)):
+        local = instant.astimezone(zone)
+        offset = local.utcoffset()
+        kind = "DAYLIGHT" if local.dst() else "STANDARD"
+        lines.extend(
+            [
+                "BEGIN:" + kind,
+                # an observance starts at the wall-clock time before the change
+                "DTSTART:" + (instant + previous).strftime(ICS_DATE_FORMAT),
+                "TZOFFSETFROM:" + format_offset(previous),
+                "TZOFFSETTO:" + format_offset(offset),
+                "TZNAME:" + escape_text(local.tzname() or name),
+                "END:" + kind,
+            ]
+        )
+        previous = offset
+    lines.append("END:VTIMEZONE")
+    return lines
+
+
+class IcsWriter:
+    """Streams events into an iCalendar file, one VEVENT at a time.
+
+    The calendar header and the time zone are written when the file is
+    opened, every event is written as soon as it's added, and the file only
+    replaces `path` once it's closed, so an import never sees half a file.
+    Event times are written as wall-clock times in `timezone`.
+    """
+
+    def __init__(self, path: str, timezone_name: str, start: datetime, end: datetime = None) -> None:
+        from zoneinfo import ZoneInfo
+
+        self.path = path
+        self.timezone_name = timezone_name
+        self.zone = ZoneInfo(timezone_name)
+        self.start = start
+        self.end = end or start + DEFAULT_TIMEZONE_SPAN
+        self.stamp = datetime.now(timezone.utc).strftime(ICS_DATE_FORMAT) + "Z"
+        self.count = 0
+        self.file: IO[str] = None
+        self.tmp_path = None
+
+    def __str__(self):
+        return "IcsWriter(path={}, timezone={}, events={})".format(self.path, self.timezone_name, self.count)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __enter__(self) -> "IcsWriter":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".ics")
+        # newline="" keeps the CRLF line endings the format requires
+        self.file = os.fdopen(fd, "w", encoding="utf-8", newline="")
+        self.write_lines(
+            ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:" + PRODID, "CALSCALE:GREGORIAN", "METHOD:PUBLISH"]
+        )
+        # a day either side covers events that start or end near the edges in local time
+        start = self.to_utc(self.start) - timedelta(days=1)
+        end = self.to_utc(self.end) + timedelta(days=1)
+        self.write_lines(get_timezone_lines(self.zone, self.timezone_name, start, end))
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        self.file.write("".join(fold_line(line) for line in lines))
+
+    def to_utc(self, date: datetime) -> datetime:
+        # naive times are UTC, like the dateTimes sent to the API
+        if date.tzinfo is None:
+            return date.replace(tzinfo=timezone.utc)
+        return date.astimezone(timezone.utc)
+
+    def format_date(self, date: datetime) -> str:
+        local = self.to_utc(date).astimezone(self.zone)
+        return "TZID={}:{}".format(self.timezone_name, local.strftime(ICS_DATE_FORMAT))
+
+    def get_uid(self, event: ScheduledEvent) -> str:
+        # stable across exports of the same plan, so importing the file again doesn't duplicate events
+        key = event.id or "{}-{}".format(event.problem.slug, self.to_utc(event.start).strftime(ICS_DATE_FORMAT))
+        return "{}@{}".format(key, GENERATOR_NAME)
+
+    def write_event(self, event: ScheduledEvent) -> None:
+        lines = [
+            "BEGIN:VEVENT",
+            "UID:" + self.get_uid(event),
+            "DTSTAMP:" + self.stamp,
+            "DTSTART;" + self.format_date(event.start),
+            "DTEND;" + self.format_date(event.end),
+            "SUMMARY:" + escape_text(event.summary),
+        ]
+        description = event.description
+        if description:
+            lines.append("DESCRIPTION:" + escape_text(description))
+            if description.startswith("http"):
+                lines.append("URL:" + description)
+        lines.append("END:VEVENT")
+        self.write_lines(lines)
+        self.count += 1
+
+    def close(self) -> None:
+        self.write_lines(["END:VCALENDAR"])
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        self.file.close()
+        os.unlink(self.tmp_path)
+
+
+@metrics.timed("export.ics")
+def write_events(path: str, events: Iterable[ScheduledEvent], timezone_name: str) -> int:
+    """Write events to an .ics file as they come; returns how many were written.
+
+    A list gets time zone rules for exactly its date range, any other
+    iterable for DEFAULT_TIMEZONE_SPAN from its first event.
+    """
+    if isinstance(events, list):
+        start = min((event.start for event in events), default=datetime.utcnow())
+        end = max((event.end for event in events), default=start)
+    else:
+        # peek at the first event for the start of the time zone rules
+        events = iter(events)
+        first = next(events, None)
+        start = first.start if first else datetime.utcnow()
+        end = None
+        events = chain([first], events) if first else events
+
+    with IcsWriter(path, timezone_name, start, end) as writer:
+        for event in events:
+            writer.write_event(event)
+    return writer.count
@@ -0,0 +1,165 @@
+import json
+import os
+import time
+import uuid
+from typing import IO, Any, Dict, Iterable, List, Tuple
+
+from base import BaseClass
+from config import Config, config
+from custom_types import OperationResult
+from utils.utils import get_file_path, slugify
+
+# outcomes are fsynced in batches: every SYNC_EVERY records or SYNC_INTERVAL seconds
+SYNC_EVERY = 100
+SYNC_INTERVAL = 1.0
+
+
+class JournalState:
+    """What a journal says about its run: the planned items and which of them finished."""
+
+    def __init__(self, operation: str, run_id: str, params: Dict[str, Any] = None) -> None:
+        self.operation = operation
+        self.run_id = run_id
+        self.params = params or {}
+        # key -> payload, in the order they were planned
+        self.planned: Dict[str, Any] = {}
+        self.done = set()
+        self.failed: Dict[str, str] = {}
+        self.finished = False
+
+    @property
+    def outstanding(self) -> List[Tuple[str, Any]]:
+        return [(key, payload) for key, payload in self.planned.items() if key not in self.done]
+
+    def __str__(self) -> str:
+        return "JournalState(operation={}, run_id={}, planned={}, done={}, failed={}, finished={})".format(
+            self.operation, self.run_id, len(self.planned), len(self.done), len(self.failed), self.finished
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Journal(BaseClass):
+    """Append-only JSON lines log of one calendar's bulk create or delete.
+
+    A run starts with a "begin" record, then every item is logged as
+    "plan" before it's sent and "done" or "failed" once its outcome is
+    known. An interrupted run can be resumed from the items without a
+    "done". Records are only fsynced in batches, so a crash can lose the
+    last few outcomes; those items are sent again on resume, which is
+    harmless because creates use the ids from the journal and deletes
+    ignore events that are already gone.
+    """
+
+    def __init__(
+        self,
+        operation: str,
+        dry: bool = False,
+        verbose: bool = False,
+        settings: Config = None,
+    ) -> None:
+        super().__init__(dry, verbose)
+        self.config = settings or config
+        self.operation = operation
+        self.path = get_file_path(
+            os.path.join(
+                self.config.journal_dir,
+                "{}.{}.jsonl".format(operation, slugify(self.config.calendar_id)),
+            )
+        )
+        self.run_id: str = None
+        self.file: IO[str] = None
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def __str__(self):
+        return "Journal(operation={}, path={}, run_id={})".format(self.operation, self.path, self.run_id)
+
+    def load(self) -> JournalState:
+        """Read the last run back; None when there's no journal yet."""
+        state: JournalState = None
+        try:
+            with open(self.path, "r") as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the line being written when the process died
+                        continue
+                    kind = record.get("type")
+                    if kind == "begin":
+                        state = JournalState(record["operation"], record["run_id"], record.get("params"))
+                    elif state is None:
+                        continue
+                    elif kind == "plan":
+                        state.planned[record["key"]] = record.get("payload")
+                    elif kind == "done":
+                        state.done.add(record["key"])
+                        state.failed.pop(record["key"], None)
+                    elif kind == "failed":
+                        state.failed[record["key"]] = record.get("error", "")
+                    elif kind == "finish":
+                        state.finished = True
+        except FileNotFoundError:
+            return None
+        return state
+
+    def begin(self, params: Dict[str, Any] = None) -> str:
+        """Start a new run, replacing the previous journal; returns the run id."""
+        self.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.run_id = uuid.uuid4().hex[:16]
+        self.file = open(self.path, "w")
+        self.write({"type": "begin", "operation": self.operation, "run_id": self.run_id, "params": params or {}})
+        self.sync()
+        return self.run_id
+
+    def resume(self, state: JournalState) -> None:
+        """Keep appending to the run `state` was loaded from."""
+        self.close()
+        self.run_id = state.run_id
+        self.file = open(self.path, "a")
+        self.write({"type": "resume", "outstanding": len(state.outstanding)})
+        self.sync()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        record["time"] = round(time.time(), 3)
+        self.file.write(json.dumps(record) + "\n")
+        self.unsynced += 1
+        if self.unsynced >= SYNC_EVERY or time.monotonic() - self.synced_at >= SYNC_INTERVAL:
+            self.sync()
+
+    def plan(self, items: Iterable[Tuple[str, Any]]) -> None:
+        for key, payload in items:
+            record = {"type": "plan", "key": key}
+            if payload is not None:
+                record["payload"] = payload
+            self.write(record)
+        # the plan is durable before any of it is sent
+        self.sync()
+
+    def record(self, result: OperationResult) -> None:
+        if result.ok:
+            self.write({"type": "done", "key": result.key})
+        else:
+            self.write({"type": "failed", "key": result.key, "error": str(result.error)})
+
+    def finish(self) -> None:
+        self.write({"type": "finish"})
+        self.sync()
+
+    def sync(self) -> None:
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def close(self) -> None:
+        if self.file is None:
+            return
+        self.sync()
+        self.file.close()
+        self.file = None
@@ -10,27 +10,38 @@ LogLevels = {
 }
 
 class Logger:
-    def __init__(self, log_level=LogLevels[config.log_level]):
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(log_level)
-        self.formatter = logging.Formatter(
-            "{asctime} [{name} : {lineno}] [{levelname}]: {message}", style="{"
-        )
-        self.cli_handler = logging.StreamHandler()
-        self.cli_handler.setFormatter(self.formatter)
-        self.logger.addHandler(self.cli_handler)
-
-    def info(self, message):
-        self.logger.info(message)
-
-    def error(self, message):
-        self.logger.error(message)
-
-    def debug(self, message):
-        self.logger.debug(message)
-
-    def warning(self, message):
-        self.logger.warning(message)
+    def __init__(self, log_level=None):
+        # set up on first use so importing doesn't have to resolve the config
+        self.log_level = log_level
+        self._logger = None
+
+    @property
+    def logger(self) -> logging.Logger:
+        if self._logger is None:
+            log_level = self.log_level
+            if log_level is None:
+                log_level = LogLevels.get(config.log_level.upper(), logging.DEBUG)
+            self._logger = logging.getLogger(__name__)
+            self._logger.setLevel(log_level)
+            self.formatter = logging.Formatter(
+                "{asctime} [{name} : {lineno}] [{levelname}]: {message}", style="{"
+            )
+            self.cli_handler = logging.StreamHandler()
+            self.cli_handler.setFormatter(self.formatter)
+            self._logger.addHandler(self.cli_handler)
+        return self._logger
+
+    def info(self, message, *args):
+        self.logger.info(message, *args)
+
+    def error(self, message, *args):
+        self.logger.error(message, *args)
+
+    def debug(self, message, *args):
+        self.logger.debug(message, *args)
+
+    def warning(self, message, *args):
+        self.logger.warning(message, *args)
 
 
 logger = Logger()
\ No newline at end of file
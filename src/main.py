@@ -1,30 +1,73 @@
-import anyio
+import asyncio
+import sys
+
 import asyncclick as click
-from pprint import pprint
 
-from google_calendar import GoogleCalendar
+from config import config
+from constants import CALENDAR_BACKENDS, FIXTURE_MODES, PROBLEM_STATUSES
 from logger import logger
-from scraper import Scraper
+from utils.utils import get_file_path
+
+# subsystems (selenium, googleapiclient, sqlite) are imported inside the
+# commands that use them, so `--help` and dry runs don't pay for all of them
 
 
 @click.group()
-def cli():
+@click.option("--profile", is_flag=True, help="Profile the run with cProfile and tracemalloc and write a report")
+@click.option("--metrics", "metrics_file", help="Write timings and counters to this file (.jsonl or .prom)")
+@click.pass_context
+def cli(ctx, profile=False, metrics_file=None):
     """A CLI for scraping and scheduling problems from LeetCode"""
+    metrics_file = metrics_file or config.metrics_file
+    if not (profile or metrics_file):
+        return
+
+    from metrics import Profiler, metrics
+
+    metrics.enable()
+    profiler = Profiler() if profile else None
+    if profiler:
+        profiler.start()
+
+    def finish():
+        if metrics_file:
+            metrics.dump(get_file_path(metrics_file))
+        if profiler:
+            click.echo(f"Wrote profile report to {profiler.stop()}")
+
+    ctx.call_on_close(finish)
 
 
 @cli.command(name="scrape", context_settings=dict(ignore_unknown_options=True))
 @click.option("--dry", is_flag=True, help="Dry run")
 @click.option("--verbose", is_flag=True, help="Verbose output")
-async def scrape(dry=False, verbose=False):
+@click.option("--backend", type=click.Choice(["selenium", "http"]), default=None, help="Scraper backend")
+@click.option("--fixtures", type=click.Choice(FIXTURE_MODES), default=None, help="Record or replay HTTP responses")
+async def scrape(dry=False, verbose=False, backend=None, fixtures=None):
     """Scrape problems from LeetCode"""
-    scraper = Scraper(dry, verbose)
+    from http_scraper import HttpScraper
+    from scraper import Scraper
+
+    if (backend or config.scraper_backend) == "http" or fixtures:
+        scraper = HttpScraper(dry, verbose, fixtures)
+    else:
+        scraper = Scraper(dry, verbose)
     await scraper.run()
 
 
+async def close_async_clients():
+    # only a run that used the httpx transport has clients, and importing them isn't free
+    async_calendar = sys.modules.get("async_calendar")
+    if async_calendar is not None:
+        await async_calendar.close_clients()
+
+
 @cli.group(invoke_without_command=True)
 @click.pass_context
 async def calendar(ctx):
     """Google Calendar commands"""
+    # the httpx transport's connection pools belong to this loop, so they're closed before it ends
+    ctx.call_on_close(close_async_clients)
     if ctx.invoked_subcommand is None:
         await ctx.invoke(list)
 
@@ -32,25 +75,106 @@ async def calendar(ctx):
 @calendar.command(name="schedule", context_settings=dict(ignore_unknown_options=True))
 @click.option("--dry", is_flag=True, help="Dry run")
 @click.option("--verbose", is_flag=True, help="Verbose output")
-async def schedule(dry=False, verbose=False):
+@click.option("--sync/--no-sync", default=True, help="Only send the changes needed to match the schedule")
+@click.option("--rebase", is_flag=True, help="Re-plan the schedule starting from today")
+@click.option("--force", is_flag=True, help="Sync even if problems and config are unchanged")
+@click.option("--backend", type=click.Choice(CALENDAR_BACKENDS), default=None, help="Send events to the API or write an .ics file")
+@click.option("--output", type=click.Path(dir_okay=False), help="File the ics backend writes")
+@click.option("--resume", is_flag=True, help="Finish the inserts an interrupted --no-sync run left")
+async def schedule(dry=False, verbose=False, sync=True, rebase=False, force=False, backend=None, output=None, resume=False):
     """Schedule problems to Google Calendar"""
+    from calendar_sync import CalendarSync
+    from google_calendar import GoogleCalendar
+
     google_calendar = GoogleCalendar(dry, verbose)
+    if (backend or config.calendar_backend) == "ics":
+        output = output or get_file_path(config.ics_file)
+        click.echo("Exporting problem schedule...")
+        events = google_calendar.export_problem_schedule(output)
+        click.echo(f"Exported {len(events)} events to {output}")
+        return
+    if resume:
+        click.echo("Resuming problem schedule...")
+        summary = await google_calendar.resume("create")
+        click.echo(str(summary) if summary else "Nothing to resume")
+        return
+    if sync:
+        click.echo("Syncing problem schedule...")
+        plan = await CalendarSync(google_calendar, dry, verbose).run(rebase, force)
+        click.echo(str(plan))
+        return
     click.echo("Creating problem schedule...")
     events = await google_calendar.create_problem_schedule()
     click.echo(f"Scheduled {len(events)} events")
+    if google_calendar.last_summary:
+        click.echo(str(google_calendar.last_summary))
+
+
+@calendar.command(name="fanout", context_settings=dict(ignore_unknown_options=True))
+@click.argument("roster", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry", is_flag=True, help="Dry run")
+@click.option("--verbose", is_flag=True, help="Verbose output")
+@click.option("--sync/--no-sync", default=True, help="Only send the changes needed to match each schedule")
+@click.option("--rebase", is_flag=True, help="Re-plan every schedule starting from today")
+@click.option("--force", is_flag=True, help="Sync even if problems and config are unchanged")
+async def fanout(roster, dry=False, verbose=False, sync=True, rebase=False, force=False):
+    """Schedule problems to every calendar on a roster file"""
+    from fanout import Fanout, load_roster
+
+    entries = load_roster(roster)
+    click.echo(f"Scheduling {len(entries)} calendars...")
+    results = await Fanout(entries, sync, dry, verbose).run(rebase, force)
+    for result in results:
+        click.echo(str(result))
+    failed = [result.name for result in results if not result.ok]
+    if failed:
+        raise click.ClickException(f"Failed to schedule {', '.join(failed)}")
+
+
+@calendar.command(name="watch", context_settings=dict(ignore_unknown_options=True))
+@click.option("--dry", is_flag=True, help="Dry run")
+@click.option("--verbose", is_flag=True, help="Verbose output")
+@click.option("--once", is_flag=True, help="Sync once and exit")
+async def watch(dry=False, verbose=False, once=False):
+    """Keep the calendar in sync as problems, progress, config and events change"""
+    from daemon import CalendarWatcher
+
+    click.echo(f"Watching {config.calendar_id}...")
+    await CalendarWatcher(dry, verbose).run(once)
 
 
 @calendar.command(name="delete", context_settings=dict(ignore_unknown_options=True))
 @click.option("--dry", is_flag=True, help="Dry run")
 @click.option("--verbose", is_flag=True, help="Verbose output")
-async def delete(dry=False, verbose=False):
+@click.option("--incremental", is_flag=True, help="Only fetch changes since the last listing")
+@click.option("--generated-only", is_flag=True, help="Only delete events created by this tool")
+@click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]), help="Only delete events ending after this date")
+@click.option("--until", type=click.DateTime(formats=["%Y-%m-%d"]), help="Only delete events starting before this date")
+@click.option("--resume", is_flag=True, help="Finish the deletes an interrupted run left before listing again")
+async def delete(dry=False, verbose=False, incremental=False, generated_only=False, since=None, until=None, resume=False):
     """Delete all events from Google Calendar"""
+    from google_calendar import GoogleCalendar
+
     google_calendar = GoogleCalendar(dry, verbose)
+    if resume:
+        click.echo("Resuming deletes...")
+        summary = await google_calendar.resume("delete")
+        click.echo(str(summary) if summary else "Nothing to resume")
+        if incremental:
+            # an incremental delete journals every id up front, so there is nothing left to list
+            return
     click.echo("Deleting all events...")
-    event_ids = google_calendar.get_event_ids_from_calendar()
+    if not incremental:
+        # list and delete at the same time instead of collecting every id first
+        summary = await google_calendar.delete_events_pipelined(generated_only, since, until)
+        click.echo(str(summary))
+        return
+    event_ids = google_calendar.get_event_ids_from_calendar(incremental)
     click.echo(f"Got {len(event_ids)} event ids")
     count = await google_calendar.delete_all_events(event_ids)
     click.echo(f"Deleted {count} events")
+    if google_calendar.last_summary:
+        click.echo(str(google_calendar.last_summary))
 
 
 @calendar.command(name="list", context_settings=dict(ignore_unknown_options=True))
@@ -58,14 +182,78 @@ async def delete(dry=False, verbose=False):
 @click.argument("max_results", type=int, required=False)
 @click.option("--dry", is_flag=True, help="Dry run")
 @click.option("--verbose", is_flag=True, help="Verbose output")
-async def list(start_time=None, max_results=None, dry=False, verbose=False):
+@click.option("--incremental", is_flag=True, help="Only list changes since the last incremental listing")
+async def list(start_time=None, max_results=None, dry=False, verbose=False, incremental=False):
     """List all events from Google Calendar"""
+    from google_calendar import GoogleCalendar
+
     google_calendar = GoogleCalendar(dry, verbose)
     click.echo("Listing all events...")
-    events = google_calendar.get_events(start_time, max_results)
+    events = google_calendar.get_events(start_time, max_results, incremental)
     click.echo(f"Got {len(events)} events")
     # pprint(events)
 
 
+@cli.command(name="review")
+@click.argument("slug")
+@click.argument("grade", type=click.IntRange(0, 5))
+@click.option("--date", "day", type=click.DateTime(formats=["%Y-%m-%d"]), help="Day the review was done, today by default")
+@click.option("--verbose", is_flag=True, help="Verbose output")
+async def review(slug, grade, day=None, verbose=False):
+    """Grade a problem from 0 (forgot) to 5 (perfect) for spaced repetition"""
+    from spaced_repetition import ReviewProgress
+
+    card = ReviewProgress(verbose=verbose).record(slug, grade, day.date() if day else None)
+    click.echo(f"{slug} is due again on {card['due']} (interval {card['interval']} days, ease {card['ease']})")
+
+
+@cli.group(name="catalog")
+def catalog():
+    """Problem catalog commands"""
+
+
+@catalog.command(name="import")
+@click.argument("path", required=False)
+@click.option("--verbose", is_flag=True, help="Verbose output")
+async def catalog_import(path=None, verbose=False):
+    """Import problems from the scraped json file into the catalog"""
+    from catalog import ProblemCatalog
+
+    problem_catalog = ProblemCatalog(verbose=verbose)
+    count = problem_catalog.import_json(path or get_file_path(config.problems_file))
+    problem_catalog.close()
+    click.echo(f"Imported {count} problems")
+
+
+@catalog.command(name="export")
+@click.argument("path", required=False)
+@click.option("--verbose", is_flag=True, help="Verbose output")
+async def catalog_export(path=None, verbose=False):
+    """Export the catalog to the problems json format"""
+    from catalog import ProblemCatalog
+
+    problem_catalog = ProblemCatalog(verbose=verbose)
+    count = problem_catalog.export_json(path or get_file_path(config.problems_file))
+    problem_catalog.close()
+    click.echo(f"Exported {count} problems")
+
+
+@catalog.command(name="status")
+@click.argument("slug")
+@click.argument("status", type=click.Choice(PROBLEM_STATUSES))
+async def catalog_status(slug, status):
+    """Mark a problem as todo, done or skipped"""
+    from catalog import ProblemCatalog
+
+    problem_catalog = ProblemCatalog()
+    updated = problem_catalog.set_status(slug, status)
+    problem_catalog.close()
+    if not updated:
+        raise click.ClickException(f"Unknown problem {slug}")
+    click.echo(f"Marked {slug} as {status}")
+
+
 if __name__ == "__main__":
-    cli()
+    # straight on asyncio: cli() would go through anyio.run, and loading its
+    # asyncio backend takes longer than the rest of a dry command
+    asyncio.run(cli.main())
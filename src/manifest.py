@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from base import BaseClass
+from config import config
+from utils.utils import atomic_write_json, get_file_path
+
+
+def get_topic_hash(problems: List[dict]) -> str:
+    return hashlib.sha1(json.dumps(problems, sort_keys=True).encode()).hexdigest()
+
+
+class ProblemsManifest(BaseClass):
+    """Content hashes and HTTP validators for the scraped problems file.
+
+    Holds a hash per topic plus a digest over the whole file, the ETag and
+    Last-Modified headers of every fetched url, and the size and mtime the
+    problems file and the stream it was compacted from had when it was
+    written, so a hand-edited file is noticed.
+    """
+
+    def __init__(self, dry: bool = False, verbose: bool = False) -> None:
+        super().__init__(dry, verbose)
+        self.path = get_file_path(config.problems_manifest_file)
+        self.problems_path = get_file_path(config.problems_file)
+        self.stream_path = get_file_path(config.problems_stream_file)
+        self.data: Dict = self.load()
+
+    def __str__(self):
+        return "ProblemsManifest(path={}, digest={})".format(self.path, self.digest)
+
+    def load(self) -> Dict:
+        try:
+            with open(self.path, "r") as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.log("Error loading manifest, starting fresh: %s", e)
+            return {}
+
+    @property
+    def digest(self) -> Optional[str]:
+        return self.data.get("digest")
+
+    @property
+    def topics(self) -> Dict[str, Dict]:
+        return self.data.get("topics", {})
+
+    def get_validators(self, url: str) -> Dict[str, str]:
+        return self.data.get("validators", {}).get(url, {})
+
+    def set_validators(self, url: str, headers: Dict[str, str]) -> None:
+        # header names are case-insensitive, requests hands back a plain dict copy
+        headers = {name.lower(): value for name, value in headers.items()}
+        validators = {
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+        }
+        self.data.setdefault("validators", {})[url] = {
+            name: value for name, value in validators.items() if value
+        }
+
+    def get_conditional_headers(self, url: str) -> Dict[str, str]:
+        validators = self.get_validators(url)
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def get_changed_topics(self, entries: Dict[str, Dict]) -> List[str]:
+        """Topics whose {"hash", "count"} entry differs from the recorded one."""
+        known = self.topics
+        return [
+            topic
+            for topic, entry in entries.items()
+            if known.get(topic, {}).get("hash") != entry["hash"]
+        ]
+
+    def is_file_current(self, key: str, path: str) -> bool:
+        stat = self.data.get(key, {})
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return stat.get("size") == current.st_size and stat.get("mtime") == current.st_mtime
+
+    def is_current(self) -> bool:
+        """True when the problems file is exactly what this manifest describes."""
+        return self.digest is not None and self.is_file_current("file", self.problems_path)
+
+    def stream_is_current(self) -> bool:
+        """True when the problems stream is the one the problems file was compacted from."""
+        return self.is_file_current("stream", self.stream_path)
+
+    def update(self, topics: Dict[str, List[dict]]) -> None:
+        self.update_topics(
+            {
+                topic: {"hash": get_topic_hash(problems), "count": len(problems)}
+                for topic, problems in topics.items()
+            }
+        )
+
+    def update_topics(self, entries: Dict[str, Dict]) -> None:
+        """Record topics by their {"hash", "count"} entries, in order."""
+        self.data["topics"] = entries
+        self.data["digest"] = hashlib.sha1(
+            "".join(
+                "{}:{}".format(topic, entry["hash"])
+                for topic, entry in self.data["topics"].items()
+            ).encode()
+        ).hexdigest()
+        self.data["updated_at"] = datetime.utcnow().isoformat() + "Z"
+
+    def save(self, from_stream: bool = False) -> None:
+        """Save, noting whether the problems file holds exactly what the stream does."""
+        for key, path in (("file", self.problems_path), ("stream", self.stream_path if from_stream else None)):
+            try:
+                current = os.stat(path)
+                self.data[key] = {"size": current.st_size, "mtime": current.st_mtime}
+            except (FileNotFoundError, TypeError):
+                self.data.pop(key, None)
+        atomic_write_json(self.path, self.data, indent=4)
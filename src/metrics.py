@@ -0,0 +1,236 @@
+import asyncio
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List
+
+from config import config
+from utils.utils import get_file_path
+
+# handed out by every span while metrics are off, so a disabled span costs one attribute check
+NULL_SPAN = nullcontext()
+PROMETHEUS_PREFIX = "leetcode_calendar"
+
+
+class Span:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+
+
+class Metrics:
+    """Process-wide timers and counters, a no-op until enabled.
+
+    `span(name)` times a block (scrape, load, plan, API calls, pages) and
+    `count(name)` adds to a counter (requests, retries, bytes). Everything is
+    kept as totals, so a run can be dumped as JSON lines or Prometheus text.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def __str__(self):
+        return "Metrics(enabled={}, spans={}, counters={})".format(
+            self.enabled, len(self.spans), len(self.counters)
+        )
+
+    def reset(self) -> None:
+        with self.lock:
+            # name -> [count, total seconds, max seconds]
+            self.spans: Dict[str, List[float]] = {}
+            self.counters: Dict[str, float] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def span(self, name: str):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def timed(self, name: str):
+        """Decorator: time every call of a function or coroutine as span `name`."""
+
+        def decorator(function):
+            if asyncio.iscoroutinefunction(function):
+
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await function(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    def count(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get_records(self) -> List[dict]:
+        with self.lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+        records = [
+            {
+                "type": "span",
+                "name": name,
+                "count": int(count),
+                "total_seconds": round(total, 6),
+                "max_seconds": round(longest, 6),
+            }
+            for name, (count, total, longest) in spans
+        ]
+        records.extend({"type": "counter", "name": name, "value": value} for name, value in counters)
+        return records
+
+    def to_json_lines(self) -> str:
+        timestamp = datetime.utcnow().isoformat()
+        return "".join(
+            json.dumps(dict(record, time=timestamp)) + "\n" for record in self.get_records()
+        )
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for record in self.get_records():
+            if record["type"] == "span":
+                labels = '{{span="{}"}}'.format(record["name"])
+                lines.append("{}_span_seconds_total{} {}".format(PROMETHEUS_PREFIX, labels, record["total_seconds"]))
+                lines.append("{}_span_count{} {}".format(PROMETHEUS_PREFIX, labels, record["count"]))
+                lines.append("{}_span_max_seconds{} {}".format(PROMETHEUS_PREFIX, labels, record["max_seconds"]))
+            else:
+                name = re.sub(r"[^a-zA-Z0-9_]", "_", record["name"])
+                lines.append("{}_{}_total {}".format(PROMETHEUS_PREFIX, name, record["value"]))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Append JSON lines to `path`, or overwrite it with Prometheus text for *.prom."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if path.endswith(".prom"):
+            with open(path, "w") as metrics_file:
+                metrics_file.write(self.to_prometheus())
+        else:
+            with open(path, "a") as metrics_file:
+                metrics_file.write(self.to_json_lines())
+
+    def summary(self) -> str:
+        lines = []
+        for record in self.get_records():
+            if record["type"] == "span":
+                lines.append(
+                    "{:<32} {:>6}x {:>10.3f}s total {:>9.3f}s max".format(
+                        record["name"], record["count"], record["total_seconds"], record["max_seconds"]
+                    )
+                )
+            else:
+                lines.append("{:<32} {:>g}".format(record["name"], record["value"]))
+        return "\n".join(lines)
+
+
+class CountingHttp:
+    """Wraps an httplib2-style transport to count calls and bytes sent and received."""
+
+    def __init__(self, http, prefix: str) -> None:
+        self.http = http
+        self.prefix = prefix
+
+    def __getattr__(self, name: str):
+        # googleapiclient reads e.g. `credentials` and `timeout` off the transport
+        return getattr(self.http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        with metrics.span(self.prefix + ".http"):
+            response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        metrics.count(self.prefix + ".http_requests")
+        metrics.count(self.prefix + ".bytes_sent", len(body or b""))
+        metrics.count(self.prefix + ".bytes_received", len(content or b""))
+        return response, content
+
+
+class Profiler:
+    """cProfile and tracemalloc around a run, written out as a text report."""
+
+    def __init__(self, top: int = 40) -> None:
+        self.top = top
+        self.profile = None
+        self.started = None
+
+    def start(self) -> None:
+        import cProfile
+        import tracemalloc
+
+        tracemalloc.start()
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self, directory: str = None) -> str:
+        """Stop profiling and write the report; returns the report's path."""
+        import io
+        import pstats
+        import tracemalloc
+
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        directory = directory or get_file_path(config.profile_dir)
+        os.makedirs(directory, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        # the raw stats load into pstats, snakeviz and friends
+        self.profile.dump_stats(os.path.join(directory, name + ".prof"))
+
+        stream = io.StringIO()
+        stream.write("Wall time: {:.3f}s\n".format(elapsed))
+        stream.write("Memory: {:.1f} MiB current, {:.1f} MiB peak\n\n".format(current / 2 ** 20, peak / 2 ** 20))
+        stream.write("Spans and counters:\n{}\n\n".format(metrics.summary() or "(none)"))
+        stream.write("Top allocations:\n")
+        for stat in snapshot.statistics("lineno")[:20]:
+            stream.write("{}\n".format(stat))
+        stream.write("\nMain thread CPU profile (worker threads are only visible in the spans):\n")
+        pstats.Stats(self.profile, stream=stream).sort_stats("cumulative").print_stats(self.top)
+
+        path = os.path.join(directory, name + ".txt")
+        with open(path, "w") as report:
+            report.write(stream.getvalue())
+        return path
+
+
+metrics = Metrics()
@@ -0,0 +1,176 @@
+import json
+import os
+import tempfile
+import threading
+from typing import IO, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from manifest import ProblemsManifest, get_topic_hash
+
+
+class ProblemStreamWriter:
+    """Writes scraped topics as JSON lines, one topic per line, as they finish.
+
+    Every line is flushed and fsynced once written, so a crash only loses
+    the topic being scraped at the time. Each line carries the topic's
+    position on the page, since parallel scrapers finish out of order. A
+    closing {"complete": ...} line tells a finished scrape from one that
+    died halfway.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # reentrant, since a topic's line and its count are written under one hold
+        self.lock = threading.RLock()
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file: IO[str] = open(path, "w", encoding="utf-8")
+
+    def __str__(self):
+        return "ProblemStreamWriter(path={}, topics={})".format(self.path, self.count)
+
+    def write_line(self, record: dict) -> None:
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def write_topic(self, position: int, topic: str, problems: List[dict]) -> None:
+        # parallel scrapers emit from their own threads
+        with self.lock:
+            self.write_line({"position": position, "topic": topic, "problems": problems})
+            self.count += 1
+
+    def close(self, complete: bool) -> None:
+        if self.file is None:
+            return
+        self.write_line({"complete": complete, "topics": self.count})
+        self.file.close()
+        self.file = None
+
+
+class StreamedTopics:
+    """Read-only {topic: problems} view over a problems stream.
+
+    Opening it reads the stream once for the byte offset of every topic;
+    problems are only parsed when their topic is read, so iterating holds
+    one topic in memory at a time. Topics come back in page order and a
+    line cut short by a crash is skipped.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # closed: the scrape got to write its last line, complete: and it finished every topic
+        self.closed = False
+        self.complete = False
+        # topic -> (position, offset), the last line wins
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        with open(path, "rb") as stream:
+            offset = 0
+            for line in stream:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the line being written when the scraper died
+                    break
+                if "topic" in record:
+                    self.offsets[record["topic"]] = (record.get("position", len(self.offsets)), offset)
+                elif "complete" in record:
+                    self.closed = True
+                    self.complete = bool(record["complete"])
+                offset += len(line)
+        self.topics = sorted(self.offsets, key=lambda topic: self.offsets[topic][0])
+
+    def __str__(self):
+        return "StreamedTopics(path={}, topics={}, complete={})".format(self.path, len(self.topics), self.complete)
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.topics)
+
+    def __contains__(self, topic: str) -> bool:
+        return topic in self.offsets
+
+    def __getitem__(self, topic: str) -> List[dict]:
+        with open(self.path, "rb") as stream:
+            return self.read_topic(stream, topic)
+
+    def read_topic(self, stream, topic: str) -> List[dict]:
+        stream.seek(self.offsets[topic][1])
+        return json.loads(stream.readline())["problems"]
+
+    def keys(self) -> List[str]:
+        return list(self.topics)
+
+    def items(self) -> Iterator[Tuple[str, List[dict]]]:
+        with open(self.path, "rb") as stream:
+            for topic in self.topics:
+                yield topic, self.read_topic(stream, topic)
+
+    def iter_problems(self) -> Iterator[Tuple[str, dict]]:
+        for topic, problems in self.items():
+            for problem in problems:
+                yield topic, problem
+
+
+def get_topic_entries(topics: Iterator[Tuple[str, List[dict]]]) -> Dict[str, dict]:
+    """Each topic's manifest entry, {"hash", "count"}, reading one topic at a time."""
+    return {topic: {"hash": get_topic_hash(problems), "count": len(problems)} for topic, problems in topics}
+
+
+def write_topics_json(path: str, topics: Iterator[Tuple[str, List[dict]]]) -> int:
+    """Write topics in the problems.json format one at a time; returns how many were written.
+
+    The output is the same as json.dump(topics, indent=4), without ever
+    holding more than one topic.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    count = 0
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write("{")
+            for topic, problems in topics:
+                # a one-topic object, minus its braces, is exactly that topic's entry
+                tmp_file.write(("\n" if not count else ",\n") + json.dumps({topic: problems}, indent=4)[2:-2])
+                count += 1
+            tmp_file.write("\n}" if count else "}")
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+def merge_topics(
+    streamed: StreamedTopics, previous: Optional[Mapping[str, List[dict]]]
+) -> Iterator[Tuple[str, List[dict]]]:
+    """Like {**previous, **streamed}: streamed topics replace previous ones in place, new ones go last."""
+    if previous:
+        for topic, problems in previous.items():
+            yield topic, streamed[topic] if topic in streamed else problems
+    for topic, problems in streamed.items():
+        if not previous or topic not in previous:
+            yield topic, problems
+
+
+def load_topics(path: str) -> Mapping[str, List[dict]]:
+    """The topics in problems json `path`.
+
+    Read lazily from the stream it was compacted from while that's still
+    what the manifest describes, and with json.load otherwise (e.g. a file
+    written by hand).
+    """
+    manifest = ProblemsManifest()
+    if (
+        os.path.abspath(path) == os.path.abspath(manifest.problems_path)
+        and manifest.is_current()
+        and manifest.stream_is_current()
+    ):
+        return StreamedTopics(manifest.stream_path)
+    with open(path, "r") as json_file:
+        return json.load(json_file)
@@ -0,0 +1,245 @@
+import asyncio
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from base import BaseClass
+from metrics import metrics
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+
+def get_error_status(error: Exception) -> int:
+    resp = getattr(error, "resp", None)
+    return int(getattr(resp, "status", 0) or getattr(error, "status", 0) or 0)
+
+
+def is_http_error(error: Exception) -> bool:
+    # googleapiclient is slow to import, and whatever raised one of its errors has imported it already
+    errors = sys.modules.get("googleapiclient.errors")
+    return errors is not None and isinstance(error, errors.HttpError)
+
+
+def get_transport_errors() -> Tuple[type, ...]:
+    """Errors raised when a request never got an HTTP response, from whichever transports are loaded."""
+    errors = [ConnectionError, TimeoutError, socket.timeout]
+    # like HttpError, these are only raised by modules that were imported to send the request
+    for module, name in (
+        ("http.client", "HTTPException"),
+        ("httplib2", "ServerNotFoundError"),
+        ("httpx", "TransportError"),
+        ("google.auth.exceptions", "TransportError"),
+    ):
+        error = getattr(sys.modules.get(module), name, None)
+        if error is not None:
+            errors.append(error)
+    return tuple(errors)
+
+
+def is_throttled_error(error: Exception) -> bool:
+    status = get_error_status(error)
+    if status == 429:
+        return True
+    if status == 403:
+        content = getattr(error, "content", b"")
+        content = content.decode(errors="replace") if isinstance(content, bytes) else str(content)
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def is_retryable_error(error: Exception) -> bool:
+    if isinstance(error, get_transport_errors()):
+        # timeouts and dropped connections are worth another go, bugs are not
+        return True
+    return get_error_status(error) in RETRYABLE_STATUSES or is_throttled_error(error)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, cost: float = 1) -> float:
+        """Take `cost` tokens and return how long to wait before using them."""
+        if self.rate <= 0:
+            return 0.0
+        cost = min(cost, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= cost
+            # a negative balance is paid off by waiting for it to refill
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, cost: float = 1) -> float:
+        wait = self.reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveLimiter:
+    """Concurrency limit tuned with additive increase, multiplicative decrease.
+
+    Every success grows the limit by 1/limit (about +1 per round of requests),
+    every throttled response halves it, bounded by [minimum, maximum].
+    """
+
+    def __init__(self, minimum: int, maximum: int) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._condition: asyncio.Condition = None
+        self._loop: asyncio.AbstractEventLoop = None
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # a condition only works on the loop it was first used on, so every
+        # new loop (e.g. another asyncio.run on the same calendar) gets its own
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self) -> None:
+        self.limit = max(self.minimum, self.limit / 2)
+
+
+class RequestExecutor(BaseClass):
+    """Executes every Calendar API request with rate limiting and retries.
+
+    Requests wait on a token bucket sized to the quota, retryable failures
+    (429, 5xx, rate-limit 403s, transport errors) are retried with exponential
+    backoff and full jitter while anything else is raised straight away, and
+    async callers share an adaptive concurrency limit that backs off while the
+    API is throttling.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+        min_concurrency: int,
+        max_concurrency: int,
+        dry: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(dry, verbose)
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics: Dict[str, float] = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "throttled": 0,
+            "rate_limited_seconds": 0.0,
+            "backoff_seconds": 0.0,
+        }
+        self.metrics_lock = threading.Lock()
+
+    def __str__(self):
+        return "RequestExecutor(rate={}, max_retries={}, concurrency={:.1f})".format(
+            self.bucket.rate, self.max_retries, self.limiter.limit
+        )
+
+    def count(self, metric: str, value: float = 1) -> None:
+        with self.metrics_lock:
+            self.metrics[metric] += value
+        metrics.count("calendar." + metric, value)
+
+    def get_backoff(self, attempt: int) -> float:
+        # full jitter: anywhere between 0 and the exponential cap
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def record_throttle(self) -> None:
+        self.count("throttled")
+        self.limiter.on_throttle()
+
+    def get_retry_delay(self, error: Exception, attempt: int) -> float:
+        """Record a failed attempt: re-raise `error` if it can't be retried, else return the backoff."""
+        if is_throttled_error(error):
+            self.record_throttle()
+        if attempt >= self.max_retries or not is_retryable_error(error):
+            self.count("failed")
+            raise error
+        delay = self.get_backoff(attempt)
+        self.count("retries")
+        self.count("backoff_seconds", delay)
+        self.log("Retrying after %s (attempt %s) in %.2fs", error, attempt + 1, delay)
+        return delay
+
+    def on_success(self) -> None:
+        self.count("succeeded")
+        self.limiter.on_success()
+
+    def execute(self, send: Callable[[], Any], cost: int = 1) -> Any:
+        """Run the blocking `send` until it succeeds or can't be retried."""
+        attempt = 0
+        while True:
+            self.count("rate_limited_seconds", self.bucket.acquire(cost))
+            self.count("requests")
+            try:
+                result = send()
+                self.on_success()
+                return result
+            except Exception as e:
+                delay = self.get_retry_delay(e, attempt)
+                attempt += 1
+                time.sleep(delay)
+
+    async def execute_async(self, send: Callable[[], Awaitable[Any]], cost: int = 1) -> Any:
+        """Like `execute` for a coroutine `send`, waiting without blocking the event loop."""
+        attempt = 0
+        while True:
+            wait = self.bucket.reserve(cost)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.count("rate_limited_seconds", wait)
+            self.count("requests")
+            try:
+                result = await send()
+                self.on_success()
+                return result
+            except Exception as e:
+                delay = self.get_retry_delay(e, attempt)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def get_metrics(self) -> Dict[str, float]:
+        with self.metrics_lock:
+            metrics = dict(self.metrics)
+        metrics["concurrency_limit"] = round(self.limiter.limit, 2)
+        return metrics
@@ -0,0 +1,114 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from base import BaseClass
+from freebusy import BusyIndex
+
+# (topic, problem, start, end, review number or 0 the first time it's done)
+Placement = Tuple[str, dict, datetime, datetime, int]
+# (day, next start, problems already placed that day)
+Slot = Tuple[int, datetime, int]
+
+
+def iter_topical_problems(topical_problems) -> Iterator[Tuple[str, dict]]:
+    """Flatten {topic: problems} (or a catalog view) into (topic, problem) pairs."""
+    if hasattr(topical_problems, "iter_problems"):
+        yield from topical_problems.iter_problems()
+        return
+    for topic, problems in topical_problems.items():
+        for problem in problems:
+            yield topic, problem
+
+
+class Scheduler(BaseClass):
+    """Places problems into daily slots in a single pass over the catalog.
+
+    Open day slots live in a heap ordered by (day, next start), so the next
+    problem always goes into the earliest free slot. A problem that follows
+    another on the same day starts after a break as long as the previous
+    problem's time limit. Times stay native datetimes, and planning stops as
+    soon as `total_limit` problems are placed, so only that many problems are
+    ever read from the catalog.
+
+    With a BusyIndex, every start is moved past overlapping busy time by a
+    bisect over the index; a day whose `day_window` can't fit the problem is
+    closed.
+    """
+
+    def __init__(
+        self,
+        start: datetime,
+        daily_limit: int,
+        total_limit: int,
+        get_duration: Callable[[str], timedelta],
+        days: int = None,
+        busy: BusyIndex = None,
+        day_window: timedelta = timedelta(days=1),
+        dry: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(dry, verbose)
+        self.start = start
+        self.busy = busy
+        self.day_window = day_window
+        self.daily_limit = daily_limit
+        self.total_limit = total_limit
+        self.days = total_limit if days is None else days
+        self.get_duration = get_duration
+
+    def __str__(self):
+        return "Scheduler(start={}, daily_limit={}, total_limit={}, days={})".format(
+            self.start, self.daily_limit, self.total_limit, self.days
+        )
+
+    def get_day_slots(self) -> List[Slot]:
+        return [(day, self.start + timedelta(days=day), 0) for day in range(self.days)]
+
+    def plan(self, topical_problems: Iterable) -> List[Placement]:
+        slots = self.get_day_slots()
+        heapq.heapify(slots)
+        placements: List[Placement] = []
+        if self.daily_limit <= 0:
+            return placements
+
+        seen = set()
+        for topic, problem in iter_topical_problems(topical_problems):
+            if len(placements) >= self.total_limit or not slots:
+                break
+            title = problem["problem"].lower()
+            if title in seen:
+                continue
+
+            duration = self.get_duration(problem["difficulty"])
+            slot = heapq.heappop(slots)
+            if self.busy:
+                slot = self.find_free(slots, slot, duration)
+                if slot is None:
+                    break
+            day, start, count = slot
+            end = start + duration
+            seen.add(title)
+            placements.append((topic, problem, start, end, 0))
+
+            if count + 1 < self.daily_limit:
+                # the next problem that day starts after a break as long as this one
+                heapq.heappush(slots, (day, end + duration, count + 1))
+
+        self.log("Planned %s events over %s days", len(placements), self.days)
+        return placements
+
+    def find_free(
+        self, slots: List[Slot], slot: Slot, duration: timedelta
+    ) -> Optional[Slot]:
+        """Move `slot` past busy time, closing days that have no room left."""
+        while True:
+            day, start, count = slot
+            # a problem has to end within the day's window
+            day_end = self.start + timedelta(days=day) + self.day_window
+            free = self.busy.find_free(start, duration, day_end)
+            if free is not None:
+                return day, free, count
+            if not slots:
+                return None
+            slot = heapq.heappop(slots)
@@ -1,156 +1,328 @@
-import json
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from time import sleep
-from typing import List, Optional
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Mapping, Optional, Tuple
 
 from base import BaseClass
 from config import config
+from manifest import ProblemsManifest
+from metrics import metrics
+from problem_stream import (
+    ProblemStreamWriter,
+    StreamedTopics,
+    get_topic_entries,
+    load_topics,
+    merge_topics,
+    write_topics_json,
+)
 from utils.utils import get_file_path
 
+# selenium is only imported where the browser is driven, so the HTTP backend
+# (which subclasses Scraper) works on machines without it
+if TYPE_CHECKING:
+    from selenium import webdriver
+    from selenium.webdriver.remote.webelement import WebElement
+
+# problem title is <a> as 3rd td in tr, difficulty is 4th td in tr
+ROWS_SELECTOR = "div > table > tbody tr"
+PROBLEM_SELECTOR = "td:nth-child(3) a"
+DIFFICULTY_SELECTOR = "td:nth-child(4)"
+
+# reads every row of a topic table in the browser and returns plain data, so a
+# table costs one WebDriver round-trip instead of several per row
+EXTRACT_ROWS_SCRIPT = """
+var rows = arguments[0].querySelectorAll(arguments[1]);
+var problems = [];
+for (var i = 0; i < rows.length; i++) {
+    var link = rows[i].querySelector(arguments[2]);
+    var difficulty = rows[i].querySelector(arguments[3]);
+    var problem = {
+        problem: link ? link.innerText.trim() : "",
+        link: link ? link.href : "",
+        difficulty: difficulty ? difficulty.innerText.trim() : "",
+    };
+    if (problem.problem && problem.link && problem.difficulty) {
+        problems.push(problem);
+    }
+}
+return problems;
+"""
+
+TAB_XPATH = "/html/body/app-root/app-pattern-table-list/div/div[2]/div[2]/ul/li[4]/a"
+TOPIC_SELECTOR = "app-pattern-table"
+TABLE_SELECTOR = "app-table"
+
+
+def table_rendered(topicElement: "WebElement"):
+    """Wait condition: the topic's table is visible and has rendered its rows."""
+    from selenium.webdriver.common.by import By
+
+    tables = topicElement.find_elements(By.CSS_SELECTOR, TABLE_SELECTOR)
+    if tables and tables[0].is_displayed() and tables[0].find_elements(By.CSS_SELECTOR, ROWS_SELECTOR):
+        return tables[0]
+    return False
+
+
 class Scraper(BaseClass):
     def __init__(self, dry: bool = False, verbose: bool = False) -> None:
         super().__init__(dry, verbose)
-        options = Options()
-        options.headless = True  # Enable headless mode
-        self.driver = webdriver.Firefox(options=options)  
+        # the browser is only started once something actually needs it
+        self._driver: Optional["webdriver.Firefox"] = None
         self.base_url = config.base_url
+        self.bulk_extract = config.scraper_bulk_extract
+        self.workers = max(1, config.scraper_workers)
+        self.wait_timeout = config.scraper_wait_timeout
+        self.manifest = ProblemsManifest(dry, verbose)
+        self.stream_path = get_file_path(config.problems_stream_file)
+        # finished topics go straight to the stream instead of piling up in memory
+        self.stream: Optional[ProblemStreamWriter] = None
+        self.scraped = 0
+        self.scraped_lock = threading.Lock()
 
     def __str__(self):
         return "Scraper(base_url={}, dry={}, verbose={})".format(
             self.base_url, self.dry, self.verbose
         )
 
+    @property
+    def driver(self) -> "webdriver.Firefox":
+        if self._driver is None:
+            self._driver = self.create_driver()
+        return self._driver
+
+    def create_driver(self) -> "webdriver.Firefox":
+        from selenium import webdriver
+        from selenium.webdriver.firefox.options import Options
+
+        options = Options()
+        options.headless = True  # Enable headless mode
+        return webdriver.Firefox(options=options)
+
     def stop(self):
+        if self._driver is None:
+            return
         self.log("Stopping...")
-        self.driver.close()
-        self.driver.quit()
+        self._driver.close()
+        self._driver.quit()
+        self._driver = None
         self.log("Stopped!")
 
+    @metrics.timed("scrape")
     async def run(self):
-        topics = {}
+        complete = False
+        if not self.dry:
+            self.recover()
+            self.stream = ProblemStreamWriter(self.stream_path)
 
         try:
             self.log("Scraper running...")
-            self.driver.get("https://neetcode.io/practice")
-            assert "Practice" in self.driver.title
+            await self.scrape_topics()
+            complete = True
+            self.log("Done! Found %s topics", self.scraped)
 
-            # click tab /html/body/app-root/app-pattern-table-list/div/div[2]/div[2]/ul/li[4]/a
-            self.click(
-                By.XPATH,
-                "/html/body/app-root/app-pattern-table-list/div/div[2]/div[2]/ul/li[4]/a",
-            )
+        except Exception as e:
+            self.log("Error: %s", e)
+        finally:
+            if self.dry:
+                self.log("Dry run, not saving %s topics", self.scraped)
+            else:
+                self.stream.close(complete)
+                saved = self.save_to_json_file(complete)
+                if saved:
+                    self.log("Saved to json file!")
+            self.stop()
+
+    def recover(self) -> None:
+        """Save what a scrape that died without closing its stream got through."""
+        try:
+            streamed = StreamedTopics(self.stream_path)
+        except FileNotFoundError:
+            return
+        if not streamed.closed and len(streamed):
+            self.log("Recovering %s topics from an interrupted scrape", len(streamed))
+            self.save_to_json_file(complete=False)
+
+    def emit(self, position: int, topic: str, problems: List[dict]) -> None:
+        """Hand a finished topic to the stream; workers call this from their own threads."""
+        if self.stream:
+            self.stream.write_topic(position, topic, problems)
+        with self.scraped_lock:
+            self.scraped += 1
+
+    async def scrape_topics(self) -> None:
+        """Emit the problems of every topic with its position on the page."""
+        if self.dry:
+            self.log("Dry run, not starting a browser")
+            return
+
+        topicElements = self.open_practice_page(self.driver)
+        self.log("Found %s topics", len(topicElements))
+
+        if self.workers > 1 and len(topicElements) > 1:
+            await self.scrape_topics_in_parallel(len(topicElements))
+        else:
+            for position, topicElement in enumerate(topicElements):
+                self.emit(position, *self.scrape_topic(self.driver, topicElement))
+
+    def open_practice_page(self, driver: "webdriver.Firefox") -> List["WebElement"]:
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
 
-            # get and go through each item and append to topics
-            # app-pattern-table.ng-star-inserted
-            topicElements = self.get_all(
-                By.CSS_SELECTOR,
-                "app-pattern-table",
+        driver.get(self.base_url)
+        assert "Practice" in driver.title
+
+        # click tab /html/body/app-root/app-pattern-table-list/div/div[2]/div[2]/ul/li[4]/a
+        WebDriverWait(driver, self.wait_timeout).until(
+            EC.element_to_be_clickable((By.XPATH, TAB_XPATH))
+        ).click()
+
+        # get and go through each item and append to topics
+        # app-pattern-table.ng-star-inserted
+        return WebDriverWait(driver, self.wait_timeout).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, TOPIC_SELECTOR))
+        )
+
+    @metrics.timed("scrape.topic")
+    def scrape_topic(self, driver: "webdriver.Firefox", topicElement: "WebElement") -> Tuple[str, List[dict]]:
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        # first p element is the topic name
+        topic = self.get_text(By.CSS_SELECTOR, "p:nth-child(1)", topicElement)
+        # click the topic parent button
+        self.log("Getting problems for topic: %s...", topic)
+        button = self.get(By.CSS_SELECTOR, "button", topicElement)
+        button.click()
+        # wait for the accordion to render the table rows rather than a fixed sleep
+        tableDiv = WebDriverWait(topicElement, self.wait_timeout, poll_frequency=0.1).until(
+            table_rendered
+        )
+
+        problems = self.extract_problems(tableDiv, driver)
+        self.log("Got %s problems for topic: %s", len(problems), topic)
+        # close the topic
+        button.click()
+        return topic, problems
+
+    def scrape_topic_group(self, indexes: List[int]) -> None:
+        # every worker drives its own browser, WebDriver sessions can't be shared
+        driver = self.create_driver()
+        try:
+            topicElements = self.open_practice_page(driver)
+            for index in indexes:
+                self.emit(index, *self.scrape_topic(driver, topicElements[index]))
+        finally:
+            driver.quit()
+
+    async def scrape_topics_in_parallel(self, count: int) -> None:
+        workers = min(self.workers, count)
+        self.log("Scraping %s topics with %s workers...", count, workers)
+        groups = [list(range(worker, count, workers)) for worker in range(workers)]
+
+        loop = asyncio.get_running_loop()
+        # topics are streamed as they finish; their positions restore the page order
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            await asyncio.gather(
+                *[loop.run_in_executor(pool, self.scrape_topic_group, group) for group in groups]
             )
 
-            self.log("Found {} topics".format(len(topicElements)))
-
-            for topicElement in topicElements:
-                # first p element is the topic name
-                topic = self.get_text(By.CSS_SELECTOR, "p:nth-child(1)", topicElement)
-                # topic_data = {}
-                # topic_data[topic] = {}
-                # click the topic parent button
-                self.log("Getting problems for topic: {}...".format(topic))
-                button = self.get(By.CSS_SELECTOR, "button", topicElement)
-                button.click()
-                sleep(3)
-                # find element of class accordion-panel with stle visibility: visible
-                # body > app-root > app-pattern-table-list > div > div.flex-container-col.content.ng-star-inserted > app-pattern-table:nth-child(4) > app-accordion > div > div
-                # Wait for the tableDiv to become visible
-                tableDiv = WebDriverWait(topicElement, 10).until(
-                    EC.visibility_of_element_located((By.CSS_SELECTOR, "app-table"))
+    @metrics.timed("scrape.extract")
+    def extract_problems(
+        self, tableDiv: "WebElement", driver: Optional["webdriver.Firefox"] = None
+    ) -> List[dict]:
+        if self.bulk_extract:
+            try:
+                return (driver or self.driver).execute_script(
+                    EXTRACT_ROWS_SCRIPT,
+                    tableDiv,
+                    ROWS_SELECTOR,
+                    PROBLEM_SELECTOR,
+                    DIFFICULTY_SELECTOR,
                 )
+            except Exception as e:
+                self.log("Error extracting rows in bulk, falling back: %s", e)
+        return self.extract_problems_per_cell(tableDiv)
 
-                # get all problems in table. problem title is <a> as 3rd td in tr, difficulty is 4th td in tr
-                # my-table-container table tbody tr
-                problemElements = self.get_all(
-                    By.CSS_SELECTOR, "div > table > tbody tr", tableDiv
-                )
-                problems = [
-                    {
-                        "problem": self.get_text(
-                            By.CSS_SELECTOR, "td:nth-child(3) a", problemElement
-                        ),
-                        "link": self.get(
-                            By.CSS_SELECTOR, "td:nth-child(3) a", problemElement
-                        ).get_attribute("href"),
-                        "difficulty": self.get_text(
-                            By.CSS_SELECTOR, "td:nth-child(4)", problemElement
-                        ),
-                    }
-                    for problemElement in problemElements
-                    if all(
-                        [
-                            self.get_text(
-                                By.CSS_SELECTOR, "td:nth-child(3) a", problemElement
-                            ),
-                            self.get_text(
-                                By.CSS_SELECTOR, "td:nth-child(4)", problemElement
-                            ),
-                            self.get(
-                                By.CSS_SELECTOR, "td:nth-child(3) a", problemElement
-                            ).get_attribute("href"),
-                        ]
-                    )
-                ]
-                topics[topic] = problems
-                self.log("Got {} problems for topic: {}".format(len(problems), topic))
-                # close the topic
-                button.click()
-
-            self.log("Done! Found {} topics".format(len(topics)))
+    def extract_problems_per_cell(self, tableDiv: "WebElement") -> List[dict]:
+        from selenium.webdriver.common.by import By
 
-        except Exception as e:
-            self.log("Error: {}".format(e))
-        finally:
-            saved = self.save_to_json_file(topics)
-            if saved:
-                self.log("Saved to json file!")
-            self.stop()
+        problems = []
+        for problemElement in self.get_all(By.CSS_SELECTOR, ROWS_SELECTOR, tableDiv):
+            link = self.get(By.CSS_SELECTOR, PROBLEM_SELECTOR, problemElement)
+            problem = {
+                "problem": link.text,
+                "link": link.get_attribute("href"),
+                "difficulty": self.get_text(By.CSS_SELECTOR, DIFFICULTY_SELECTOR, problemElement),
+            }
+            if all(problem.values()):
+                problems.append(problem)
+        return problems
 
-    def click(self, by, path: str, element: Optional[WebElement] = None) -> None:
+    def click(self, by, path: str, element: Optional["WebElement"] = None) -> None:
         if element:
             element.find_element(by, path).click()
             return
         self.driver.find_element(by, path).click()
 
     def get(
-        self, by, path: str, element: Optional[WebElement] = None
-    ) -> Optional[WebElement]:
+        self, by, path: str, element: Optional["WebElement"] = None
+    ) -> Optional["WebElement"]:
         if element:
             return element.find_element(by, path)
         return self.driver.find_element(by, path)
 
     def get_all(
-        self, by, path: str, element: Optional[WebElement] = None
-    ) -> Optional[List[WebElement]]:
+        self, by, path: str, element: Optional["WebElement"] = None
+    ) -> Optional[List["WebElement"]]:
         if element:
             return element.find_elements(by, path)
         return self.driver.find_elements(by, path)
 
     def get_text(
-        self, by, path: str, element: Optional[WebElement] = None
+        self, by, path: str, element: Optional["WebElement"] = None
     ) -> Optional[str]:
         if element:
             return element.find_element(by, path).text
         return self.driver.find_element(by, path).text
 
-    def save_to_json_file(self, data) -> bool:
+    def load_previous_topics(self) -> Mapping[str, List[dict]]:
+        try:
+            return load_topics(get_file_path(config.problems_file))
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.log("Error reading previous json file: %s", e)
+            return {}
+
+    @metrics.timed("scrape.save")
+    def save_to_json_file(self, complete: bool = True) -> bool:
+        """Compact the stream into problems.json, one topic at a time."""
         try:
-            path_to_file = get_file_path(config.problems_file)
-            with open(path_to_file, "w") as json_file:
-                json.dump(data, json_file, indent=4)
+            streamed = StreamedTopics(self.stream_path)
+            previous = None
+            if not complete:
+                # keep the previous problems for every topic this run didn't reach
+                self.log("Scrape was incomplete, keeping previous topics it didn't reach")
+                previous = self.load_previous_topics()
+            if not len(streamed) and not previous:
+                self.log("Nothing scraped, leaving the json file untouched")
+                return False
+
+            entries = get_topic_entries(merge_topics(streamed, previous))
+            changed = self.manifest.get_changed_topics(entries)
+            removed = set(self.manifest.topics) - set(entries)
+            if not changed and not removed and self.manifest.is_current():
+                self.log("No topics changed, not rewriting the json file")
+                self.manifest.save(from_stream=complete)
+                return False
+            self.log("%s topics changed: %s", len(changed), ", ".join(changed))
+
+            write_topics_json(get_file_path(config.problems_file), merge_topics(streamed, previous))
+            self.manifest.update_topics(entries)
+            # only a complete scrape's stream holds everything the file does
+            self.manifest.save(from_stream=complete)
             return True
         except Exception as e:
-            self.log("Error saving to json file: {}".format(e))
+            self.log("Error saving to json file: %s", e)
             return False
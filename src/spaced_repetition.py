@@ -0,0 +1,288 @@
+import hashlib
+import heapq
+import json
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from base import BaseClass
+from config import Config, config
+from freebusy import BusyIndex
+from scheduler import Placement, iter_topical_problems
+from utils.utils import atomic_write_json, get_file_path, get_problem_slug
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# the lowest SM-2 grade that counts as remembered
+PASSING_GRADE = 3
+# the planner snapshots its queues every this many days, so a changed result
+# is re-planned from the snapshot before it instead of from day 0
+CHECKPOINT_DAYS = 7
+
+# (repetitions, interval in days, ease)
+CardState = Tuple[int, int, float]
+# (due day, problem index, times done, repetitions, interval, ease)
+DueEntry = Tuple[int, int, int, int, int, float]
+# (problem index, times done before), 0 being the first time the problem is done
+Session = Tuple[int, int]
+
+
+@lru_cache(maxsize=4096)
+def review_card(repetitions: int, interval: int, ease: float, grade: int) -> CardState:
+    """SM-2: the card's state after a review graded 0 (blackout) to 5 (perfect).
+
+    Cards only ever take a handful of distinct states, so every result is
+    cached and the whole catalog shares one computation per state.
+    """
+    ease = max(MIN_EASE, round(ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02), 2))
+    if grade < PASSING_GRADE:
+        return 0, 1, ease
+    if repetitions == 0:
+        return 1, 1, ease
+    if repetitions == 1:
+        return 2, 6, ease
+    return repetitions + 1, max(1, round(interval * ease)), ease
+
+
+class ReviewProgress(BaseClass):
+    """Per-problem SM-2 state kept in a JSON file, keyed by problem slug.
+
+    Every entry holds the repetitions, interval and ease after the last
+    review, how many reviews were graded, the date of the last one and the
+    date it's due again.
+    """
+
+    def __init__(self, dry: bool = False, verbose: bool = False, settings: Config = None) -> None:
+        super().__init__(dry, verbose)
+        self.config = settings or config
+        self.path = get_file_path(self.config.progress_file)
+        self.cards: Dict[str, Dict] = self.load()
+
+    def __str__(self):
+        return "ReviewProgress(path={}, cards={})".format(self.path, len(self.cards))
+
+    def load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r") as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.log("Error loading review progress, starting fresh: %s", e)
+            return {}
+
+    def save(self) -> None:
+        atomic_write_json(self.path, self.cards, indent=4)
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1(json.dumps(self.cards, sort_keys=True).encode()).hexdigest()[:16]
+
+    def get_state(self, slug: str) -> Optional[Tuple[CardState, int, date]]:
+        """The card's state, reviews so far and due date, or None for a problem never done."""
+        card = self.cards.get(slug)
+        if card is None:
+            return None
+        state = (card["repetitions"], card["interval"], card["ease"])
+        return state, card.get("reviews", 1), date.fromisoformat(card["due"])
+
+    def record(self, slug: str, grade: int, day: date = None) -> Dict:
+        """Grade a review of `slug` done on `day` and work out when it's due next."""
+        if not 0 <= grade <= 5:
+            raise ValueError("Grade {} is out of range, expected 0 to 5".format(grade))
+        day = day or date.today()
+        current = self.get_state(slug)
+        state, reviews, _ = current if current else ((0, 0, DEFAULT_EASE), 0, None)
+        repetitions, interval, ease = review_card(*state, grade)
+        card = self.cards[slug] = {
+            "repetitions": repetitions,
+            "interval": interval,
+            "ease": ease,
+            "reviews": reviews + 1,
+            "grade": grade,
+            "reviewed": day.isoformat(),
+            "due": (day + timedelta(days=interval)).isoformat(),
+        }
+        if not self.dry:
+            self.save()
+        self.log("Recorded %s with grade %s, due again %s", slug, grade, card["due"])
+        return card
+
+
+class ReviewPlanner(BaseClass):
+    """Plans new problems and their reviews day by day with SM-2 intervals.
+
+    Problems that are due sit in a heap ordered by (due day, catalog order),
+    so every day pops at most `review_limit` of the most overdue reviews and
+    fills up with at most `new_limit` problems never done before. Future
+    reviews are projected as if every one was graded `grade`. A review that
+    doesn't fit its day stays in the heap and comes up the next day, and its
+    next interval counts from the day it's actually done.
+
+    The heap and the position in the new problems are snapshotted every
+    CHECKPOINT_DAYS days, so `update` re-plans a changed card from the last
+    snapshot before the change instead of from scratch.
+    """
+
+    def __init__(
+        self,
+        start: date,
+        days: int,
+        new_limit: int,
+        review_limit: int,
+        total_limit: int = None,
+        grade: int = 4,
+        dry: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        super().__init__(dry, verbose)
+        self.start = start
+        self.days = days
+        self.new_limit = new_limit
+        self.review_limit = review_limit
+        self.total_limit = total_limit
+        self.grade = grade
+        # (topic, problem, slug) in catalog order
+        self.problems: List[Tuple[str, dict, str]] = []
+        self.index_by_slug: Dict[str, int] = {}
+        # indices of the problems never done, in the order they're introduced
+        self.new: List[int] = []
+        self.sessions: List[List[Session]] = []
+        # day -> (due heap, new problems introduced so far)
+        self.checkpoints: Dict[int, Tuple[List[DueEntry], int]] = {}
+
+    def __str__(self):
+        return "ReviewPlanner(start={}, days={}, new_limit={}, review_limit={}, problems={})".format(
+            self.start, self.days, self.new_limit, self.review_limit, len(self.problems)
+        )
+
+    def get_due_day(self, due: date) -> int:
+        # overdue cards come up on the first day
+        return max(0, (due - self.start).days)
+
+    def plan(self, topical_problems: Iterable, progress: ReviewProgress) -> List[List[Session]]:
+        """Plan every day from scratch; returns the sessions of each day."""
+        return self.plan_problems(iter_topical_problems(topical_problems), progress)
+
+    def plan_problems(
+        self, problems: Iterable[Tuple[str, dict]], progress: ReviewProgress
+    ) -> List[List[Session]]:
+        self.problems, self.index_by_slug, self.new = [], {}, []
+        due: List[DueEntry] = []
+        seen = set()
+        for topic, problem in problems:
+            slug = get_problem_slug(problem)
+            if slug in seen or problem.get("status") == "skipped":
+                continue
+            seen.add(slug)
+            index = len(self.problems)
+            self.problems.append((topic, problem, slug))
+            self.index_by_slug[slug] = index
+            current = progress.get_state(slug)
+            if current is not None:
+                (repetitions, interval, ease), reviews, due_date = current
+                due.append((self.get_due_day(due_date), index, reviews, repetitions, interval, ease))
+            elif problem.get("status") == "done":
+                # marked done in the catalog without a graded review
+                due.append((0, index, 1, 1, 1, DEFAULT_EASE))
+            else:
+                self.new.append(index)
+        if self.total_limit is not None:
+            del self.new[self.total_limit :]
+
+        heapq.heapify(due)
+        self.sessions = []
+        self.checkpoints = {}
+        self.simulate(0, due, 0)
+        self.log(
+            "Planned %s sessions for %s problems over %s days",
+            sum(map(len, self.sessions)), len(self.problems), self.days,
+        )
+        return self.sessions
+
+    def simulate(self, first_day: int, due: List[DueEntry], introduced: int) -> None:
+        new, sessions, checkpoints = self.new, self.sessions, self.checkpoints
+        grade, new_limit, review_limit = self.grade, self.new_limit, self.review_limit
+        heappop, heappush = heapq.heappop, heapq.heappush
+        del sessions[first_day:]
+        for day in range(first_day, self.days):
+            if day % CHECKPOINT_DAYS == 0:
+                checkpoints[day] = (list(due), introduced)
+            today: List[Session] = []
+            while due and due[0][0] <= day and len(today) < review_limit:
+                _, index, reviews, repetitions, interval, ease = heappop(due)
+                today.append((index, reviews))
+                repetitions, interval, ease = review_card(repetitions, interval, ease, grade)
+                heappush(due, (day + interval, index, reviews + 1, repetitions, interval, ease))
+            for _ in range(min(new_limit, len(new) - introduced)):
+                index = new[introduced]
+                introduced += 1
+                today.append((index, 0))
+                repetitions, interval, ease = review_card(0, 0, DEFAULT_EASE, grade)
+                heappush(due, (day + interval, index, 1, repetitions, interval, ease))
+            sessions.append(today)
+
+    def update(self, slug: str, progress: ReviewProgress, day: date = None) -> Optional[int]:
+        """Re-plan after `slug` was graded on `day`; returns the first day re-planned.
+
+        Only the days from the last checkpoint before `day` are planned again,
+        from the queues as they were then with the card's new state swapped in.
+        Without a checkpoint (nothing was simulated, e.g. `days` is 0) the
+        known problems are planned again from scratch.
+        """
+        index = self.index_by_slug.get(slug)
+        current = progress.get_state(slug)
+        if index is None or current is None:
+            return None
+        changed = min(self.get_due_day(day or date.today()), max(0, self.days - 1))
+        checkpoint = changed - changed % CHECKPOINT_DAYS
+        if checkpoint not in self.checkpoints:
+            self.plan_problems([(topic, problem) for topic, problem, _ in self.problems], progress)
+            self.log("Re-planned %s from scratch", slug)
+            return 0
+        due, introduced = self.checkpoints[checkpoint]
+        due = [entry for entry in due if entry[1] != index]
+        (repetitions, interval, ease), reviews, due_date = current
+        due.append((self.get_due_day(due_date), index, reviews, repetitions, interval, ease))
+        heapq.heapify(due)
+        if index in self.new[introduced:]:
+            # done ahead of the plan, so it isn't introduced as new again; earlier
+            # checkpoints only count problems before it and stay valid
+            self.new.remove(index)
+        self.simulate(checkpoint, due, introduced)
+        self.log("Re-planned %s from day %s", slug, checkpoint)
+        return checkpoint
+
+    def get_placements(
+        self,
+        start: datetime,
+        get_duration: Callable[[str], timedelta],
+        busy: BusyIndex = None,
+        day_window: timedelta = timedelta(days=1),
+    ) -> List[Placement]:
+        """Lay the planned days out in time like Scheduler does.
+
+        Every placement carries its review number, so every review of a
+        problem becomes an event of its own.
+        """
+        placements: List[Placement] = []
+        dropped = 0
+        for day, today in enumerate(self.sessions):
+            day_start = start + timedelta(days=day)
+            day_end = day_start + day_window
+            next_start = day_start
+            for position, (index, review) in enumerate(today):
+                topic, problem, _ = self.problems[index]
+                duration = get_duration(problem["difficulty"])
+                if busy:
+                    next_start = busy.find_free(next_start, duration, day_end)
+                    if next_start is None:
+                        dropped += len(today) - position
+                        break
+                end = next_start + duration
+                placements.append((topic, problem, next_start, end, review))
+                # the next problem that day starts after a break as long as this one
+                next_start = end + duration
+        if dropped:
+            self.log("Dropped %s sessions that didn't fit around busy time", dropped)
+        return placements
@@ -0,0 +1,46 @@
+import json
+from typing import Any, Dict
+
+from base import BaseClass
+from config import Config, config
+from utils.utils import atomic_write_json, get_file_path
+
+
+class SyncState(BaseClass):
+    """Per-listing sync tokens (and cached event ids) persisted between runs."""
+
+    def __init__(self, dry: bool = False, verbose: bool = False, settings: Config = None) -> None:
+        super().__init__(dry, verbose)
+        self.config = settings or config
+        self.path = get_file_path(self.config.sync_state_file)
+        self.state: Dict[str, Dict[str, Any]] = self.load()
+
+    def __str__(self):
+        return "SyncState(path={}, keys={})".format(self.path, len(self.state))
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.log("Error loading sync state, starting fresh: %s", e)
+            return {}
+
+    def save(self) -> None:
+        atomic_write_json(self.path, self.state)
+
+    def get_key(self, key: str) -> str:
+        return "{}:{}".format(self.config.calendar_id, key)
+
+    def get(self, key: str) -> Dict[str, Any]:
+        return self.state.get(self.get_key(key), {})
+
+    def set(self, key: str, **values) -> None:
+        self.state.setdefault(self.get_key(key), {}).update(values)
+        self.save()
+
+    def clear(self, key: str) -> None:
+        if self.state.pop(self.get_key(key), None) is not None:
+            self.save()
@@ -0,0 +1,42 @@
+import pytest
+
+from config import Config, config
+from fake_calendar import FakeCalendarServer
+
+
+@pytest.fixture
+def make_settings(tmp_path, monkeypatch):
+    """Build a Config whose files all live under tmp_path; it also stands in for the global config."""
+
+    def make(**overrides) -> Config:
+        env = {
+            "CALENDAR_ID": "tests",
+            "DISCOVERY_CACHE_DIR": str(tmp_path / "discovery"),
+            "JOURNAL_DIR": str(tmp_path / "journal"),
+            "METRICS_FILE": "",
+            "PROBLEMS_DB": str(tmp_path / "problems.db"),
+            "PROBLEMS_FILE": str(tmp_path / "problems.json"),
+            "PROBLEMS_MANIFEST_FILE": str(tmp_path / "problems.manifest.json"),
+            "PROBLEMS_STREAM_FILE": str(tmp_path / "problems.ndjson"),
+            "PROGRESS_FILE": str(tmp_path / "progress.json"),
+            "SYNC_STATE_FILE": str(tmp_path / "sync_state.json"),
+        }
+        env.update({key.upper(): str(value) for key, value in overrides.items()})
+        settings = Config(env)
+        # modules that read the global config (the manifest, discovery cache) see the same files
+        monkeypatch.setitem(config.__dict__, "_config", settings)
+        return settings
+
+    return make
+
+
+@pytest.fixture
+def settings(make_settings) -> Config:
+    return make_settings()
+
+
+@pytest.fixture
+def server():
+    """The fake Calendar API, served in-process."""
+    with FakeCalendarServer() as server:
+        yield server
@@ -0,0 +1,16 @@
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+
+
+def make_problem(index: int, difficulty: str = None) -> dict:
+    return {
+        "problem": "Problem {}".format(index),
+        "link": "https://leetcode.com/problems/problem-{}/".format(index),
+        "difficulty": difficulty or DIFFICULTIES[index % 3],
+    }
+
+
+def make_topics(problems: int, topics: int = 3) -> dict:
+    catalog = {}
+    for index in range(problems):
+        catalog.setdefault("Topic {}".format(index % topics), []).append(make_problem(index))
+    return catalog
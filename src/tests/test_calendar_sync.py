@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+from calendar_sync import CalendarSync
+from google_calendar import GoogleCalendar
+from tests.helpers import make_topics
+
+
+@pytest.fixture
+def google_calendar(server, make_settings):
+    settings = make_settings(
+        calendar_api_root=server.url,
+        calendar_retry_base_delay=0.01,
+        daily_question_limit=2,
+        total_question_limit=6,
+    )
+    return GoogleCalendar(settings=settings)
+
+
+def test_sync_creates_the_schedule(server, google_calendar):
+    plan = asyncio.run(CalendarSync(google_calendar).run(topical_problems=make_topics(9)))
+
+    assert len(plan.creates) == 6
+    assert server.store.count("tests") == 6
+
+
+def test_second_sync_with_unchanged_input_sends_no_mutations(server, google_calendar):
+    topics = make_topics(9)
+    asyncio.run(CalendarSync(google_calendar).run(topical_problems=topics))
+    server.reset_stats()
+
+    plan = asyncio.run(CalendarSync(google_calendar).run(topical_problems=topics))
+
+    assert not plan.skipped
+    assert plan.mutations == 0
+    assert plan.unchanged == 6
+    # only the listing went out, nothing was inserted, updated or deleted
+    assert server.get_stats()["batches"] == 0
+    assert server.store.count("tests") == 6
+
+
+def test_sync_updates_only_what_changed(server, google_calendar):
+    topics = make_topics(9)
+    asyncio.run(CalendarSync(google_calendar).run(topical_problems=topics))
+    topics["Topic 1"][0]["difficulty"] = "Hard"
+
+    plan = asyncio.run(CalendarSync(google_calendar).run(topical_problems=topics))
+
+    assert plan.mutations > 0
+    assert plan.creates == [] and plan.deletes == []
+    assert server.store.count("tests") == 6
+
+
+def test_dry_sync_plans_against_an_empty_calendar(server, make_settings):
+    settings = make_settings(calendar_api_root=server.url, total_question_limit=4)
+    google_calendar = GoogleCalendar(dry=True, settings=settings)
+    plan = asyncio.run(CalendarSync(google_calendar, dry=True).run(topical_problems=make_topics(9)))
+
+    assert len(plan.creates) == 4
+    assert server.store.count("tests") == 0
+    assert server.get_stats()["http_requests"] == 0
+
+
+
+def test_catalog_status_change_is_synced(server, make_settings, tmp_path):
+    from catalog import ProblemCatalog
+    from manifest import ProblemsManifest
+
+    settings = make_settings(calendar_api_root=server.url, problems_catalog="true", total_question_limit=4)
+    topics = make_topics(9)
+    (tmp_path / "problems.json").write_text(json.dumps(topics))
+    manifest = ProblemsManifest()
+    manifest.update(topics)
+    manifest.save()
+    google_calendar = GoogleCalendar(settings=settings)
+    asyncio.run(CalendarSync(google_calendar).run())
+    assert asyncio.run(CalendarSync(google_calendar).run()).skipped
+
+    catalog = ProblemCatalog(settings.problems_db)
+    catalog.set_status("problem-0", "done")
+    catalog.close()
+    plan = asyncio.run(CalendarSync(google_calendar).run())
+
+    assert not plan.skipped
+    slugs = [
+        event["extendedProperties"]["private"]["problemSlug"]
+        for event in server.store.get_calendar("tests").values()
+        if event.get("status") != "cancelled"
+    ]
+    assert "problem-0" not in slugs
+    assert len(slugs) == 4
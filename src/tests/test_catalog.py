@@ -0,0 +1,85 @@
+import json
+import sqlite3
+
+import pytest
+
+from catalog import ProblemCatalog, TopicalProblems
+from tests.helpers import make_problem, make_topics
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = ProblemCatalog(str(tmp_path / "problems.db"))
+    yield catalog
+    catalog.close()
+
+
+def test_import_keeps_scrape_order(catalog):
+    topics = make_topics(9)
+
+    assert catalog.import_topics(topics) == 9
+    assert catalog.get_topics() == list(topics)
+    assert [problem["problem"] for _, problem in catalog.iter_problems()] == [
+        problem["problem"] for problems in topics.values() for problem in problems
+    ]
+    assert catalog.count() == 9
+
+
+def test_iter_problems_filters(catalog):
+    catalog.import_topics(make_topics(9))
+    catalog.set_status("problem-4", "done")
+
+    assert [problem["slug"] for _, problem in catalog.iter_problems(topic="Topic 1")] == [
+        "problem-1", "problem-4", "problem-7"
+    ]
+    assert {problem["difficulty"] for _, problem in catalog.iter_problems(difficulty="Hard")} == {"Hard"}
+    assert [problem["slug"] for _, problem in catalog.iter_problems(status="done")] == ["problem-4"]
+
+
+def test_import_keeps_status_and_drops_removed_problems(catalog):
+    catalog.import_topics(make_topics(4))
+    catalog.set_status("problem-1", "done")
+    catalog.import_topics({"Topic 0": [make_problem(0)], "Topic 1": [make_problem(1)]})
+
+    assert catalog.count() == 2
+    assert catalog.count("done") == 1
+
+
+def test_set_status_rejects_unknown_statuses(catalog):
+    catalog.import_topics(make_topics(1))
+
+    with pytest.raises(ValueError):
+        catalog.set_status("problem-0", "maybe")
+    assert not catalog.set_status("missing", "done")
+
+
+def test_import_json_and_staleness(catalog, settings, tmp_path):
+    path = tmp_path / "problems.json"
+    path.write_text(json.dumps(make_topics(3)))
+
+    assert catalog.is_stale(str(path))
+    assert catalog.import_json(str(path)) == 3
+    assert not catalog.is_stale(str(path))
+
+
+def test_topical_problems_view(tmp_path):
+    catalog = ProblemCatalog(str(tmp_path / "problems.db"))
+    catalog.import_topics(make_topics(6))
+    catalog.set_status("problem-0", "done")
+
+    with TopicalProblems(catalog, status="todo") as view:
+        assert list(view) == ["Topic 0", "Topic 1", "Topic 2"]
+        assert [problem["slug"] for problem in view["Topic 0"]] == ["problem-3"]
+        assert len(list(view.iter_problems())) == 5
+    # closing the view closes its catalog
+    with pytest.raises(sqlite3.ProgrammingError):
+        catalog.count()
+
+
+def test_revision_changes_with_imports_and_statuses(catalog):
+    assert catalog.revision == 0
+    catalog.import_topics(make_topics(3))
+    catalog.set_status("problem-1", "done")
+    catalog.set_status("missing", "done")
+
+    assert catalog.revision == 2
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+from freebusy import BusyIndex, parse_rfc3339
+
+START = datetime(2024, 1, 1, 9)
+
+
+def hours(start: float, end: float):
+    return START + timedelta(hours=start), START + timedelta(hours=end)
+
+
+def test_intervals_are_sorted_and_merged():
+    busy = BusyIndex([hours(4, 5), hours(0, 1), hours(0.5, 2), hours(2, 3), hours(6, 6)])
+
+    assert busy.intervals == [hours(0, 3), hours(4, 5)]
+
+
+def test_find_free_skips_busy_time():
+    busy = BusyIndex([hours(0, 1), hours(1.5, 3)])
+
+    assert busy.find_free(START, timedelta(hours=1)) == START + timedelta(hours=3)
+    # the gap between the two blocks fits half an hour
+    assert busy.find_free(START, timedelta(minutes=30)) == START + timedelta(hours=1)
+    assert busy.find_free(START + timedelta(hours=4), timedelta(hours=1)) == START + timedelta(hours=4)
+
+
+def test_find_free_gives_up_past_the_latest_end():
+    busy = BusyIndex([hours(0, 3)])
+
+    assert busy.find_free(START, timedelta(hours=1), START + timedelta(hours=3)) is None
+    assert busy.find_free(START, timedelta(hours=1), START + timedelta(hours=4)) == START + timedelta(hours=3)
+
+
+def test_subtract_cuts_blocks():
+    busy = BusyIndex([hours(0, 4), hours(5, 6), hours(7, 8)])
+    busy.subtract([hours(1, 2), hours(5, 6), hours(7.5, 9)])
+
+    assert busy.intervals == [hours(0, 1), hours(2, 4), hours(7, 7.5)]
+
+
+def test_subtract_ignores_free_and_empty_intervals():
+    busy = BusyIndex([hours(0, 1), hours(2, 3)])
+    busy.subtract([hours(1, 2), hours(5, 5)])
+
+    assert busy.intervals == [hours(0, 1), hours(2, 3)]
+
+
+def test_subtract_spanning_several_blocks():
+    busy = BusyIndex([hours(0, 1), hours(2, 3), hours(4, 5)])
+    busy.subtract([hours(0.5, 4.5)])
+
+    assert busy.intervals == [hours(0, 0.5), hours(4.5, 5)]
+
+
+def test_add_merges_into_place():
+    busy = BusyIndex([hours(0, 1), hours(4, 5)])
+    busy.add([hours(1, 2), hours(6, 7), hours(3, 4.5)])
+
+    assert busy.intervals == [hours(0, 2), hours(3, 5), hours(6, 7)]
+
+
+def test_parse_rfc3339_converts_to_naive_utc():
+    assert parse_rfc3339("2024-01-01T09:00:00Z") == datetime(2024, 1, 1, 9)
+    assert parse_rfc3339("2024-01-01T09:00:00-08:00") == datetime(2024, 1, 1, 17)
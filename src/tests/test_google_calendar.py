@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime
+
+from google_calendar import GoogleCalendar
+from tests.helpers import make_topics
+
+START = datetime(2024, 1, 1, 9)
+
+
+def make_calendar(server, make_settings, **overrides) -> GoogleCalendar:
+    settings = make_settings(calendar_api_root=server.url, calendar_retry_base_delay=0.01, **overrides)
+    return GoogleCalendar(settings=settings)
+
+
+def test_get_events_lists_upcoming_events(server, make_settings):
+    google_calendar = make_calendar(server, make_settings, total_question_limit=4)
+    asyncio.run(google_calendar.insert_events(google_calendar.build_events(make_topics(4), START)))
+
+    events = google_calendar.get_events(START)
+
+    assert len(events) == 4
+    assert [start for start, _ in events] == sorted(start for start, _ in events)
+
+
+def test_get_events_logs_api_errors(server, make_settings, monkeypatch):
+    google_calendar = make_calendar(server, make_settings, calendar_max_retries=0)
+    logged = []
+    monkeypatch.setattr(google_calendar, "log", lambda message, *args: logged.append(message % args))
+    server.error_rate = 1.0
+
+    assert google_calendar.get_events(START) == []
+    assert "Error: GoogleCalendar received 503 while retrieving events" in logged
+
+
+def test_pipelined_delete_removes_every_generated_event(server, make_settings):
+    google_calendar = make_calendar(server, make_settings, calendar_batch_size=5, total_question_limit=12)
+    asyncio.run(google_calendar.insert_events(google_calendar.build_events(make_topics(12), START)))
+
+    summary = asyncio.run(google_calendar.delete_events_pipelined(generated_only=True))
+
+    assert len(summary.succeeded) == 12
+    assert server.store.count("tests") == 0
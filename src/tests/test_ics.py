@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from custom_types import Problem, ScheduledEvent
+from ics import IcsWriter, escape_text, fold_line, write_events
+
+TIMEZONE = "America/Los_Angeles"
+
+
+def make_event(title: str, start: datetime, end: datetime) -> ScheduledEvent:
+    link = "https://leetcode.com/problems/two-sum/"
+    return ScheduledEvent("Arrays", Problem(title, link, "Easy", "two-sum"), start, end, TIMEZONE, 2)
+
+
+def read_lines(path) -> list:
+    with open(path, "r", encoding="utf-8", newline="") as ics_file:
+        content = ics_file.read()
+    assert content.endswith("\r\n")
+    # unfold continuation lines
+    return content.replace("\r\n ", "").split("\r\n")[:-1]
+
+
+def test_writer_streams_events_in_local_time(tmp_path):
+    path = tmp_path / "schedule.ics"
+    start = datetime(2024, 1, 1, 17)
+    with IcsWriter(str(path), TIMEZONE, start) as writer:
+        writer.write_event(make_event("Two Sum", start, datetime(2024, 1, 1, 18)))
+        # not there until the writer is closed
+        assert not path.exists()
+
+    lines = read_lines(path)
+    assert writer.count == 1
+    assert lines[0] == "BEGIN:VCALENDAR"
+    assert lines[-1] == "END:VCALENDAR"
+    assert "BEGIN:VTIMEZONE" in lines and "TZID:" + TIMEZONE in lines
+    event = lines[lines.index("BEGIN:VEVENT") : lines.index("END:VEVENT")]
+    # naive times are UTC, 17:00 UTC is 09:00 in Los Angeles in January
+    assert "DTSTART;TZID={}:20240101T090000".format(TIMEZONE) in event
+    assert "DTEND;TZID={}:20240101T100000".format(TIMEZONE) in event
+    assert "URL:https://leetcode.com/problems/two-sum/" in event
+    assert any(line.startswith("UID:two-sum-20240101T170000@") for line in event)
+
+
+def test_writer_leaves_nothing_behind_on_error(tmp_path):
+    path = tmp_path / "schedule.ics"
+    try:
+        with IcsWriter(str(path), TIMEZONE, datetime(2024, 1, 1)):
+            raise RuntimeError("interrupted")
+    except RuntimeError:
+        pass
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_events_counts_every_event(tmp_path):
+    path = tmp_path / "schedule.ics"
+    events = [
+        make_event("Two Sum", datetime(2024, 1, day, 17), datetime(2024, 1, day, 18)) for day in range(1, 4)
+    ]
+
+    assert write_events(str(path), events, TIMEZONE) == 3
+    assert read_lines(path).count("BEGIN:VEVENT") == 3
+
+
+def test_text_is_escaped_and_long_lines_folded():
+    assert escape_text("a, b; c\\d\ne") == "a\\, b\\; c\\\\d\\ne"
+    folded = fold_line("SUMMARY:" + "x" * 100)
+    assert all(len(line.encode()) <= 75 for line in folded.split("\r\n"))
+    assert folded.replace("\r\n ", "") == "SUMMARY:" + "x" * 100 + "\r\n"
@@ -0,0 +1,64 @@
+from custom_types import OperationResult
+from journal import Journal
+
+
+def start_run(settings, keys) -> Journal:
+    journal = Journal("delete", settings=settings)
+    journal.begin({"events": len(keys)})
+    journal.plan((key, None) for key in keys)
+    return journal
+
+
+def test_load_without_a_journal(settings):
+    assert Journal("delete", settings=settings).load() is None
+
+
+def test_interrupted_run_leaves_the_unfinished_items(settings):
+    journal = start_run(settings, ["a", "b", "c", "d"])
+    journal.record(OperationResult("a"))
+    journal.record(OperationResult("b", error=Exception("Backend Error")))
+    journal.close()
+
+    state = Journal("delete", settings=settings).load()
+    assert state.run_id == journal.run_id
+    assert state.params == {"events": 4}
+    assert not state.finished
+    assert state.outstanding == [("b", None), ("c", None), ("d", None)]
+    assert state.failed == {"b": "Backend Error"}
+
+
+def test_resume_appends_to_the_same_run(settings):
+    journal = start_run(settings, ["a", "b", "c"])
+    journal.record(OperationResult("a"))
+    journal.close()
+
+    resumed = Journal("delete", settings=settings)
+    state = resumed.load()
+    resumed.resume(state)
+    for key, _ in state.outstanding:
+        resumed.record(OperationResult(key))
+    resumed.finish()
+    resumed.close()
+
+    state = Journal("delete", settings=settings).load()
+    assert state.run_id == journal.run_id
+    assert state.finished
+    assert state.outstanding == []
+
+
+def test_a_torn_last_line_is_skipped(settings):
+    journal = start_run(settings, ["a", "b"])
+    journal.record(OperationResult("a"))
+    journal.file.write('{"type": "done", "ke')
+    journal.close()
+
+    assert Journal("delete", settings=settings).load().outstanding == [("b", None)]
+
+
+def test_plan_keeps_payloads(settings):
+    journal = Journal("create", settings=settings)
+    journal.begin()
+    journal.plan([("event-1", {"summary": "Two Sum"})])
+    journal.close()
+
+    assert Journal("create", settings=settings).load().outstanding == [("event-1", {"summary": "Two Sum"})]
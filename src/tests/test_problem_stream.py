@@ -0,0 +1,62 @@
+import json
+
+from problem_stream import ProblemStreamWriter, StreamedTopics, merge_topics, write_topics_json
+from tests.helpers import make_topics
+
+
+def write_stream(path, topics: dict, complete: bool = True) -> None:
+    writer = ProblemStreamWriter(str(path))
+    # written out of page order, like parallel scrapers finish
+    for position, (topic, problems) in reversed(list(enumerate(topics.items()))):
+        writer.write_topic(position, topic, problems)
+    writer.close(complete)
+
+
+def test_streamed_topics_read_back_in_page_order(tmp_path):
+    topics = make_topics(9)
+    write_stream(tmp_path / "problems.ndjson", topics)
+    streamed = StreamedTopics(str(tmp_path / "problems.ndjson"))
+
+    assert streamed.closed and streamed.complete
+    assert streamed.keys() == list(topics)
+    assert dict(streamed.items()) == topics
+    assert streamed["Topic 1"] == topics["Topic 1"]
+    assert "Topic 1" in streamed and "Topic 9" not in streamed
+    assert list(streamed.iter_problems())[0] == ("Topic 0", topics["Topic 0"][0])
+
+
+def test_streamed_topics_skip_a_torn_line(tmp_path):
+    path = tmp_path / "problems.ndjson"
+    writer = ProblemStreamWriter(str(path))
+    writer.write_topic(0, "Arrays", make_topics(2, 1)["Topic 0"])
+    writer.file.write('{"position": 1, "topic": "Hashing", "prob')
+    writer.file.close()
+    streamed = StreamedTopics(str(path))
+
+    assert streamed.keys() == ["Arrays"]
+    assert not streamed.closed and not streamed.complete
+
+
+def test_write_topics_json_matches_json_dump(tmp_path):
+    topics = make_topics(7)
+    path = tmp_path / "problems.json"
+
+    assert write_topics_json(str(path), topics.items()) == 3
+    assert path.read_text() == json.dumps(topics, indent=4)
+
+
+def test_write_topics_json_without_topics(tmp_path):
+    path = tmp_path / "problems.json"
+
+    assert write_topics_json(str(path), iter([])) == 0
+    assert path.read_text() == json.dumps({}, indent=4)
+
+
+def test_merge_topics_replaces_in_place(tmp_path):
+    previous = make_topics(6)
+    updated = {"Topic 1": [], "Topic 5": make_topics(1)["Topic 0"]}
+    write_stream(tmp_path / "problems.ndjson", updated)
+    streamed = StreamedTopics(str(tmp_path / "problems.ndjson"))
+
+    assert dict(merge_topics(streamed, previous)) == {**previous, **updated}
+    assert list(dict(merge_topics(streamed, previous))) == ["Topic 0", "Topic 1", "Topic 2", "Topic 5"]
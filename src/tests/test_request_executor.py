@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from google_calendar import GoogleCalendar
+from request_executor import AdaptiveLimiter, RequestExecutor, is_retryable_error
+from tests.helpers import make_topics
+
+
+def make_http_error(status: int, content: bytes = b"") -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+def make_executor(max_retries: int = 3, concurrency: int = 4) -> RequestExecutor:
+    return RequestExecutor(
+        rate=0,
+        burst=1,
+        max_retries=max_retries,
+        base_delay=0.001,
+        max_delay=0.001,
+        min_concurrency=1,
+        max_concurrency=concurrency,
+    )
+
+
+def failing(errors):
+    """A send that raises `errors` one by one, then returns how many calls it took."""
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return len(calls)
+
+    return send
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ConnectionResetError(),
+        TimeoutError(),
+        make_http_error(429),
+        make_http_error(503),
+        make_http_error(403, b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'),
+    ],
+)
+def test_transient_errors_are_retryable(error):
+    assert is_retryable_error(error)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        KeyError("id"),
+        TypeError(),
+        RuntimeError("no response in batch"),
+        make_http_error(400),
+        make_http_error(403, b'{"error": {"errors": [{"reason": "forbidden"}]}}'),
+        make_http_error(404),
+    ],
+)
+def test_bugs_and_client_errors_are_not_retryable(error):
+    assert not is_retryable_error(error)
+
+
+def test_execute_retries_transport_errors():
+    executor = make_executor()
+
+    assert executor.execute(failing([ConnectionResetError(), make_http_error(503)])) == 3
+    assert executor.metrics["retries"] == 2
+    assert executor.metrics["succeeded"] == 1
+
+
+def test_execute_raises_a_bug_straight_away():
+    executor = make_executor()
+    send = failing([KeyError("id")])
+
+    with pytest.raises(KeyError):
+        executor.execute(send)
+    assert executor.metrics["requests"] == 1
+    assert executor.metrics["retries"] == 0
+    assert executor.metrics["failed"] == 1
+
+
+def test_execute_gives_up_after_max_retries():
+    executor = make_executor(max_retries=2)
+
+    with pytest.raises(HttpError):
+        executor.execute(failing([make_http_error(503)] * 5))
+    assert executor.metrics["requests"] == 3
+
+
+def test_throttling_halves_the_concurrency_limit():
+    executor = make_executor(concurrency=8)
+    throttled = make_http_error(429)
+
+    executor.execute(failing([throttled, throttled]))
+    assert executor.limiter.limit < 8 / 2
+    assert executor.metrics["throttled"] == 2
+
+
+def test_limiter_bounds_requests_in_flight():
+    limiter = AdaptiveLimiter(1, 3)
+    peak = []
+
+    async def request():
+        async with limiter:
+            peak.append(limiter.in_flight)
+            await asyncio.sleep(0.001)
+
+    async def run():
+        await asyncio.gather(*[request() for _ in range(20)])
+
+    asyncio.run(run())
+    assert max(peak) == 3
+    assert limiter.in_flight == 0
+
+
+def test_limiter_works_across_event_loops():
+    executor = make_executor(concurrency=1)
+
+    async def send():
+        await asyncio.sleep(0.001)
+        return True
+
+    async def call():
+        async with executor.limiter:
+            return await executor.execute_async(send)
+
+    async def run():
+        # requests beyond the limit have to wait on the limiter's condition
+        return await asyncio.gather(*[call() for _ in range(5)])
+
+    assert asyncio.run(run()) == [True] * 5
+    assert asyncio.run(run()) == [True] * 5
+
+
+def test_unbatched_calendar_deletes_in_a_second_loop(server, make_settings):
+    settings = make_settings(
+        calendar_api_root=server.url,
+        calendar_batch_size=1,
+        calendar_concurrency=2,
+        calendar_retry_base_delay=0.01,
+        total_question_limit=10,
+    )
+    google_calendar = GoogleCalendar(settings=settings)
+    events = google_calendar.build_events(make_topics(10), start=datetime(2024, 1, 1, 9))
+
+    created = asyncio.run(google_calendar.insert_events(events))
+    assert len(created.succeeded) == 10
+
+    deleted = asyncio.run(google_calendar.delete_all_events([result.value["id"] for result in created.succeeded]))
+    assert deleted == 10
+    assert server.store.count("tests") == 0
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from freebusy import BusyIndex
+from scheduler import Scheduler
+from tests.helpers import make_problem, make_topics
+
+START = datetime(2024, 1, 1, 9)
+
+
+def get_duration(difficulty: str) -> timedelta:
+    return timedelta(hours={"Easy": 1, "Medium": 2, "Hard": 3}[difficulty])
+
+
+def test_plan_fills_days_up_to_the_daily_limit():
+    scheduler = Scheduler(START, daily_limit=2, total_limit=6, get_duration=get_duration)
+    placements = scheduler.plan(make_topics(10))
+
+    assert len(placements) == 6
+    days = [(start - START).days for _, _, start, _, _ in placements]
+    assert sorted(days) == [0, 0, 1, 1, 2, 2]
+    for _, problem, start, end, review in placements:
+        assert end - start == get_duration(problem["difficulty"])
+        assert review == 0
+
+
+def test_plan_starts_the_next_problem_after_a_break():
+    topics = {"Arrays": [make_problem(0, "Easy"), make_problem(1, "Easy")]}
+    scheduler = Scheduler(START, daily_limit=2, total_limit=2, get_duration=get_duration)
+    (_, _, first_start, first_end, _), (_, _, second_start, _, _) = scheduler.plan(topics)
+
+    assert first_start == START
+    # a break as long as the first problem
+    assert second_start == first_end + timedelta(hours=1)
+
+
+def test_plan_skips_duplicate_titles():
+    topics = {"Arrays": [make_problem(0)], "Hashing": [make_problem(0), make_problem(1)]}
+    placements = Scheduler(START, daily_limit=1, total_limit=5, get_duration=get_duration).plan(topics)
+
+    assert [problem["problem"] for _, problem, _, _, _ in placements] == ["Problem 0", "Problem 1"]
+
+
+def test_plan_moves_past_busy_time():
+    busy = BusyIndex([(START, START + timedelta(hours=2))])
+    scheduler = Scheduler(
+        START, daily_limit=1, total_limit=1, get_duration=get_duration, busy=busy
+    )
+    (_, _, start, _, _), = scheduler.plan({"Arrays": [make_problem(0, "Easy")]})
+
+    assert start == START + timedelta(hours=2)
+
+
+def test_plan_closes_days_without_room():
+    # the first day is busy for its whole window
+    busy = BusyIndex([(START, START + timedelta(hours=12))])
+    scheduler = Scheduler(
+        START,
+        daily_limit=1,
+        total_limit=2,
+        get_duration=get_duration,
+        busy=busy,
+        day_window=timedelta(hours=12),
+    )
+    placements = scheduler.plan({"Arrays": [make_problem(0, "Easy"), make_problem(1, "Easy")]})
+
+    assert [start for _, _, start, _, _ in placements] == [START + timedelta(days=1)]
+
+
+def test_plan_without_a_daily_limit_places_nothing():
+    assert Scheduler(START, daily_limit=0, total_limit=5, get_duration=get_duration).plan(make_topics(5)) == []
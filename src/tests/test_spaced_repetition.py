@@ -0,0 +1,78 @@
+from datetime import date
+
+import pytest
+
+from spaced_repetition import DEFAULT_EASE, MIN_EASE, ReviewPlanner, ReviewProgress, review_card
+from tests.helpers import make_topics
+from utils.utils import get_problem_slug
+
+START = date(2024, 1, 1)
+
+
+def test_review_card_intervals_grow():
+    state = review_card(0, 0, DEFAULT_EASE, 4)
+    assert state == (1, 1, DEFAULT_EASE)
+    state = review_card(*state, 4)
+    assert state == (2, 6, DEFAULT_EASE)
+    assert review_card(*state, 4) == (3, 15, DEFAULT_EASE)
+
+
+def test_review_card_resets_a_failed_card():
+    assert review_card(3, 15, 2.5, 2) == (0, 1, 2.18)
+
+
+def test_review_card_keeps_a_minimum_ease():
+    assert review_card(0, 0, MIN_EASE, 0)[2] == MIN_EASE
+
+
+def test_record_rejects_out_of_range_grades(settings):
+    with pytest.raises(ValueError):
+        ReviewProgress(dry=True, settings=settings).record("two-sum", 6)
+
+
+def plan(progress: ReviewProgress, days: int, problems: int = 6) -> ReviewPlanner:
+    planner = ReviewPlanner(START, days, new_limit=2, review_limit=4)
+    planner.plan(make_topics(problems), progress)
+    return planner
+
+
+def test_plan_introduces_new_problems_and_schedules_reviews(settings):
+    planner = plan(ReviewProgress(dry=True, settings=settings), days=10)
+
+    first_time = [index for day in planner.sessions for index, review in day if review == 0]
+    assert len(planner.sessions) == 10
+    assert first_time == list(range(6))
+    # graded 4, a new problem comes back the next day
+    assert (0, 1) in planner.sessions[1]
+
+
+def test_update_replans_from_the_checkpoint_before_the_review(settings):
+    progress = ReviewProgress(dry=True, settings=settings)
+    planner = plan(progress, days=30)
+    before = [list(day) for day in planner.sessions]
+    slug = get_problem_slug(make_topics(6)["Topic 0"][0])
+    progress.record(slug, 5, date(2024, 1, 9))
+
+    assert planner.update(slug, progress, date(2024, 1, 9)) == 7
+    assert planner.sessions[:7] == before[:7]
+    assert len(planner.sessions) == 30
+    # graded on day 8, it's due again the next day and nowhere in between
+    assert (0, 1) in planner.sessions[9]
+    assert all(index != 0 for day in planner.sessions[7:9] for index, _ in day)
+
+
+def test_update_without_checkpoints_plans_from_scratch(settings):
+    progress = ReviewProgress(dry=True, settings=settings)
+    planner = plan(progress, days=0)
+    slug = get_problem_slug(make_topics(6)["Topic 0"][0])
+    progress.record(slug, 5, START)
+
+    assert planner.update(slug, progress, START) == 0
+    assert planner.sessions == []
+
+
+def test_update_ignores_unknown_problems(settings):
+    progress = ReviewProgress(dry=True, settings=settings)
+    planner = plan(progress, days=10)
+
+    assert planner.update("not-planned", progress) is None
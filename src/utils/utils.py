@@ -1,5 +1,33 @@
+import json
 import os
+import re
+import tempfile
 
 def get_file_path(filename: str) -> str:
     # step out of current directory and iinto data directory
-    return os.path.join(os.path.dirname(__file__), "..", "data", filename)
\ No newline at end of file
+    return os.path.join(os.path.dirname(__file__), "..", "data", filename)
+
+def slugify(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+
+def get_problem_slug(problem: dict) -> str:
+    # prefer the leetcode slug in the link, e.g. https://leetcode.com/problems/two-sum/
+    match = re.search(r"/problems/([^/?#]+)", problem.get("link") or "")
+    if match:
+        return match.group(1).lower()
+    return slugify(problem["problem"])
+
+def atomic_write_json(path: str, data, indent: int = None) -> None:
+    # write next to the target and rename over it so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(data, tmp_file, indent=indent)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise